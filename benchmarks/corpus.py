@@ -0,0 +1,92 @@
+'''A corpus of robots.txt files of the shapes seen in the wild, for benchmarks.
+
+The files are generated deterministically so that results are comparable
+between runs and releases without checking megabytes of fixtures in.
+'''
+
+import random
+
+
+SMALL = '''
+# /robots.txt for http://www.fict.org/
+# comments to webmaster@fict.org
+
+User-agent: unhipbot
+Disallow: /
+
+User-agent: webcrawler
+User-agent: excite
+Disallow:
+
+User-agent: *
+Disallow: /org/plans.html
+Allow: /org/
+Allow: /serv
+Allow: /~mak
+Disallow: /
+'''
+
+WORDS = (
+    'account', 'admin', 'api', 'archive', 'blog', 'cart', 'category', 'checkout',
+    'comments', 'search', 'feed', 'images', 'login', 'media', 'news', 'page',
+    'print', 'private', 'product', 'profile', 'share', 'static', 'tag', 'user')
+
+AGENTS = (
+    'Googlebot', 'Googlebot-Image', 'Bingbot', 'Slurp', 'DuckDuckBot', 'Baiduspider',
+    'YandexBot', 'Applebot', 'facebot', 'ia_archiver', 'AhrefsBot', 'SemrushBot')
+
+
+def path(rand, depth=3):
+    '''A plausible path.'''
+    return '/' + '/'.join(rand.choice(WORDS) for _ in range(rand.randint(1, depth)))
+
+
+def wildcard(rand):
+    '''A plausible rule using wildcards.'''
+    return rand.choice((
+        path(rand) + '/*',
+        '/*' + rand.choice(WORDS) + '=',
+        '/*.' + rand.choice(('pdf', 'json', 'xml', 'php', 'cgi')) + '$',
+        path(rand, 2) + '/*/' + rand.choice(WORDS) + '*',
+        '/*?*' + rand.choice(WORDS) + '=*&'))
+
+
+def group(rand, agents, rules, wildcards=0.1):
+    '''A group of rules for agents.'''
+    lines = ['User-agent: %s' % agent for agent in agents]
+    for _ in range(rules):
+        directive = 'Allow' if rand.random() < 0.2 else 'Disallow'
+        rule = wildcard(rand) if rand.random() < wildcards else path(rand)
+        lines.append('%s: %s' % (directive, rule))
+    return '\n'.join(lines)
+
+
+def generate(seed, groups, rules, wildcards=0.1, sitemaps=1, crawl_delay=False):
+    '''Generate a robots.txt.'''
+    rand = random.Random(seed)
+    blocks = []
+    for index in range(groups - 1):
+        agent = AGENTS[index] if index < len(AGENTS) else 'bot-%d' % index
+        block = group(rand, [agent], rules, wildcards)
+        if crawl_delay:
+            block += '\nCrawl-delay: %d' % rand.randint(1, 10)
+        blocks.append(block)
+    blocks.append(group(rand, ['*'], rules, wildcards))
+    blocks.append('\n'.join(
+        'Sitemap: http://example.com/sitemap-%d.xml' % i for i in range(sitemaps)))
+    return '# Generated for benchmarks\n\n' + '\n\n'.join(blocks) + '\n'
+
+
+CORPUS = {
+    'small': SMALL,
+    # Around the median size of robots.txt on popular sites
+    'median': generate(1, groups=3, rules=12, sitemaps=2, crawl_delay=True),
+    # Close to the 500KiB that Google reads
+    'huge': generate(2, groups=40, rules=500, sitemaps=50),
+    'wildcards': generate(3, groups=2, rules=200, wildcards=1.0),
+    'many_groups': generate(4, groups=1000, rules=3)
+}
+
+# Paths checked with allowed, representative of a crawl of each file
+PATHS = [path(random.Random(seed)) for seed in range(100)] + [
+    '/org/plans.html', '/serv/index.html', '/product/123.pdf', '/search?q=reppy&page=2']
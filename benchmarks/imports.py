@@ -0,0 +1,91 @@
+#! /usr/bin/env python
+'''Report how long it takes to import reppy, and what that pulls in.
+
+Usage: python benchmarks/imports.py [--rounds N] [--max-ms MS]
+
+Each statement is run in a fresh interpreter for --rounds rounds, and the best
+time to run it is reported, less the time to start an interpreter that does
+nothing. Parsing robots.txt must not load the HTTP stack or cachetools, which
+are only needed to fetch and cache; if any of the statements that are meant to
+stay light loads one of them, or takes longer than --max-ms, this exits non-zero.
+Importing reppy.transport, which does need the HTTP stack, is only reported.
+'''
+
+from __future__ import print_function
+
+import argparse
+import json
+import subprocess
+import sys
+from timeit import default_timer
+
+
+# Top-level modules that are only needed to fetch or to cache
+DEFERRED = ('requests', 'urllib3', 'six', 'cachetools')
+
+# (statement, modules it must not load, or () if it's only reported)
+STATEMENTS = [
+    ('pass', ()),
+    ('import reppy', DEFERRED),
+    ('from reppy.robots import Robots; Robots.parse("http://a.com/robots.txt", "")',
+        DEFERRED),
+    ('import reppy.cache', ('requests', 'urllib3', 'cachetools')),
+    ('import reppy.transport', ()),
+]
+
+# Run by each interpreter: time the statement, and list what it loaded
+PROBE = '''
+import json, sys
+from timeit import default_timer
+before = set(sys.modules)
+start = default_timer()
+exec(sys.argv[1])
+elapsed = default_timer() - start
+print(json.dumps({
+    'elapsed': elapsed,
+    'loaded': sorted(set(name.split('.')[0] for name in set(sys.modules) - before))
+}))
+'''
+
+
+def probe(statement):
+    '''Run statement in a fresh interpreter, returning (seconds, modules loaded).'''
+    start = default_timer()
+    output = subprocess.check_output([sys.executable, '-c', PROBE, statement])
+    wall = default_timer() - start
+    result = json.loads(output.decode('utf-8'))
+    return wall, result['elapsed'], result['loaded']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument(
+        '--max-ms', type=float, help='Fail if a statement takes longer than this')
+    args = parser.parse_args(argv)
+
+    print('%-80s %10s %10s' % ('statement', 'import ms', 'process ms'))
+    failures = []
+    baseline = None
+    for statement, forbidden in STATEMENTS:
+        rounds = [probe(statement) for _ in range(args.rounds)]
+        wall = min(wall for wall, _, _ in rounds)
+        elapsed = min(elapsed for _, elapsed, _ in rounds)
+        loaded = rounds[0][2]
+        if baseline is None:
+            baseline = wall
+        print('%-80s %10.1f %10.1f' % (
+            statement[:80], 1000 * elapsed, 1000 * (wall - baseline)))
+        unexpected = sorted(set(loaded) & set(forbidden))
+        if unexpected:
+            failures.append('%s loads %s' % (statement, ', '.join(unexpected)))
+        if forbidden and (args.max_ms is not None) and (1000 * elapsed > args.max_ms):
+            failures.append('%s takes %.1fms' % (statement, 1000 * elapsed))
+
+    for failure in failures:
+        print('FAIL: %s' % failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+#! /usr/bin/env python
+'''Report the bytes used per cached host by RobotsCache entries.
+
+Usage: python benchmarks/memory.py [count ...]
+
+Every entry shares a single Robots object so that what's reported is the
+cost of the cache's bookkeeping (key, entry and LRU links), not the size of
+any particular robots.txt.
+'''
+
+from __future__ import print_function
+
+import gc
+import sys
+import time
+import tracemalloc
+
+from reppy.cache import RobotsCache
+from reppy.robots import AllowAll
+
+
+class SharedObjectCache(RobotsCache):
+    '''A RobotsCache where every host resolves to the same Robots object.'''
+
+    def __init__(self, *args, **kwargs):
+        RobotsCache.__init__(self, *args, **kwargs)
+        self.expires = time.time() + 3600
+        self.robots = AllowAll('http://example.com/robots.txt', self.expires)
+
+    def fetch(self, url):
+        return (self.expires, self.robots)
+
+
+def measure(count):
+    '''Return (entry bytes, key bytes) used to cache count hosts.'''
+    urls = ['http://host-%d.example.com/robots.txt' % i for i in range(count)]
+    keys = sum(sys.getsizeof(url) for url in urls)
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    cache = SharedObjectCache(count)
+    for url in urls:
+        cache.entry(url)
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(cache.cache) == count
+    return (after - before, keys)
+
+
+def main(counts):
+    print('%12s %16s %16s' % ('hosts', 'bytes/host', 'excluding key'))
+    for count in counts:
+        entries, keys = measure(count)
+        print('%12d %16.1f %16.1f' % (
+            count, float(entries + keys) / count, float(entries) / count))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000000, 10000000])
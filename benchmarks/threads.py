@@ -0,0 +1,102 @@
+#! /usr/bin/env python
+'''Report how RobotsCache lookups scale with the number of threads.
+
+Usage: python benchmarks/threads.py [--threads 1 2 4 8] [--hosts N] [--lookups N]
+
+A warm cache of --hosts robots.txt (the median of the corpus) is shared by
+each number of threads in turn, each making --lookups calls to allowed on
+random URLs. With the GIL, throughput stays flat as threads are added; on a
+free-threaded build it should grow with the number of cores.
+'''
+
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import threading
+from timeit import default_timer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import CORPUS, PATHS
+
+from reppy.cache import RobotsCache
+from reppy.transport import FakeTransport
+
+
+AGENT = 'Googlebot'
+
+
+def gil_enabled():
+    '''True unless this is a free-threaded build running without the GIL.'''
+    return getattr(sys, '_is_gil_enabled', lambda: True)()
+
+
+def warm_cache(hosts, decision_capacity=None):
+    '''A RobotsCache with the robots.txt for each of hosts already fetched.'''
+    transport = FakeTransport()
+    for host in hosts:
+        transport.add('http://%s/robots.txt' % host, 200, CORPUS['median'])
+    cache = RobotsCache(
+        len(hosts), transport=transport, decision_capacity=decision_capacity)
+    cache.prefetch(['http://%s/' % host for host in hosts])
+    return cache
+
+
+def run(cache, urls, threads):
+    '''Return the seconds it takes threads to each call allowed for every URL.'''
+    start = threading.Event()
+
+    def work(urls):
+        start.wait()
+        for url in urls:
+            cache.allowed(url, AGENT)
+
+    workers = []
+    for index in range(threads):
+        # Each thread sees the URLs in a different order
+        shuffled = list(urls)
+        random.Random(index).shuffle(shuffled)
+        workers.append(threading.Thread(target=work, args=(shuffled,)))
+    for worker in workers:
+        worker.start()
+    began = default_timer()
+    start.set()
+    for worker in workers:
+        worker.join()
+    return default_timer() - began
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--hosts', type=int, default=1000)
+    parser.add_argument('--lookups', type=int, default=20000, help='Per thread')
+    parser.add_argument(
+        '--decision-capacity', type=int, help='Memoize this many decisions')
+    args = parser.parse_args(argv)
+
+    rand = random.Random(0)
+    hosts = ['host-%d.example.com' % index for index in range(args.hosts)]
+    urls = [
+        'http://%s%s' % (rand.choice(hosts), rand.choice(PATHS))
+        for _ in range(args.lookups)]
+    cache = warm_cache(hosts, args.decision_capacity)
+
+    print('GIL enabled: %s, CPUs: %s' % (gil_enabled(), multiprocessing.cpu_count()))
+    print('%8s %14s %10s %11s' % ('threads', 'lookups/s', 'speedup', 'efficiency'))
+    baseline = None
+    for threads in args.threads:
+        rate = threads * args.lookups / run(cache, urls, threads)
+        baseline = baseline or rate / threads
+        speedup = rate / baseline
+        print('%8d %14.1f %9.2fx %10.0f%%' % (
+            threads, rate, speedup, 100.0 * speedup / threads))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
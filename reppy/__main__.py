@@ -0,0 +1,153 @@
+'''Check whether URLs are allowed to an agent by their robots.txt.
+
+Usage: python -m reppy --agent AGENT [options] [FILE ...]
+
+URLs are read one per line from each FILE, or stdin without any (or for -).
+They're checked in batches, fetching the robots.txt of each batch concurrently,
+and results are written as each batch completes, so memory use is bounded by
+the batch size and cache capacity however many URLs there are. With --offline
+or --snapshot, robots.txt are read locally rather than fetched. Snapshots are
+indexed on disk rather than read into memory.
+'''
+
+import argparse
+import io
+import itertools
+import json
+import logging
+import sys
+
+from . import logger
+from .cache import RobotsCache
+from .transport import DirectoryTransport, SnapshotTransport
+
+
+def stripped(lines):
+    '''Yield each non-blank line, stripped.'''
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def read_urls(paths, stdin):
+    '''Yield each URL in the files at paths, where - is stdin.'''
+    for path in paths or ['-']:
+        if path == '-':
+            for url in stripped(stdin):
+                yield url
+        else:
+            with io.open(path, encoding='utf-8') as fin:
+                for url in stripped(fin):
+                    yield url
+
+
+def batches(iterable, size):
+    '''Yield lists of up to size items from iterable.'''
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def tsv(url, allowed):
+    return '%s\t%s' % (url, 'allow' if allowed else 'deny')
+
+
+def jsonl(url, allowed):
+    return json.dumps({'url': url, 'allowed': allowed})
+
+
+def only(wanted):
+    '''Format only the URLs whose decision is wanted.'''
+    def formatter(url, allowed):
+        return url if allowed == wanted else None
+    return formatter
+
+
+FORMATS = {
+    'tsv': tsv,
+    'jsonl': jsonl,
+    'allowed': only(True),
+    'disallowed': only(False)
+}
+
+
+def parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m reppy', description=__doc__.split('\n')[0])
+    parser.add_argument('paths', nargs='*', metavar='FILE', help='Files of URLs')
+    parser.add_argument('-a', '--agent', required=True, help='The user agent to check')
+    parser.add_argument(
+        '-f', '--format', choices=sorted(FORMATS), default='tsv',
+        help='tsv and jsonl write every decision, and allowed and disallowed '
+             'only the URLs with that decision')
+    parser.add_argument(
+        '--batch-size', type=int, default=1000, help='URLs checked at a time')
+    parser.add_argument(
+        '--concurrency', type=int, default=RobotsCache.DEFAULT_CONCURRENCY,
+        help='robots.txt fetched at once')
+    parser.add_argument(
+        '--capacity', type=int, default=10000, help='robots.txt kept in the cache')
+    parser.add_argument('--timeout', type=float, default=10, help='Of each fetch')
+    offline = parser.add_mutually_exclusive_group()
+    offline.add_argument(
+        '--offline', metavar='DIRECTORY',
+        help='Read each robots.txt from DIRECTORY/<host>.txt instead of fetching it')
+    offline.add_argument(
+        '--snapshot', metavar='FILE',
+        help='Read robots.txt from a JSONL or WARC snapshot instead of fetching them')
+    parser.add_argument('--verbose', action='store_true', help='Log failed fetches')
+    return parser
+
+
+def transport(args):
+    '''The Transport to read robots.txt locally with, or None to fetch them.'''
+    if args.offline is not None:
+        return DirectoryTransport(args.offline)
+    if args.snapshot is not None:
+        # Hosts evicted from the cache are read from the index again, and
+        # server errors are left to the cache policy, just as when fetching
+        return SnapshotTransport.indexed(args.snapshot)
+    return None
+
+
+def cache(args, transport=None):
+    '''The RobotsCache to check URLs with, reading them from transport if provided.'''
+    kwargs = {'pool_maxsize': args.concurrency}
+    if transport is not None:
+        kwargs['transport'] = transport
+    else:
+        kwargs['timeout'] = args.timeout
+    return RobotsCache(args.capacity, **kwargs)
+
+
+def main(argv=None, stdin=None, stdout=None):
+    args = parser().parse_args(argv)
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    if not args.verbose:
+        # Failed fetches are reported as disallowed
+        logger.setLevel(logging.CRITICAL)
+
+    local = transport(args)
+    try:
+        robots = cache(args, local)
+        formatter = FORMATS[args.format]
+        for batch in batches(read_urls(args.paths, stdin), args.batch_size):
+            decisions = robots.allowed_many(batch, args.agent, args.concurrency)
+            for url, allowed in zip(batch, decisions):
+                line = formatter(url, bool(allowed))
+                if line is not None:
+                    stdout.write(line + '\n')
+            stdout.flush()
+    finally:
+        if local is not None:
+            local.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
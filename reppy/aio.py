@@ -0,0 +1,92 @@
+'''Fetching robots.txt with asyncio.'''
+
+import asyncio
+import time
+
+import aiohttp
+
+from . import exceptions
+from .timing import NULL_TIMING, FetchTiming
+
+
+async def read(res, max_size):
+    '''Read at most max_size bytes of the body of res, then one more to check.'''
+    chunks = []
+    remaining = max_size + 1
+    while remaining > 0:
+        chunk = await res.content.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    content = b''.join(chunks)
+    if len(content) > max_size:
+        raise exceptions.ContentTooLong(
+            'Content larger than %s bytes' % max_size)
+    return content
+
+
+async def get(session, url, max_size, timing, *args, **kwargs):
+    '''Return (response, content) for a GET of url.'''
+    async with session.get(url, *args, **kwargs) as res:
+        timing.mark('first_byte')
+        content = await read(res, max_size)
+        timing.mark('read')
+        return (res, content)
+
+
+async def fetch(cls, url, ttl_policy=None, max_size=1048576, *args, **kwargs):
+    '''Get the robots.txt at the provided URL, using an aiohttp session.
+
+    If no session is provided, one is created for just this fetch. Otherwise,
+    this accepts the same arguments as Robots.fetch, with *args and **kwargs
+    passed on to session.get. A deadline bounds the whole fetch, including
+    redirects and reading the body. An observer is called with its FetchTiming.
+    '''
+    after_response_hook = kwargs.pop('after_response_hook', None)
+    after_parse_hook = kwargs.pop('after_parse_hook', None)
+    session = kwargs.pop('session', None)
+    deadline = kwargs.pop('deadline', None)
+    expires = None if deadline is None else time.time() + deadline
+    observer = kwargs.pop('observer', None)
+    timing = NULL_TIMING if observer is None else FetchTiming(url, observer)
+    def wrap_exception(etype, cause):
+        wrapped = etype(cause)
+        wrapped.url = url
+        if after_response_hook is not None:
+            after_response_hook(wrapped)
+        raise wrapped
+    with timing:
+        owned = session is None
+        if owned:
+            session = aiohttp.ClientSession()
+        try:
+            request = get(session, url, max_size, timing, *args, **kwargs)
+            if deadline is not None:
+                request = asyncio.wait_for(request, deadline)
+            res, content = await request
+            timing.record(status=res.status, bytes=len(content))
+
+            if after_response_hook is not None:
+                after_response_hook(res)
+                timing.mark('response_hook')
+
+            return cls.from_response(
+                url, res.status, content, res, ttl_policy, after_parse_hook, timing)
+        except aiohttp.ClientSSLError as exc:
+            wrap_exception(exceptions.SSLException, exc)
+        except aiohttp.ClientConnectorError as exc:
+            wrap_exception(exceptions.ConnectionException, exc)
+        except asyncio.TimeoutError as exc:
+            if (expires is not None) and time.time() >= expires:
+                wrap_exception(exceptions.DeadlineExceeded, exc)
+            wrap_exception(exceptions.ReadTimeout, exc)
+        except aiohttp.ClientConnectionError as exc:
+            wrap_exception(exceptions.ConnectionException, exc)
+        except aiohttp.InvalidURL as exc:
+            wrap_exception(exceptions.MalformedUrl, exc)
+        except aiohttp.TooManyRedirects as exc:
+            wrap_exception(exceptions.ExcessiveRedirects, exc)
+        finally:
+            if owned:
+                await session.close()
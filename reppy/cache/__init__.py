@@ -1,40 +1,104 @@
 '''A robots.txt cache.'''
 
-from functools import partial
+from concurrent import futures
+import itertools
 import threading
 import time
+from timeit import default_timer
 
-from cachetools import LRUCache
-
+from .metrics import CacheMetrics, CostSampler
 from .policy import DefaultObjectPolicy, ReraiseExceptionPolicy
-from ..robots import Robots, AllowNone, Agent
-from .. import logger
+from ..robots import Robots, AllowNone, Agent, NotModified
+from ..exceptions import CircuitOpen
+from .. import logger, snapshot
 
 
 class ExpiringObject(object):
-    '''Wrap an object that expires over time.'''
+    '''An object that expires over time.'''
 
-    def __init__(self, factory):
-        self.factory = factory
-        self.lock = threading.Lock()
-        self.obj = None
-        self.expires = 0
-        self.exception = None
+    # There can be tens of millions of these, so they carry no per-entry lock
+    # or factory. Exceptions are stored in obj and reraised on get.
+    __slots__ = ('expires', 'obj')
+
+    def __init__(self, expires, obj):
+        self.expires = expires
+        self.obj = obj
+
+    @property
+    def expired(self):
+        '''True if the current time is past its expiration.'''
+        return time.time() >= self.expires
 
     def get(self):
         '''Get the wrapped object.'''
-        if (self.obj is None) or (time.time() >= self.expires):
-            with self.lock:
-                self.expires, self.obj = self.factory()
-                if isinstance(self.obj, BaseException):
-                    self.exception = self.obj
-                else:
-                    self.exception = None
+        if isinstance(self.obj, BaseException):
+            raise self.obj
+        return self.obj
+
+
+class SubstituteObject(ExpiringObject):
+    '''An ExpiringObject the cache_policy provided in place of a failed fetch.'''
+
+    __slots__ = ()
+
+
+class StripedLock(object):
+    '''A fixed number of locks shared by an unbounded number of keys.'''
+
+    def __init__(self, stripes):
+        self.locks = tuple(threading.Lock() for _ in range(stripes))
+
+    def __call__(self, key):
+        '''Get the lock that guards key.'''
+        return self.locks[hash(key) % len(self.locks)]
+
+
+class PrefetchSummary(object):
+    '''The outcome of a BaseCache.prefetch.'''
+
+    def __init__(self):
+        # Robots URLs that were already fresh in the cache
+        self.fresh = []
+        # Robots URL => seconds taken, for each successful fetch
+        self.fetched = {}
+        # Robots URL => exception, for each failed fetch
+        self.failed = {}
+        # Robots URLs that did not complete before the deadline
+        self.pending = []
+        self.elapsed = 0
+
+    def __repr__(self):
+        return '<PrefetchSummary fresh=%i fetched=%i failed=%i pending=%i in %.3fs>' % (
+            len(self.fresh), len(self.fetched), len(self.failed), len(self.pending),
+            self.elapsed)
 
-        if self.exception:
-            raise self.exception
-        else:
-            return self.obj
+
+def filtered(decisions, pairs):
+    '''Yield each allowed URL of (url, allowed) decisions, or every pair if pairs.'''
+    for url, allowed in decisions:
+        if pairs:
+            yield (url, allowed)
+        elif allowed:
+            yield url
+
+
+class SnapshotSummary(object):
+    '''The outcome of a BaseCache.load_snapshot.'''
+
+    def __init__(self):
+        # Records put in the cache
+        self.loaded = 0
+        # Records that had already expired
+        self.expired = 0
+        # Records that could not be loaded, like those of server errors
+        self.failed = 0
+        # Records skipped because the cache had a fresh entry
+        self.skipped = 0
+        self.elapsed = 0
+
+    def __repr__(self):
+        return '<SnapshotSummary loaded=%i expired=%i failed=%i skipped=%i in %.3fs>' % (
+            self.loaded, self.expired, self.failed, self.skipped, self.elapsed)
 
 
 class BaseCache(object):
@@ -43,35 +107,528 @@ class BaseCache(object):
     DEFAULT_CACHE_POLICY = ReraiseExceptionPolicy(ttl=600)
     DEFAULT_TTL_POLICY = Robots.DEFAULT_TTL_POLICY
 
+    # Number of locks shared among all entries to guard which are being fetched
+    LOCK_STRIPES = 64
+
+    # Number of robots.txt fetched at once by the bulk methods
+    DEFAULT_CONCURRENCY = 10
+    # How long to remember where a robots.txt redirects to
+    ALIAS_TTL = 86400
+    # Number of snapshot records read into memory at a time
+    SNAPSHOT_BATCH_SIZE = 1000
+    # Number of URLs the streaming methods read ahead
+    DEFAULT_WINDOW = 1000
+
     def __init__(self, capacity, cache_policy=None, ttl_policy=None, *args, **kwargs):
         self.cache_policy = cache_policy or self.DEFAULT_CACHE_POLICY
         self.ttl_policy = ttl_policy or self.DEFAULT_TTL_POLICY
-        self.cache = LRUCache(maxsize=capacity)
+        # cachetools is only imported once a cache is made
+        from .lru import LRUCache, EntryCache, DecisionCache
+        self.metrics = CacheMetrics(self)
+        self.cache = EntryCache(capacity, self.metrics.evictions)
+        # Robots URL => (expiration, URL it redirected to)
+        self.aliases = LRUCache(maxsize=capacity)
+        self.alias_ttl = kwargs.pop('alias_ttl', self.ALIAS_TTL)
+        # Optionally memoize decisions for repeatedly-checked URLs
+        decision_capacity = kwargs.pop('decision_capacity', None)
+        self.decisions = None
+        if decision_capacity:
+            self.decisions = DecisionCache(decision_capacity)
+        # Optionally time a fraction of decisions, to find the most expensive robots.txt
+        sample_rate = kwargs.pop('sample_rate', None)
+        self.sampler = None
+        if sample_rate:
+            self.sampler = CostSampler(sample_rate)
+        self.locks = StripedLock(self.LOCK_STRIPES)
+        # Robots URL => Future of (entry, exception), for each fetch in progress.
+        # Only touched under the robots URL's lock, which is never held while
+        # fetching, so hosts that share a lock don't wait on each other's I/O
+        self.pending = {}
+        # Guards cache, aliases and decisions, which aren't safe for concurrent
+        # use even with the GIL, let alone without it
+        self.lock = threading.Lock()
+        # All fetches share a pooled session, unless one is provided
+        pool_connections = kwargs.pop('pool_connections', 100)
+        pool_maxsize = kwargs.pop('pool_maxsize', self.DEFAULT_CONCURRENCY)
+        keep_alive = kwargs.pop('keep_alive', True)
+        # An optional CachingResolver for the pooled session to resolve hosts with
+        self.resolver = kwargs.pop('resolver', None)
+        if (kwargs.get('session') is None) and (kwargs.get('transport') is None):
+            from ..session import pooled_session
+            kwargs['session'] = pooled_session(
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+                keep_alive=keep_alive,
+                resolver=self.resolver)
+        self.session = kwargs.get('session')
         self.args = args
         self.kwargs = kwargs
 
     def get(self, url):
         '''Get the entity that corresponds to URL.'''
+        return self.entry(Robots.robots_url(url)).get()
+
+    def decide(self, url, agent, func):
+        '''
+        Return func(obj) for the object cached for url. If decisions are cached,
+        the result is memoized for (url, agent) until the entry it was derived
+        from expires or is replaced.
+        '''
+        if (self.sampler is not None) and self.sampler.sampled():
+            func = self.sampler.timed(Robots.robots_url(url), func)
+
+        if self.decisions is None:
+            return func(self.get(url))
+
+        # Fragments have no bearing on the decision
+        key = (url.partition('#')[0], agent)
+        with self.lock:
+            found = self.decisions.get(key)
+            if found is not None:
+                robots_url, entry, decision = found
+                if (not entry.expired) and (self.cache.get(robots_url) is entry):
+                    self.decisions.hits += 1
+                    return decision
+            self.decisions.misses += 1
+
         robots_url = Robots.robots_url(url)
-        if robots_url not in self.cache:
-            self.cache[robots_url] = ExpiringObject(partial(self.factory, robots_url))
-        return self.cache[robots_url].get()
+        entry = self.entry(robots_url)
+        decision = func(entry.get())
+        with self.lock:
+            self.decisions[key] = (robots_url, entry, decision)
+        return decision
+
+    def cached(self, robots_url):
+        '''Return the ExpiringObject in the cache for robots_url, or None.'''
+        with self.lock:
+            return self.cache.get(robots_url)
+
+    def store(self, robots_url, entry):
+        '''Put entry in the cache for robots_url.'''
+        with self.lock:
+            self.cache[robots_url] = entry
 
-    def factory(self, url):
+    def fresh(self, robots_url):
+        '''Return the fresh ExpiringObject for robots_url, or None if there is none.'''
+        entry = self.cached(robots_url)
+        if (entry is None) or entry.expired:
+            self.metrics.misses.inc()
+            return None
+        self.metrics.hits.inc()
+        return entry
+
+    def stale(self, robots_url):
+        '''True if there's no fresh entry for robots_url, without counting a lookup.'''
+        entry = self.cached(robots_url)
+        return (entry is None) or entry.expired
+
+    def entry(self, robots_url):
+        '''Get the fresh ExpiringObject for robots_url, fetching as necessary.'''
+        entry = self.fresh(robots_url)
+        if entry is None:
+            entry, _ = self.refresh(robots_url)
+        return entry
+
+    def refresh(self, robots_url):
+        '''
+        Fetch robots_url into the cache, exercising the cache_policy as necessary,
+        unless another thread has just done so, or is doing so already, in which
+        case its result is shared. Return (entry, exception), where exception is
+        whatever fetch raised, if anything.
+        '''
+        canonical = self.canonical(robots_url)
+        if canonical != robots_url:
+            # Skip the redirects, sharing the fetch of where they lead
+            entry, exception = self.refresh(canonical)
+            entry = self.rebase(entry, robots_url)
+            self.store(robots_url, entry)
+            return (entry, exception)
+
+        lock = self.locks(robots_url)
+        began = default_timer()
+        with lock:
+            entry = self.cached(robots_url)
+            if (entry is not None) and not entry.expired:
+                self.metrics.lock_wait_seconds.observe(default_timer() - began)
+                return (entry, None)
+            pending = self.pending.get(robots_url)
+            if pending is None:
+                pending = self.pending[robots_url] = futures.Future()
+                waiting = False
+            else:
+                waiting = True
+
+        if waiting:
+            # Another thread is already fetching it, so share its result
+            try:
+                return pending.result()
+            finally:
+                self.metrics.lock_wait_seconds.observe(default_timer() - began)
+
+        self.metrics.lock_wait_seconds.observe(default_timer() - began)
+        try:
+            result = self.load(robots_url)
+        except BaseException as exc:
+            pending.set_exception(exc)
+            raise
+        else:
+            pending.set_result(result)
+        finally:
+            with lock:
+                del self.pending[robots_url]
+        return result
+
+    def load(self, robots_url):
         '''
-        Return (expiration, obj) corresponding to provided url, exercising the
-        cache_policy as necessary.
+        Fetch robots_url into the cache, exercising the cache_policy as necessary.
+        Return (entry, exception), where exception is whatever fetch raised.
         '''
         try:
-            return self.fetch(url)
+            self.cache_policy.attempt(robots_url)
+            self.metrics.fetches.inc()
+            began = default_timer()
+            try:
+                entry = ExpiringObject(*self.fetch(robots_url))
+            finally:
+                self.metrics.fetch_seconds.observe(default_timer() - began)
+            self.cache_policy.success(robots_url)
+            exception = None
         except BaseException as exc:
-            logger.exception('Reppy cache fetch error on %s' % url)
-            return self.cache_policy.exception(url, exc)
+            if not isinstance(exc, CircuitOpen):
+                logger.exception('Reppy cache fetch error on %s' % robots_url)
+            self.metrics.failures.inc(type(exc).__name__)
+            entry = SubstituteObject(*self.cache_policy.exception(robots_url, exc))
+            exception = exc
+        self.store(robots_url, entry)
+        canonical = self.canonical(robots_url)
+        if canonical != robots_url:
+            self.store(canonical, self.rebase(entry, canonical))
+        return (entry, exception)
+
+    def rebase(self, entry, robots_url):
+        '''
+        Return an ExpiringObject with the rules of entry, for robots_url, which
+        redirects to the same place. Rules only apply to URLs on the host of the
+        robots.txt they were parsed for, so each one gets its own copy, parsed
+        from the shared robots.txt with the same validators and expiration.
+        '''
+        if isinstance(entry, SubstituteObject) or isinstance(entry.obj, BaseException):
+            return entry
+        from ..transport import FakeResponse
+        response = FakeResponse(
+            getattr(entry.obj, 'url', None) or robots_url, 200,
+            self.validator_headers(entry.obj), b'')
+        robots = Robots.from_response(
+            robots_url, 200, self.content(entry.obj), response, self.ttl_policy)
+        robots.expires = entry.expires
+        return ExpiringObject(entry.expires, self.build(robots))
+
+    def canonical(self, robots_url):
+        '''Return the URL that robots_url redirects to, or itself.'''
+        with self.lock:
+            alias = self.aliases.get(robots_url)
+        if (alias is None) or time.time() >= alias[0]:
+            return robots_url
+        return alias[1]
+
+    def redirected(self, robots_url, url):
+        '''Remember that robots_url was ultimately fetched from url.'''
+        with self.lock:
+            if url == robots_url:
+                self.aliases.pop(robots_url, None)
+            else:
+                self.aliases[robots_url] = (time.time() + self.alias_ttl, url)
+                # Where redirects lead can't itself be an alias
+                self.aliases.pop(url, None)
+
+    def entries(self, robots_urls, concurrency=None):
+        '''
+        Return a dict of robots_url to fresh ExpiringObject, fetching any that are
+        missing or expired concurrently.
+        '''
+        found = {}
+        missing = []
+        for robots_url in robots_urls:
+            entry = self.fresh(robots_url)
+            if entry is None:
+                missing.append(robots_url)
+            else:
+                found[robots_url] = entry
+
+        if missing:
+            workers = min(concurrency or self.DEFAULT_CONCURRENCY, len(missing))
+            with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                found.update(zip(missing, (entry for entry, _ in executor.map(
+                    self.refresh, missing))))
+        return found
+
+    def prefetch(self, urls, concurrency=None, deadline=None, callback=None):
+        '''
+        Warm the cache with the robots.txt for each of urls, fetching those that
+        are not already fresh concurrently, and return a PrefetchSummary.
+
+        If deadline is provided, return after at most that many seconds. Fetches
+        which have not started by then are abandoned, and those in flight finish
+        in the background. If provided, callback(robots_url, exception) is called
+        from the fetching thread as soon as each robots.txt is in the cache;
+        exception is what the fetch raised, or None if it succeeded.
+        '''
+        start = time.time()
+        summary = PrefetchSummary()
+        missing = []
+        for robots_url in set(Robots.robots_url(url) for url in urls):
+            if self.fresh(robots_url) is None:
+                missing.append(robots_url)
+            else:
+                summary.fresh.append(robots_url)
+
+        if not missing:
+            summary.elapsed = time.time() - start
+            return summary
+
+        def load(robots_url):
+            began = time.time()
+            _, exception = self.refresh(robots_url)
+            if callback is not None:
+                callback(robots_url, exception)
+            return (robots_url, exception, time.time() - began)
+
+        workers = min(concurrency or self.DEFAULT_CONCURRENCY, len(missing))
+        executor = futures.ThreadPoolExecutor(max_workers=workers)
+        pending = dict((executor.submit(load, url), url) for url in missing)
+        try:
+            timeout = None if deadline is None else max(0, deadline)
+            for future in futures.as_completed(pending, timeout=timeout):
+                robots_url, exception, duration = future.result()
+                del pending[future]
+                if exception is None:
+                    summary.fetched[robots_url] = duration
+                else:
+                    summary.failed[robots_url] = exception
+        except futures.TimeoutError:
+            for future, robots_url in pending.items():
+                future.cancel()
+                summary.pending.append(robots_url)
+        finally:
+            executor.shutdown(wait=False)
+
+        summary.elapsed = time.time() - start
+        return summary
+
+    def map_groups(self, urls, func, concurrency=None):
+        '''
+        Group urls by robots.txt URL, and call func(obj, group) once for each with
+        the cached object and the list of its URLs. func returns one result per
+        URL in the group, and the results are returned in the order of urls.
+        '''
+        urls = list(urls)
+        groups = {}
+        for index, url in enumerate(urls):
+            groups.setdefault(Robots.robots_url(url), []).append(index)
+
+        entries = self.entries(groups, concurrency)
+        results = [None] * len(urls)
+        for robots_url, indices in groups.items():
+            obj = entries[robots_url].get()
+            group = [urls[index] for index in indices]
+            if (self.sampler is not None) and self.sampler.sampled():
+                values = self.sampler.timed(robots_url, func, len(group))(obj, group)
+            else:
+                values = func(obj, group)
+            for index, value in zip(indices, values):
+                results[index] = value
+        return results
+
+    def map_stream(self, urls, func, window=None, concurrency=None):
+        '''
+        Lazily yield (url, result) for each of urls in order, where results are
+        those of map_groups for window URLs at a time. While one window is
+        being decided, the robots.txt missing for the next are fetched
+        concurrently, so at most two windows of URLs are held at once however
+        long urls is.
+        '''
+        urls = iter(urls)
+        window = window or self.DEFAULT_WINDOW
+        workers = concurrency or self.DEFAULT_CONCURRENCY
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+
+            def read_ahead():
+                '''Read the next window, and start fetching what it's missing.'''
+                batch = list(itertools.islice(urls, window))
+                robots_urls = set(Robots.robots_url(url) for url in batch)
+                # Only map_groups counts the lookups, as hits or misses
+                fetches = [
+                    executor.submit(self.refresh, robots_url) for robots_url in robots_urls
+                    if self.stale(robots_url)]
+                return (batch, fetches)
+
+            batch, fetches = read_ahead()
+            while batch:
+                upcoming = read_ahead()
+                futures.wait(fetches)
+                for pair in zip(batch, self.map_groups(batch, func, concurrency)):
+                    yield pair
+                batch, fetches = upcoming
+
+    def most_expensive(self, count=10):
+        '''
+        Return the count robots.txt whose sampled decisions took the longest on
+        average, most expensive first, as dicts of the url, the number of
+        samples, the mean and max seconds per URL, and the stats of the cached
+        object (or None).
+        '''
+        if self.sampler is None:
+            return []
+        results = []
+        for robots_url, samples, mean, most in self.sampler.top(count):
+            entry = self.cached(robots_url)
+            results.append({
+                'url': robots_url,
+                'samples': samples,
+                'mean': mean,
+                'max': most,
+                'stats': getattr(None if entry is None else entry.obj, 'stats', None)
+            })
+        return results
+
+    def load_snapshot(self, path, concurrency=None, batch_size=None, ttl=None):
+        '''
+        Warm the cache from the JSONL or WARC snapshot at path (see
+        reppy.snapshot), and return a SnapshotSummary. Each record's expiration
+        is the one it was dumped with, or the ttl_policy's TTL for its headers
+        from when it was fetched, unless ttl is provided, in which case every
+        record expires ttl seconds from now. Records that have already expired
+        are dropped, as are those that the cache has a fresh entry for. Records
+        are read batch_size at a time, and parsed concurrently.
+        '''
+        start = time.time()
+        summary = SnapshotSummary()
+        records = snapshot.read(path)
+        batch_size = batch_size or self.SNAPSHOT_BATCH_SIZE
+        workers = concurrency or self.DEFAULT_CONCURRENCY
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                batch = list(itertools.islice(records, batch_size))
+                if not batch:
+                    break
+                restored = executor.map(lambda record: self.restore(record, ttl), batch)
+                for robots_url, entry in restored:
+                    if entry is None:
+                        summary.expired += 1
+                    elif isinstance(entry, BaseException):
+                        summary.failed += 1
+                    elif not self.stale(robots_url):
+                        summary.skipped += 1
+                    else:
+                        self.store(robots_url, entry)
+                        summary.loaded += 1
+        summary.elapsed = time.time() - start
+        return summary
+
+    def restore(self, record, ttl=None):
+        '''
+        Return (robots_url, entry) for a snapshot record, where entry is its
+        ExpiringObject, None if it has expired, or the exception raised if it
+        can't be loaded. If ttl is provided, it expires ttl seconds from now.
+        '''
+        robots_url = Robots.robots_url(record.url)
+        from ..transport import FakeResponse
+        now = time.time()
+        response = FakeResponse(record.url, record.status, record.headers, record.content)
+        try:
+            expires = record.expires
+            if ttl is not None:
+                expires = now + ttl
+            elif expires is None:
+                fetched = now if record.fetched is None else record.fetched
+                expires = fetched + self.ttl_policy.ttl(response)
+            if expires <= now:
+                return (robots_url, None)
+            robots = Robots.from_response(
+                record.url, record.status, record.content, response, self.ttl_policy)
+            robots.expires = expires
+            return (robots_url, ExpiringObject(expires, self.build(robots)))
+        except Exception as exc:
+            logger.info('Could not load %s from snapshot: %r', record.url, exc)
+            return (robots_url, exc)
+
+    def dump_snapshot(self, path):
+        '''
+        Write the fresh entries of the cache to a JSONL snapshot at path, with
+        their expirations, returning how many were written. Failures, and what
+        the cache_policy substituted for them, aren't written, and neither are
+        the entries kept under where redirects led, which load_snapshot would
+        mistake for the robots.txt of their host. Each robots.txt is written as
+        the cache understood it.
+        '''
+        with self.lock:
+            entries = list(self.cache.items())
+        now = time.time()
+
+        def records():
+            for robots_url, entry in entries:
+                if entry.expired or isinstance(entry, SubstituteObject) or \
+                        isinstance(entry.obj, BaseException):
+                    continue
+                if Robots.robots_url(robots_url) != robots_url:
+                    continue
+                yield snapshot.Record(
+                    robots_url, 200, self.validator_headers(entry.obj),
+                    self.content(entry.obj), now, entry.expires)
+
+        return snapshot.write(path, records())
+
+    @staticmethod
+    def validators(obj):
+        '''Return the etag and last_modified a cached obj was fetched with.'''
+        if isinstance(obj, tuple):
+            obj = obj[0]
+        return {
+            'etag': getattr(obj, 'etag', None),
+            'last_modified': getattr(obj, 'last_modified', None)
+        }
+
+    @classmethod
+    def validator_headers(cls, obj):
+        '''Return the ETag and Last-Modified headers a cached obj was fetched with.'''
+        validators = cls.validators(obj)
+        headers = {}
+        if validators['etag'] is not None:
+            headers['etag'] = validators['etag']
+        if validators['last_modified'] is not None:
+            headers['last-modified'] = validators['last_modified']
+        return headers
+
+    def revalidate(self, url, build):
+        '''
+        Return (expiration, obj) for the robots.txt at the provided URL, where obj
+        is build(robots) for the fetched Robots. If the cached obj has an ETag or
+        Last-Modified, the fetch is conditional, and it's kept if unchanged.
+        '''
+        entry = self.cached(url)
+        previous = None if entry is None else entry.obj
+        kwargs = dict(self.kwargs, **self.validators(previous))
+        robots = Robots.fetch(url, ttl_policy=self.ttl_policy, *self.args, **kwargs)
+        if isinstance(robots, NotModified):
+            self.metrics.not_modified.inc()
+            if isinstance(previous, Robots):
+                previous.expires = robots.expires
+            return (robots.expires, previous)
+        self.redirected(url, robots.url)
+        return (robots.expires, build(robots))
 
     def fetch(self, url):
         '''Return (expiration, obj) corresponding to provided url.'''
         raise NotImplementedError('BaseCache does not implement fetch.')
 
+    def build(self, robots):
+        '''Return the obj to cache for a fetched Robots.'''
+        raise NotImplementedError('BaseCache does not implement build.')
+
+    def content(self, obj):
+        '''Return a robots.txt equivalent to a cached obj.'''
+        raise NotImplementedError('BaseCache does not implement content.')
+
 
 class RobotsCache(BaseCache):
     '''A cache of Robots objects.'''
@@ -80,13 +637,31 @@ class RobotsCache(BaseCache):
 
     def allowed(self, url, agent):
         '''Return true if the provided URL is allowed to agent.'''
-        return self.get(url).allowed(url, agent)
+        return self.decide(url, agent, lambda robots: robots.allowed(url, agent))
+
+    def allowed_many(self, urls, agent, concurrency=None):
+        '''Return a list of whether each of the provided URLs is allowed to agent.'''
+        return self.map_groups(
+            urls, lambda robots, group: robots.allowed_many(group, agent), concurrency)
+
+    def filter_allowed(self, urls, agent, window=None, pairs=False, concurrency=None):
+        '''
+        Lazily yield the URLs of the iterable urls that are allowed to agent, or
+        (url, allowed) for every URL if pairs, in order. See map_stream.
+        '''
+        return filtered(self.map_stream(
+            urls, lambda robots, group: robots.allowed_many(group, agent),
+            window, concurrency), pairs)
 
     def fetch(self, url):
         '''Return (expiration, Robots) for the robots.txt at the provided URL.'''
-        robots = Robots.fetch(
-            url, ttl_policy=self.ttl_policy, *self.args, **self.kwargs)
-        return (robots.expires, robots)
+        return self.revalidate(url, self.build)
+
+    def build(self, robots):
+        return robots
+
+    def content(self, robots):
+        return robots.robots_txt()
 
 
 class AgentCache(BaseCache):
@@ -101,10 +676,113 @@ class AgentCache(BaseCache):
 
     def allowed(self, url):
         '''Return true if the provided URL is allowed to self.agent.'''
-        return self.get(url).allowed(url)
+        return self.decide(url, None, lambda agent: agent.allowed(url))
+
+    def allowed_many(self, urls, concurrency=None):
+        '''Return a list of whether each of the provided URLs is allowed to self.agent.'''
+        return self.map_groups(
+            urls, lambda agent, group: agent.allowed_many(group), concurrency)
+
+    def filter_allowed(self, urls, window=None, pairs=False, concurrency=None):
+        '''
+        Lazily yield the URLs of the iterable urls that are allowed to
+        self.agent, or (url, allowed) for every URL if pairs, in order. See
+        map_stream.
+        '''
+        return filtered(self.map_stream(
+            urls, lambda agent, group: agent.allowed_many(group),
+            window, concurrency), pairs)
 
     def fetch(self, url):
         '''Return (expiration, Agent) for the robots.txt at the provided URL.'''
-        robots = Robots.fetch(
-            url, ttl_policy=self.ttl_policy, *self.args, **self.kwargs)
-        return (robots.expires, robots.agent(self.agent))
+        return self.revalidate(url, self.build)
+
+    def build(self, robots):
+        return robots.agent(self.agent)
+
+    def content(self, agent):
+        return agent.robots_txt([self.agent])
+
+
+class MultiAgentCache(BaseCache):
+    '''A cache of the Agent objects for several agents, fetched together.'''
+
+    DEFAULT_CACHE_POLICY = AgentCache.DEFAULT_CACHE_POLICY
+
+    def __init__(self, agents, *args, **kwargs):
+        BaseCache.__init__(self, *args, **kwargs)
+        self.agents = tuple(agents)
+        self.index = dict((name, index) for index, name in enumerate(self.agents))
+
+    def position(self, name):
+        '''Return the position of name in self.agents.'''
+        try:
+            return self.index[name]
+        except KeyError:
+            raise ValueError('Agent %s is not one of %s' % (name, self.agents))
+
+    @staticmethod
+    def select(obj, index):
+        '''Return the Agent at index from a cached object.'''
+        # A single Agent applies to every agent
+        if isinstance(obj, Agent):
+            return obj
+        return obj[index]
+
+    def agent(self, url, name):
+        '''Return the Agent for name that applies to the provided URL.'''
+        index = self.position(name)
+        return self.select(self.get(url), index)
+
+    def allowed(self, url, agent):
+        '''Return true if the provided URL is allowed to agent.'''
+        index = self.position(agent)
+        return self.decide(
+            url, agent, lambda obj: self.select(obj, index).allowed(url))
+
+    def allowed_many(self, urls, agent, concurrency=None):
+        '''Return a list of whether each of the provided URLs is allowed to agent.'''
+        index = self.position(agent)
+        return self.map_groups(
+            urls, lambda obj, group: self.select(obj, index).allowed_many(group),
+            concurrency)
+
+    def filter_allowed(self, urls, agent, window=None, pairs=False, concurrency=None):
+        '''
+        Lazily yield the URLs of the iterable urls that are allowed to agent, or
+        (url, allowed) for every URL if pairs, in order. See map_stream.
+        '''
+        index = self.position(agent)
+        return filtered(self.map_stream(
+            urls, lambda obj, group: self.select(obj, index).allowed_many(group),
+            window, concurrency), pairs)
+
+    def fetch(self, url):
+        '''
+        Return (expiration, agents) for the robots.txt at the provided URL, where
+        agents is either a tuple of the Agent for each of self.agents, or a single
+        Agent if they all share the same rules.
+        '''
+        return self.revalidate(url, self.build)
+
+    def build(self, robots):
+        return self.split(robots)
+
+    def content(self, obj):
+        # One group for each agent, or one for them all if they share their rules
+        if isinstance(obj, Agent):
+            return obj.robots_txt(self.agents)
+        return '\n'.join(
+            agent.robots_txt([name]) for name, agent in zip(self.agents, obj))
+
+    def split(self, robots):
+        '''Return the Agent for each of self.agents, or one Agent for them all.'''
+        # Agents with identical rules share one copy
+        distinct = {}
+        agents = []
+        for name in self.agents:
+            agent = robots.agent(name)
+            agents.append(distinct.setdefault(str(agent), agent))
+        if len(distinct) == 1:
+            return agents[0]
+        return tuple(agents)
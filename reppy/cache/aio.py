@@ -0,0 +1,137 @@
+'''robots.txt caches for use with asyncio.'''
+
+import asyncio
+
+import aiohttp
+from cachetools import LRUCache
+
+from . import ExpiringObject, BaseCache, RobotsCache, AgentCache
+from ..robots import Robots
+from ..exceptions import CircuitOpen
+from .. import logger
+
+
+class AsyncBaseCache(object):
+    '''A base cache class for use with asyncio.'''
+
+    DEFAULT_CACHE_POLICY = BaseCache.DEFAULT_CACHE_POLICY
+    DEFAULT_TTL_POLICY = Robots.DEFAULT_TTL_POLICY
+
+    def __init__(self, capacity, cache_policy=None, ttl_policy=None, *args, **kwargs):
+        self.cache_policy = cache_policy or self.DEFAULT_CACHE_POLICY
+        self.ttl_policy = ttl_policy or self.DEFAULT_TTL_POLICY
+        self.cache = LRUCache(maxsize=capacity)
+        # Robots URL => the task fetching it, shared by concurrent lookups
+        self.pending = {}
+        # An aiohttp session, created on first use unless one is provided
+        self.session = kwargs.pop('session', None)
+        self.owns_session = self.session is None
+        self.pool_connections = kwargs.pop('pool_connections', 100)
+        self.pool_maxsize = kwargs.pop('pool_maxsize', 10)
+        self.keep_alive = kwargs.pop('keep_alive', True)
+        self.args = args
+        self.kwargs = kwargs
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        '''Close the session, if it was created by this cache.'''
+        if self.owns_session and (self.session is not None):
+            await self.session.close()
+            self.session = None
+
+    async def get(self, url):
+        '''Get the entity that corresponds to URL.'''
+        entry = await self.entry(Robots.robots_url(url))
+        return entry.get()
+
+    async def entry(self, robots_url):
+        '''Get the fresh ExpiringObject for robots_url, fetching as necessary.'''
+        entry = self.cache.get(robots_url)
+        if (entry is None) or entry.expired:
+            entry, _ = await self.refresh(robots_url)
+        return entry
+
+    def refresh(self, robots_url):
+        '''
+        Return an awaitable of (entry, exception) for a fetch of robots_url into
+        the cache. Concurrent refreshes of the same robots_url share one fetch.
+        '''
+        task = self.pending.get(robots_url)
+        if task is None:
+            task = asyncio.ensure_future(self.load(robots_url))
+            self.pending[robots_url] = task
+            task.add_done_callback(lambda _: self.pending.pop(robots_url, None))
+        # A cancelled waiter shouldn't cancel the fetch for everyone else
+        return asyncio.shield(task)
+
+    async def load(self, robots_url):
+        '''
+        Fetch robots_url into the cache, exercising the cache_policy as necessary.
+        Return (entry, exception), where exception is whatever fetch raised.
+        '''
+        try:
+            self.cache_policy.attempt(robots_url)
+            entry = ExpiringObject(*(await self.fetch(robots_url)))
+            self.cache_policy.success(robots_url)
+            exception = None
+        except Exception as exc:
+            if not isinstance(exc, CircuitOpen):
+                logger.exception('Reppy cache fetch error on %s' % robots_url)
+            entry = ExpiringObject(*self.cache_policy.exception(robots_url, exc))
+            exception = exc
+        self.cache[robots_url] = entry
+        return (entry, exception)
+
+    async def fetch_robots(self, url):
+        '''Fetch the Robots at the provided URL, using this cache's session.'''
+        if self.session is None:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+                limit=self.pool_connections,
+                limit_per_host=self.pool_maxsize,
+                force_close=not self.keep_alive))
+        return await Robots.afetch(
+            url, ttl_policy=self.ttl_policy, session=self.session,
+            *self.args, **self.kwargs)
+
+    async def fetch(self, url):
+        '''Return (expiration, obj) corresponding to provided url.'''
+        raise NotImplementedError('AsyncBaseCache does not implement fetch.')
+
+
+class AsyncRobotsCache(AsyncBaseCache):
+    '''A cache of Robots objects, for use with asyncio.'''
+
+    DEFAULT_CACHE_POLICY = RobotsCache.DEFAULT_CACHE_POLICY
+
+    async def allowed(self, url, agent):
+        '''Return true if the provided URL is allowed to agent.'''
+        return (await self.get(url)).allowed(url, agent)
+
+    async def fetch(self, url):
+        '''Return (expiration, Robots) for the robots.txt at the provided URL.'''
+        robots = await self.fetch_robots(url)
+        return (robots.expires, robots)
+
+
+class AsyncAgentCache(AsyncBaseCache):
+    '''A cache of Agent objects, for use with asyncio.'''
+
+    DEFAULT_CACHE_POLICY = AgentCache.DEFAULT_CACHE_POLICY
+
+    def __init__(self, agent, *args, **kwargs):
+        AsyncBaseCache.__init__(self, *args, **kwargs)
+        self.agent = agent
+
+    async def allowed(self, url):
+        '''Return true if the provided URL is allowed to self.agent.'''
+        return (await self.get(url)).allowed(url)
+
+    async def fetch(self, url):
+        '''Return (expiration, Agent) for the robots.txt at the provided URL.'''
+        robots = await self.fetch_robots(url)
+        return (robots.expires, robots.agent(self.agent))
@@ -0,0 +1,34 @@
+'''The bounded caches BaseCache keeps its entries and decisions in.'''
+
+from cachetools import LRUCache
+
+
+class EntryCache(LRUCache):
+    '''
+    An LRUCache that counts its evictions in a Counter. Like any LRUCache, even
+    reads reorder it, so BaseCache only uses it while holding its lock.
+    '''
+
+    def __init__(self, maxsize, evictions):
+        LRUCache.__init__(self, maxsize=maxsize)
+        self.evictions = evictions
+
+    def popitem(self):
+        item = LRUCache.popitem(self)
+        self.evictions.inc()
+        return item
+
+
+class DecisionCache(LRUCache):
+    '''A bounded cache of allowed decisions that counts its hits and misses.'''
+
+    def __init__(self, maxsize):
+        LRUCache.__init__(self, maxsize=maxsize)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        '''The fraction of lookups that were answered from this cache.'''
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
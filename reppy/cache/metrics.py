@@ -0,0 +1,235 @@
+'''Thread-safe metrics for the caches, exportable in Prometheus' text format.'''
+
+import bisect
+import heapq
+import random
+import threading
+from timeit import default_timer
+
+
+def format_value(value):
+    '''Format a sample value for the exposition format.'''
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def format_labels(labels):
+    '''Format a dict of labels for the exposition format.'''
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in sorted(labels.items()))
+    return '{%s}' % ','.join('%s="%s"' % pair for pair in escaped)
+
+
+class Counter(object):
+    '''A count that only goes up, optionally split by the value of one label.'''
+
+    TYPE = 'counter'
+
+    def __init__(self, name, documentation, label=None):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        # Label value (or None, without a label) => count
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, value=None, amount=1):
+        '''Add amount to the count for the label value.'''
+        with self.lock:
+            self.values[value] = self.values.get(value, 0) + amount
+
+    def get(self, value=None):
+        '''The count for the label value.'''
+        return self.values.get(value, 0)
+
+    def snapshot(self):
+        '''The count, or a dict of label value to count.'''
+        with self.lock:
+            if self.label is None:
+                return self.values.get(None, 0)
+            return dict(self.values)
+
+    def samples(self, name, labels):
+        '''Yield (name, labels, value) for each sample.'''
+        snapshot = self.snapshot()
+        if self.label is None:
+            yield (name, labels, snapshot)
+        else:
+            for value, count in sorted(snapshot.items()):
+                yield (name, dict(labels, **{self.label: value}), count)
+
+
+class Gauge(object):
+    '''A value that is read when needed, from func.'''
+
+    TYPE = 'gauge'
+
+    def __init__(self, name, documentation, func):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+
+    def snapshot(self):
+        return self.func()
+
+    def samples(self, name, labels):
+        yield (name, labels, self.snapshot())
+
+
+class Histogram(object):
+    '''Counts of observations falling at or below each of a set of bounds.'''
+
+    TYPE = 'histogram'
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        '''Record an observation.'''
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        '''A dict of the cumulative count for each bucket, the sum and the count.'''
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = []
+        running = 0
+        for bucket_count in counts:
+            running += bucket_count
+            cumulative.append(running)
+        return {
+            'buckets': list(zip(self.buckets, cumulative)),
+            'sum': total,
+            'count': count
+        }
+
+    def samples(self, name, labels):
+        snapshot = self.snapshot()
+        for bound, count in snapshot['buckets']:
+            yield (name + '_bucket', dict(labels, le=format_value(bound)), count)
+        yield (name + '_sum', labels, snapshot['sum'])
+        yield (name + '_count', labels, snapshot['count'])
+
+
+class CacheMetrics(object):
+    '''The metrics of one cache.'''
+
+    # Bounds of the fetch time histogram, in seconds
+    FETCH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    # Bounds of the lock wait histogram, in seconds
+    LOCK_BUCKETS = (0.0001, 0.001, 0.01, 0.1, 1, 10)
+
+    def __init__(self, cache):
+        self.hits = Counter('hits_total', 'Lookups answered by a fresh entry.')
+        self.misses = Counter('misses_total', 'Lookups that found no fresh entry.')
+        self.fetches = Counter('fetches_total', 'Fetches made by the cache.')
+        self.failures = Counter(
+            'failures_total', 'Failed fetches handled by the cache policy.',
+            'exception')
+        self.not_modified = Counter(
+            'not_modified_total', 'Revalidations that found the robots.txt unchanged.')
+        self.evictions = Counter('evictions_total', 'Entries evicted to make room.')
+        self.fetch_seconds = Histogram(
+            'fetch_seconds', 'Time spent fetching.', self.FETCH_BUCKETS)
+        self.lock_wait_seconds = Histogram(
+            'lock_wait_seconds', 'Time spent waiting for other threads to fetch entries.',
+            self.LOCK_BUCKETS)
+        self.entries = Gauge(
+            'entries', 'Entries in the cache.', lambda: len(cache.cache))
+        self.capacity = Gauge(
+            'capacity', 'The most entries the cache holds.', lambda: cache.cache.maxsize)
+        self.metrics = (
+            self.hits, self.misses, self.fetches, self.failures, self.not_modified,
+            self.evictions, self.fetch_seconds, self.lock_wait_seconds, self.entries,
+            self.capacity)
+
+    @property
+    def hit_rate(self):
+        '''The fraction of lookups that were answered by a fresh entry.'''
+        hits, misses = self.hits.get(), self.misses.get()
+        total = hits + misses
+        return float(hits) / total if total else 0.0
+
+    def snapshot(self):
+        '''Return a dict of the current value of each metric.'''
+        snapshot = dict((metric.name, metric.snapshot()) for metric in self.metrics)
+        snapshot['hit_rate'] = self.hit_rate
+        return snapshot
+
+    def prometheus(self, prefix='reppy_cache', labels=None):
+        '''
+        Return the metrics in Prometheus' text exposition format, with names
+        starting with prefix, and with the labels dict added to every sample.
+        '''
+        labels = labels or {}
+        lines = []
+        for metric in self.metrics:
+            name = '%s_%s' % (prefix, metric.name)
+            lines.append('# HELP %s %s' % (name, metric.documentation))
+            lines.append('# TYPE %s %s' % (name, metric.TYPE))
+            for sample_name, sample_labels, value in metric.samples(name, labels):
+                lines.append('%s%s %s' % (
+                    sample_name, format_labels(sample_labels), format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+class CostSampler(object):
+    '''
+    Times a random sample of decisions, to find the robots.txt that are most
+    expensive to evaluate. The costs of up to capacity robots.txt are kept.
+    '''
+
+    def __init__(self, rate, capacity=10000):
+        self.rate = rate
+        # Robots URL => [URLs decided, total seconds, most seconds for one URL]
+        from cachetools import LRUCache
+        self.costs = LRUCache(maxsize=capacity)
+        self.lock = threading.Lock()
+
+    def sampled(self):
+        '''True if the next decision should be timed.'''
+        return random.random() < self.rate
+
+    def record(self, robots_url, seconds, count=1):
+        '''Record that deciding count URLs of robots_url took seconds.'''
+        with self.lock:
+            cost = self.costs.get(robots_url)
+            if cost is None:
+                cost = self.costs[robots_url] = [0, 0.0, 0.0]
+            cost[0] += count
+            cost[1] += seconds
+            cost[2] = max(cost[2], seconds / count)
+
+    def timed(self, robots_url, func, count=1):
+        '''Wrap func to record how long it takes to decide count URLs.'''
+        def timed(*args):
+            began = default_timer()
+            result = func(*args)
+            self.record(robots_url, default_timer() - began, count)
+            return result
+        return timed
+
+    def top(self, count=10):
+        '''Return (robots URL, samples, mean, max) for the count with the highest mean.'''
+        with self.lock:
+            costs = [(url, list(cost)) for url, cost in self.costs.items()]
+        return heapq.nlargest(
+            count,
+            ((url, samples, total / samples, most) for url, (samples, total, most) in costs),
+            key=lambda row: row[2])
@@ -1,17 +1,28 @@
 '''Policies for caching.'''
 
+import threading
 import time
 
+from .. import exceptions
+
 
 class CachePolicyBase(object):
     '''Policy for caching.'''
 
+    def attempt(self, url):
+        '''Called before fetching url. Raise CircuitOpen to skip the fetch.'''
+        pass
+
+    def success(self, url):
+        '''Called after url was fetched successfully.'''
+        pass
+
     def exception(self, url, exception):
         '''What to return when there's an exception.'''
         raise NotImplementedError('CachePolicyBase does not implement exception.')
 
 
-class DefaultObjectPolicy(object):
+class DefaultObjectPolicy(CachePolicyBase):
     '''Return a default object on exception.'''
 
     def __init__(self, ttl, factory):
@@ -23,7 +34,7 @@ class DefaultObjectPolicy(object):
         return (time.time() + self.ttl, self.factory(url))
 
 
-class ReraiseExceptionPolicy(object):
+class ReraiseExceptionPolicy(CachePolicyBase):
     '''Reraise the exception.'''
 
     def __init__(self, ttl):
@@ -32,3 +43,80 @@ class ReraiseExceptionPolicy(object):
     def exception(self, url, exception):
         '''What to return when there's an exception.'''
         return (time.time() + self.ttl, exception)
+
+
+class CircuitBreakerPolicy(CachePolicyBase):
+    '''
+    Cache failures for a TTL that depends on the kind of failure, backing off
+    exponentially while a host keeps failing. After threshold consecutive
+    failures the circuit for that host opens, and attempts fail fast with
+    CircuitOpen until the TTL of the last failure has passed.
+    '''
+
+    # Base TTL for each kind of failure, looked up by the exception's class
+    DEFAULT_TTLS = {
+        exceptions.BadStatusCode: 300,
+        exceptions.ReadTimeout: 1800,
+        exceptions.DeadlineExceeded: 1800,
+        exceptions.ConnectionException: 1800,
+        exceptions.SSLException: 3600,
+        exceptions.ExcessiveRedirects: 3600,
+        exceptions.ContentTooLong: 86400,
+        exceptions.MalformedUrl: 86400
+    }
+
+    def __init__(self, ttl=600, ttls=None, factory=None, backoff=2,
+                 max_ttl=86400, threshold=3, capacity=100000):
+        # The TTL for failures that have no entry in ttls
+        self.ttl = ttl
+        self.ttls = self.DEFAULT_TTLS if ttls is None else ttls
+        # A function of url to return in place of the exception, if provided
+        self.factory = factory
+        self.backoff = backoff
+        self.max_ttl = max_ttl
+        self.threshold = threshold
+        # url => [consecutive failures, time until which the circuit is open]
+        from cachetools import LRUCache
+        self.failures = LRUCache(maxsize=capacity)
+        self.lock = threading.Lock()
+
+    def base_ttl(self, exception):
+        '''Return the TTL for the first failure with exception.'''
+        for cls in type(exception).__mro__:
+            if cls in self.ttls:
+                return self.ttls[cls]
+        return self.ttl
+
+    def attempt(self, url):
+        '''Raise CircuitOpen if the circuit for url is open.'''
+        with self.lock:
+            state = self.failures.get(url)
+            if (state is not None) and (state[1] is not None) and time.time() < state[1]:
+                raise exceptions.CircuitOpen(
+                    'Circuit open for %s after %s failures' % (url, state[0]))
+
+    def success(self, url):
+        '''Close the circuit for url.'''
+        with self.lock:
+            self.failures.pop(url, None)
+
+    def exception(self, url, exception):
+        '''What to return when there's an exception.'''
+        with self.lock:
+            state = self.failures.get(url)
+            if isinstance(exception, exceptions.CircuitOpen):
+                # Fail fast until the circuit is due to close
+                expires = state[1] if state is not None else time.time() + self.ttl
+            else:
+                state = state or [0, None]
+                state[0] += 1
+                ttl = min(
+                    self.max_ttl,
+                    self.base_ttl(exception) * self.backoff ** (state[0] - 1))
+                expires = time.time() + ttl
+                if state[0] >= self.threshold:
+                    state[1] = expires
+                self.failures[url] = state
+        if self.factory is not None:
+            return (expires, self.factory(url))
+        return (expires, exception)
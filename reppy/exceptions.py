@@ -56,6 +56,14 @@ class ReadTimeout(ReppyException):
     '''A ReadTimeout error from the HTTP library.'''
     pass
 
+class DeadlineExceeded(ReppyException):
+    '''A fetch took longer than its total budget.'''
+    pass
+
 class BadStatusCode(ReppyException):
     '''An exception for 5xx status codes.'''
     pass
+
+class CircuitOpen(ReppyException):
+    '''Fetches from a host are suspended after repeated failures.'''
+    pass
@@ -0,0 +1,165 @@
+'''Caching DNS resolution for fetching robots.txt.'''
+
+import socket
+import threading
+import time
+from timeit import default_timer
+
+from cachetools import LRUCache
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.exceptions import NewConnectionError
+from urllib3.poolmanager import PoolManager
+
+
+class Resolver(object):
+    '''Looks up the addresses of hosts.'''
+
+    def lookup(self, host, port):
+        '''Return (addresses, ttl) for host, or raise socket.gaierror.'''
+        raise NotImplementedError('Resolver does not implement lookup.')
+
+
+class SystemResolver(Resolver):
+    '''
+    Resolve with the system's getaddrinfo. It doesn't report how long records
+    may be cached, so every answer is given the same ttl.
+    '''
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+
+    def lookup(self, host, port):
+        addresses = []
+        for _, _, _, _, sockaddr in socket.getaddrinfo(
+                host, port, 0, socket.SOCK_STREAM):
+            if sockaddr[0] not in addresses:
+                addresses.append(sockaddr[0])
+        return (addresses, self.ttl)
+
+
+class StaticResolver(Resolver):
+    '''Resolve from a dict of host to addresses, for tests. Others don't resolve.'''
+
+    def __init__(self, addresses, ttl=300):
+        self.addresses = addresses
+        self.ttl = ttl
+        # Each host that has been looked up
+        self.lookups = []
+
+    def lookup(self, host, port):
+        self.lookups.append(host)
+        if host not in self.addresses:
+            raise socket.gaierror(socket.EAI_NONAME, 'Unknown host %s' % host)
+        return (list(self.addresses[host]), self.ttl)
+
+
+class CachingResolver(object):
+    '''
+    Remember the addresses from resolver for as long as it says they may be
+    cached, up to max_ttl. Safe to share among threads.
+    '''
+
+    def __init__(self, resolver=None, capacity=10000, max_ttl=3600):
+        self.resolver = resolver or SystemResolver()
+        self.max_ttl = max_ttl
+        # host => (expiration, addresses)
+        self.cache = LRUCache(maxsize=capacity)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        '''The fraction of resolutions that were answered from the cache.'''
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
+
+    def resolve(self, host, port):
+        '''Return the addresses of host.'''
+        key = host.lower()
+        with self.lock:
+            cached = self.cache.get(key)
+            if (cached is not None) and time.time() < cached[0]:
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        # Failures aren't cached, and are retried on the next resolution
+        addresses, ttl = self.resolver.lookup(host, port)
+        with self.lock:
+            self.cache[key] = (time.time() + min(ttl, self.max_ttl), addresses)
+        return addresses
+
+
+def new_conn(conn, base):
+    '''
+    Open a socket for conn with base._new_conn, trying each resolved address,
+    and record how long resolving and connecting took in conn.timings.
+    '''
+    host = conn._dns_host
+    began = default_timer()
+    try:
+        addresses = conn.resolver.resolve(host, conn.port)
+    except socket.gaierror as exc:
+        raise NewConnectionError(conn, 'Failed to resolve %s: %s' % (host, exc))
+    resolved = default_timer()
+    try:
+        for address in addresses[:-1]:
+            conn._dns_host = address
+            try:
+                sock = base._new_conn(conn)
+                break
+            except NewConnectionError:
+                pass
+        else:
+            conn._dns_host = addresses[-1]
+            sock = base._new_conn(conn)
+    finally:
+        conn._dns_host = host
+    conn.timings = {'dns': resolved - began, 'connect': default_timer() - resolved}
+    return sock
+
+
+class ResolvingHTTPConnection(HTTPConnection):
+    '''An HTTPConnection that resolves its host with a CachingResolver.'''
+
+    def __init__(self, *args, **kwargs):
+        self.resolver = kwargs.pop('resolver')
+        self.timings = None
+        HTTPConnection.__init__(self, *args, **kwargs)
+
+    def _new_conn(self):
+        return new_conn(self, HTTPConnection)
+
+
+class ResolvingHTTPSConnection(HTTPSConnection):
+    '''
+    An HTTPSConnection that resolves its host with a CachingResolver. The host
+    name is still used for SNI and certificate verification.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        self.resolver = kwargs.pop('resolver')
+        self.timings = None
+        HTTPSConnection.__init__(self, *args, **kwargs)
+
+    def _new_conn(self):
+        return new_conn(self, HTTPSConnection)
+
+
+class ResolvingPoolManager(PoolManager):
+    '''A PoolManager whose connections resolve hosts with a CachingResolver.'''
+
+    CONNECTION_CLASSES = {
+        'http': ResolvingHTTPConnection,
+        'https': ResolvingHTTPSConnection
+    }
+
+    def __init__(self, resolver, *args, **kwargs):
+        PoolManager.__init__(self, *args, **kwargs)
+        self.resolver = resolver
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = PoolManager._new_pool(self, scheme, host, port, request_context)
+        pool.ConnectionCls = self.CONNECTION_CLASSES[scheme]
+        pool.conn_kw['resolver'] = self.resolver
+        return pool
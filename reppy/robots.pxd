@@ -29,7 +29,8 @@ cdef extern from "rep-cpp/include/agent.h" namespace "Rep":
         bool allowed(const string& path) const
         string str() const
 
-cdef extern from "rep-cpp/include/robots.h" namespace "Rep":
+# Parsing may release the GIL
+cdef extern from "rep-cpp/include/robots.h" namespace "Rep" nogil:
     cpdef cppclass CppRobots "Rep::Robots":
         CppRobots(const string& content) except +ValueError
         CppRobots(const string& content, const string& base_url) except +ValueError
@@ -1,24 +1,81 @@
-# cython: linetrace=True
-# distutils: define_macros=CYTHON_TRACE=1
+# cython: freethreading_compatible=True
 
 from contextlib import closing
+import re
+import sys
 import time
 
-import requests
-from requests.exceptions import (
-    SSLError,
-    ConnectionError,
-    URLRequired,
-    MissingSchema,
-    InvalidSchema,
-    InvalidURL,
-    TooManyRedirects,
-    ReadTimeout)
-import six
+from cython.operator cimport dereference as deref
 
 from .ttl import HeaderWithDefaultPolicy
+from .timing import NULL_TIMING, FetchTiming
 from . import util, logger, exceptions
 
+# Failures raised by transports, which are passed to after_response_hook
+TRANSPORT_EXCEPTIONS = (
+    exceptions.SSLException,
+    exceptions.ConnectionException,
+    exceptions.MalformedUrl,
+    exceptions.ExcessiveRedirects,
+    exceptions.ReadTimeout,
+    exceptions.DeadlineExceeded)
+
+# How setup.py compiled the extension, defaulting for builds that bypass it
+cdef extern from *:
+    '''
+    #ifndef REPPY_VARIANT
+    #define REPPY_VARIANT "unknown"
+    #endif
+    #ifndef REPPY_LTO
+    #define REPPY_LTO 0
+    #endif
+    #ifndef REPPY_PGO
+    #define REPPY_PGO 0
+    #endif
+    #if defined(CYTHON_TRACE) && CYTHON_TRACE
+    #define REPPY_TRACING 1
+    #else
+    #define REPPY_TRACING 0
+    #endif
+    '''
+    const char* REPPY_VARIANT
+    bint REPPY_LTO
+    bint REPPY_PGO
+    bint REPPY_TRACING
+
+# Without the GIL, Agent and Robots guard their rules with a lock of their own:
+# rep-cpp sorts an agent's directives lazily, even in const methods, so even
+# concurrent lookups aren't safe. With the GIL, these are no-ops.
+cdef extern from *:
+    '''
+    #ifdef Py_GIL_DISABLED
+    typedef PyMutex reppy_mutex;
+    #define reppy_lock(mutex) PyMutex_Lock(mutex)
+    #define reppy_unlock(mutex) PyMutex_Unlock(mutex)
+    #else
+    typedef char reppy_mutex;
+    #define reppy_lock(mutex) ((void)(mutex))
+    #define reppy_unlock(mutex) ((void)(mutex))
+    #endif
+    '''
+    ctypedef struct reppy_mutex:
+        pass
+    void reppy_lock(reppy_mutex* mutex) nogil
+    void reppy_unlock(reppy_mutex* mutex) nogil
+
+# Which variant of the extension is loaded: 'release' or 'trace', whether it was
+# built with link-time or profile-guided optimization, and whether line tracing
+# is actually compiled in
+BUILD = {
+    'variant': REPPY_VARIANT.decode('ascii'),
+    'lto': REPPY_LTO,
+    'pgo': REPPY_PGO,
+    'tracing': REPPY_TRACING
+}
+
+PY3 = sys.version_info[0] >= 3
+STRING_TYPES = (str, type(u''))
+
 cdef as_bytes(value):
     if isinstance(value, bytes):
         return value
@@ -28,12 +85,58 @@ cdef as_bytes(value):
 # (i.e., Python 3). Note: could raise UnicodeDecodeError in Python 3 if input
 # is invalid UTF-8
 cdef as_string(value):
-    if six.PY3:
+    if PY3:
         if isinstance(value, bytes):
             return value.decode('utf-8')
     return value
 
 
+# Strings at most this long are stored inline, without a heap allocation, by
+# libstdc++'s short string optimization
+cdef size_t SHORT_STRING = 15
+
+# The names of the agent groups in the str() of a CppRobots, where the rules
+# have been escaped and so contain no spaces or quotes
+AGENT_NAMES = re.compile(br'(?:^\{|\], )"(.*?)": (?:Crawl-Delay: \S+ )?\[')
+
+cdef size_t heap_bytes(size_t length):
+    '''Estimated bytes a std::string of length allocates on the heap.'''
+    return 0 if length <= SHORT_STRING else length + 1
+
+cdef dict agent_stats(const CppAgent* agent):
+    '''The cost of evaluating agent's rules.'''
+    cdef const vector[CppDirective]* directives = &agent.directives()
+    cdef size_t index, length
+    cdef size_t wildcards = 0
+    cdef size_t pattern_bytes = 0
+    cdef size_t memory = sizeof(CppAgent)
+    cdef bytes line
+    for index in range(directives.size()):
+        length = deref(directives)[index].priority()
+        line = deref(directives)[index].str()
+        if b'*' in line or line.endswith(b'$'):
+            wildcards += 1
+        pattern_bytes += length
+        memory += sizeof(CppDirective) + heap_bytes(length)
+    return {
+        'groups': 1,
+        'directives': directives.size(),
+        'wildcards': wildcards,
+        'pattern_bytes': pattern_bytes,
+        'memory': memory
+    }
+
+cdef list agent_lines(const CppAgent* agent):
+    '''The robots.txt lines of agent's Crawl-delay and rules.'''
+    cdef const vector[CppDirective]* directives = &agent.directives()
+    cdef size_t index
+    lines = []
+    if agent.delay() > 0:
+        lines.append(b'Crawl-delay: %g' % agent.delay())
+    for index in range(directives.size()):
+        lines.append(deref(directives)[index].str())
+    return lines
+
 def FromRobotsMethod(cls, Robots robots, const string& name):
     '''Construct an Agent from a CppAgent.'''
     agent = Agent()
@@ -41,21 +144,44 @@ def FromRobotsMethod(cls, Robots robots, const string& name):
     # required to be copied because we often toss the containing
     # Robots object as a temporary thus we'd leave the underlying
     # Agent object dangling without a full copy.
+    reppy_lock(&robots.lock)
     agent.agent = robots.robots.agent(name)
+    reppy_unlock(&robots.lock)
+    agent.etag = robots.etag
+    agent.last_modified = robots.last_modified
     return agent
 
 cdef class Agent:
     '''Wrapper around rep-cpp's Rep::Agent class.'''
 
     cdef CppAgent agent
+    cdef object etag
+    cdef object last_modified
+    cdef reppy_mutex lock
 
     from_robots = classmethod(FromRobotsMethod)
 
     def __str__(self):
-        return as_string(self.agent.str())
+        reppy_lock(&self.lock)
+        cdef string value = self.agent.str()
+        reppy_unlock(&self.lock)
+        return as_string(value)
 
     def __len__(self):
-        return self.agent.directives().size()
+        reppy_lock(&self.lock)
+        cdef size_t length = self.agent.directives().size()
+        reppy_unlock(&self.lock)
+        return length
+
+    @property
+    def etag(self):
+        '''The ETag of the robots.txt this agent came from, if any.'''
+        return self.etag
+
+    @property
+    def last_modified(self):
+        '''The Last-Modified of the robots.txt this agent came from, if any.'''
+        return self.last_modified
 
     @property
     def delay(self):
@@ -65,73 +191,191 @@ cdef class Agent:
             return value
         return None
 
+    @property
+    def stats(self):
+        '''
+        What evaluating this agent's rules costs: a dict of the number of groups
+        (always 1), directives, wildcard directives, total bytes of the patterns
+        and the estimated bytes of memory they use.
+        '''
+        # A copy, so that no Python code runs while the lock is held
+        reppy_lock(&self.lock)
+        cdef CppAgent agent = self.agent
+        reppy_unlock(&self.lock)
+        return agent_stats(&agent)
+
+    def robots_txt(self, names=('*',)):
+        '''A robots.txt that gives each of names this agent's rules.'''
+        reppy_lock(&self.lock)
+        cdef CppAgent agent = self.agent
+        reppy_unlock(&self.lock)
+        lines = [b'User-agent: ' + as_bytes(name) for name in names]
+        return as_string(b'\n'.join(lines + agent_lines(&agent)) + b'\n')
+
     def allow(self, path):
         '''Allow the provided path.'''
-        self.agent.allow(as_bytes(path))
+        cdef string query = as_bytes(path)
+        reppy_lock(&self.lock)
+        self.agent.allow(query)
+        reppy_unlock(&self.lock)
         return self
 
     def disallow(self, path):
         '''Disallow the provided path.'''
-        self.agent.disallow(as_bytes(path))
+        cdef string query = as_bytes(path)
+        reppy_lock(&self.lock)
+        self.agent.disallow(query)
+        reppy_unlock(&self.lock)
         return self
 
     def allowed(self, path):
         '''Is the provided URL allowed?'''
-        return self.agent.allowed(as_bytes(path))
+        cdef string query = as_bytes(path)
+        reppy_lock(&self.lock)
+        cdef bool result = self.agent.allowed(query)
+        reppy_unlock(&self.lock)
+        return result
+
+    def allowed_many(self, paths):
+        '''Return a list of whether each of the provided URLs is allowed.'''
+        cdef vector[string] queries = [as_bytes(path) for path in paths]
+        cdef vector[bool] results
+        cdef size_t index
+        results.reserve(queries.size())
+        reppy_lock(&self.lock)
+        for index in range(queries.size()):
+            results.push_back(self.agent.allowed(queries[index]))
+        reppy_unlock(&self.lock)
+        return results
 
 
 def ParseMethod(cls, url, content, expires=None):
     '''Parse a robots.txt file.'''
     return cls(url, as_bytes(content), expires)
 
+class NotModified(object):
+    '''The outcome of revalidating a robots.txt that has not changed.'''
+
+    def __init__(self, url, expires):
+        self.url = url
+        self.expires = expires
+
+
+def default_transport(session):
+    '''
+    The transport to fetch with when none is provided. It's imported here, so
+    that requests is only loaded by programs that actually fetch.
+    '''
+    from .transport import RequestsTransport
+    return RequestsTransport(session)
+
 def FetchMethod(cls, url, ttl_policy=None, max_size=1048576, *args, **kwargs):
-    '''Get the robots.txt at the provided URL.'''
+    '''Get the robots.txt at the provided URL.
+
+    If the etag or last_modified of an earlier response are provided, the
+    request is conditional, and NotModified is returned if it's unchanged. If a
+    deadline in seconds is provided, DeadlineExceeded is raised if the whole fetch
+    takes any longer. If an observer is provided, it's called with the FetchTiming
+    of the fetch once it's done.
+    '''
     after_response_hook = kwargs.pop('after_response_hook', None)
     after_parse_hook = kwargs.pop('after_parse_hook', None)
-    def wrap_exception(etype, cause):
-        wrapped = etype(cause)
-        wrapped.url = url
-        if after_response_hook is not None:
-            after_response_hook(wrapped)
-        raise wrapped
-    try:
-        # Limit the size of the request
-        kwargs['stream'] = True
-        with closing(requests.get(url, *args, **kwargs)) as res:
-            content = res.raw.read(amt=max_size, decode_content=True)
-            # Try to read an additional byte, to see if the response is too big
-            if res.raw.read(amt=1, decode_content=True):
-                raise exceptions.ContentTooLong(
-                    'Content larger than %s bytes' % max_size)
-
+    session = kwargs.pop('session', None)
+    transport = kwargs.pop('transport', None) or default_transport(session)
+    etag = kwargs.pop('etag', None)
+    last_modified = kwargs.pop('last_modified', None)
+    deadline = kwargs.pop('deadline', None)
+    if deadline is not None:
+        deadline = util.Deadline(deadline)
+        kwargs['timeout'] = deadline.timeout(kwargs.get('timeout'))
+        kwargs['deadline'] = deadline
+    conditional = (etag is not None) or (last_modified is not None)
+    if conditional:
+        headers = dict(kwargs.get('headers') or {})
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        if last_modified is not None:
+            headers['If-Modified-Since'] = last_modified
+        kwargs['headers'] = headers
+    observer = kwargs.pop('observer', None)
+    timing = NULL_TIMING if observer is None else FetchTiming(url, observer)
+    with timing:
+        try:
+            with closing(transport.get(url, *args, **kwargs)) as res:
+                timing.mark('first_byte')
+                # Limit the size of the request, and try to read an additional byte
+                # to see if the response is too big
+                if deadline is None:
+                    content = res.read(max_size)
+                    extra = res.read(1)
+                else:
+                    content = deadline.read(res, max_size)
+                    extra = deadline.read(res, 1)
+                if extra:
+                    raise exceptions.ContentTooLong(
+                        'Content larger than %s bytes' % max_size)
+                timing.mark('read')
+                if observer is not None:
+                    timing.record(
+                        status=res.status_code, bytes=len(content), **res.timings())
+
+                if after_response_hook is not None:
+                    after_response_hook(res)
+                    timing.mark('response_hook')
+
+                if conditional and res.status_code == 304:
+                    expires = (ttl_policy or cls.DEFAULT_TTL_POLICY).expires(res)
+                    timing.mark('ttl')
+                    return NotModified(url, expires)
+
+                return cls.from_response(
+                    url, res.status_code, content, res, ttl_policy, after_parse_hook,
+                    timing)
+        except TRANSPORT_EXCEPTIONS as exc:
+            exc.url = url
             if after_response_hook is not None:
-                after_response_hook(res)
-
-            # Get the TTL policy's ruling on the ttl
-            expires = (ttl_policy or cls.DEFAULT_TTL_POLICY).expires(res)
-
-            if res.status_code == 200:
-                robots = cls.parse(url, content, expires)
-                if after_parse_hook is not None:
-                    after_parse_hook(robots)
-                return robots
-            elif res.status_code in (401, 403):
-                return AllowNone(url, expires)
-            elif res.status_code >= 400 and res.status_code < 500:
-                return AllowAll(url, expires)
-            else:
-                raise exceptions.BadStatusCode(
-                    'Got %i for %s' % (res.status_code, url), res.status_code)
-    except SSLError as exc:
-        wrap_exception(exceptions.SSLException, exc)
-    except ConnectionError as exc:
-        wrap_exception(exceptions.ConnectionException, exc)
-    except (URLRequired, MissingSchema, InvalidSchema, InvalidURL) as exc:
-        wrap_exception(exceptions.MalformedUrl, exc)
-    except TooManyRedirects as exc:
-        wrap_exception(exceptions.ExcessiveRedirects, exc)
-    except ReadTimeout as exc:
-        wrap_exception(exceptions.ReadTimeout, exc)
+                after_response_hook(exc)
+            raise
+
+def AsyncFetchMethod(cls, url, *args, **kwargs):
+    '''Get the robots.txt at the provided URL, asynchronously.'''
+    # Only import the async HTTP stack if it is needed
+    from .aio import fetch
+    return fetch(cls, url, *args, **kwargs)
+
+def FromResponseMethod(
+        cls, url, status, content, response, ttl_policy=None, after_parse_hook=None,
+        timing=NULL_TIMING):
+    '''Construct the robots.txt for a response with the provided status and content.'''
+    # Get the TTL policy's ruling on the ttl
+    expires = (ttl_policy or cls.DEFAULT_TTL_POLICY).expires(response)
+    timing.mark('ttl')
+
+    # Where any redirects led
+    final_url = getattr(response, 'url', None) or url
+    if not isinstance(final_url, STRING_TYPES):
+        final_url = str(final_url)
+
+    cdef Robots robots
+    if status == 200:
+        robots = cls.parse(url, content, expires)
+        timing.mark('parse')
+        robots.url = final_url
+        robots.etag = response.headers.get('etag')
+        robots.last_modified = response.headers.get('last-modified')
+        if after_parse_hook is not None:
+            after_parse_hook(robots)
+        return robots
+    elif status in (401, 403):
+        robots = AllowNone(url, expires)
+    elif status >= 400 and status < 500:
+        robots = AllowAll(url, expires)
+    else:
+        raise exceptions.BadStatusCode(
+            'Got %i for %s' % (status, url), status)
+    timing.mark('parse')
+    robots.url = final_url
+    return robots
 
 def RobotsUrlMethod(cls, url):
     '''Get the robots.txt URL that corresponds to the provided one.'''
@@ -147,32 +391,126 @@ cdef class Robots:
     # Class methods
     parse = classmethod(ParseMethod)
     fetch = classmethod(FetchMethod)
+    afetch = classmethod(AsyncFetchMethod)
+    from_response = classmethod(FromResponseMethod)
     robots_url = classmethod(RobotsUrlMethod)
 
     # Data members
     cdef CppRobots* robots
+    cdef object url
     cdef object expires
+    cdef object etag
+    cdef object last_modified
+    # Guards the rules, which rep-cpp sorts on first use, and expires, which
+    # revalidation updates
+    cdef reppy_mutex lock
 
     def __init__(self, url, const string& content, expires=None):
-        self.robots = new CppRobots(content, as_bytes(url))
+        cdef string base_url = as_bytes(url)
+        # Other threads may run while this one parses
+        with nogil:
+            self.robots = new CppRobots(content, base_url)
+        self.url = url
         self.expires = expires
 
     def __str__(self):
         # Note: this could raise a UnicodeDecodeError in Python 3 if the
         # robots.txt had invalid UTF-8
-        return as_string(self.robots.str())
+        reppy_lock(&self.lock)
+        cdef string value = self.robots.str()
+        reppy_unlock(&self.lock)
+        return as_string(value)
 
     def __dealloc__(self):
         del self.robots
 
+    @property
+    def url(self):
+        '''The URL this robots.txt was ultimately fetched from.'''
+        return self.url
+
     @property
     def sitemaps(self):
         '''Get all the sitemaps in this robots.txt.'''
         return list(map(as_string, self.robots.sitemaps()))
 
+    @property
+    def stats(self):
+        '''
+        What evaluating this robots.txt costs: a dict of the number of agent
+        groups, their directives, wildcard directives, total bytes of the
+        patterns and the estimated bytes of memory the rules use. Agents named
+        together in one group each have their own copy of its rules.
+        '''
+        cdef dict group
+        cdef bytes name
+        cdef const vector[string]* sitemaps = &self.robots.sitemaps()
+        cdef size_t index
+        stats = {
+            'groups': 0,
+            'directives': 0,
+            'wildcards': 0,
+            'pattern_bytes': 0,
+            'memory': sizeof(CppRobots)
+        }
+        # Serializing sorts every group's rules, after which they're only read
+        reppy_lock(&self.lock)
+        cdef string serialized = self.robots.str()
+        reppy_unlock(&self.lock)
+        for name in AGENT_NAMES.findall(serialized):
+            group = agent_stats(&self.robots.agent(name))
+            for key, value in group.items():
+                stats[key] += value
+            # The group's key, and the hash table node and bucket holding it
+            stats['memory'] += (
+                sizeof(string) + heap_bytes(len(name)) + 3 * sizeof(void*))
+        for index in range(sitemaps.size()):
+            stats['memory'] += sizeof(string) + heap_bytes(deref(sitemaps)[index].size())
+        return stats
+
+    def robots_txt(self):
+        '''
+        A robots.txt with the same rules as this one, as rep-cpp understood
+        them, with a group for each agent.
+        '''
+        reppy_lock(&self.lock)
+        cdef string serialized = self.robots.str()
+        reppy_unlock(&self.lock)
+        cdef const vector[string]* sitemaps = &self.robots.sitemaps()
+        cdef size_t index
+        cdef bytes name
+        lines = []
+        for name in AGENT_NAMES.findall(serialized):
+            lines.append(b'User-agent: ' + name)
+            lines.extend(agent_lines(&self.robots.agent(name)))
+            lines.append(b'')
+        for index in range(sitemaps.size()):
+            lines.append(b'Sitemap: ' + deref(sitemaps)[index])
+        return as_string(b'\n'.join(lines) + b'\n')
+
     def allowed(self, path, name):
         '''Is the provided path allowed for the provided agent?'''
-        return self.robots.allowed(as_bytes(path), as_bytes(name))
+        cdef string query = as_bytes(path)
+        cdef string agent = as_bytes(name)
+        reppy_lock(&self.lock)
+        cdef bool result = self.robots.allowed(query, agent)
+        reppy_unlock(&self.lock)
+        return result
+
+    def allowed_many(self, paths, name):
+        '''Return a list of whether each path is allowed for the provided agent.'''
+        cdef vector[string] queries = [as_bytes(path) for path in paths]
+        cdef string agent_name = as_bytes(name)
+        cdef vector[bool] results
+        cdef size_t index
+        results.reserve(queries.size())
+        reppy_lock(&self.lock)
+        # Resolve the agent once rather than once per path
+        cdef const CppAgent* agent = &self.robots.agent(agent_name)
+        for index in range(queries.size()):
+            results.push_back(agent.allowed(queries[index]))
+        reppy_unlock(&self.lock)
+        return results
 
     def agent(self, name):
         '''Return the Agent that corresponds to name.
@@ -183,20 +521,45 @@ cdef class Robots:
         '''
         return Agent.from_robots(self, as_bytes(name))
 
+    cdef object expiration(self):
+        '''Read expires, which another thread may be replacing.'''
+        reppy_lock(&self.lock)
+        value = self.expires
+        reppy_unlock(&self.lock)
+        return value
+
     @property
     def expired(self):
         '''True if the current time is past its expiration.'''
-        return time.time() > self.expires
+        return time.time() > self.expiration()
 
     @property
     def expires(self):
         '''The expiration of this robots.txt.'''
-        return self.expires
+        return self.expiration()
+
+    @expires.setter
+    def expires(self, value):
+        # The old value is released once the lock is too
+        reppy_lock(&self.lock)
+        previous = self.expires
+        self.expires = value
+        reppy_unlock(&self.lock)
+
+    @property
+    def etag(self):
+        '''The ETag header of the response, for revalidation.'''
+        return self.etag
+
+    @property
+    def last_modified(self):
+        '''The Last-Modified header of the response, for revalidation.'''
+        return self.last_modified
 
     @property
     def ttl(self):
         '''Remaining time for this response to be considered valid.'''
-        return max(self.expires - time.time(), 0)
+        return max(self.expiration() - time.time(), 0)
 
 
 cdef class AllowNone(Robots):
@@ -0,0 +1,180 @@
+'''Polite scheduling of fetches, honoring each host's Crawl-delay.'''
+
+from collections import deque
+import heapq
+import threading
+import time
+
+from ..robots import Robots
+
+
+class HostState(object):
+    '''When a host may next be fetched, and the URLs queued for it.'''
+
+    # There can be millions of these, one for each host
+    __slots__ = ('ready', 'delay', 'urls')
+
+    def __init__(self, ready, delay):
+        self.ready = ready
+        self.delay = delay
+        self.urls = deque()
+
+
+class BaseScheduler(object):
+    '''
+    The bookkeeping shared by the schedulers. Hosts are identified by their
+    robots.txt URL, and each has a HostState. A heap holds (ready, robots URL)
+    for the time each host may next be fetched, so that finding the earliest
+    ready host is O(log n). When a host's ready time changes, its old heap
+    entry is left in place and skipped when it's popped. Hosts with no queued
+    URLs are forgotten once their delay has passed.
+    '''
+
+    # Seconds between fetches from a host whose robots.txt has no Crawl-delay
+    DEFAULT_DELAY = 1.0
+
+    def __init__(self, cache=None, agent=None, default_delay=None, max_delay=None):
+        # An AgentCache, or a RobotsCache together with agent, for the delays
+        if (cache is not None) and (agent is None) and not hasattr(cache, 'agent'):
+            # Unlike caches of Agents, caches of Robots don't know whose delay to use
+            raise ValueError(
+                '%s needs the agent to take delays for' % type(cache).__name__)
+        self.cache = cache
+        self.agent = agent
+        self.default_delay = self.DEFAULT_DELAY if default_delay is None else default_delay
+        self.max_delay = max_delay
+        # Robots URL => HostState
+        self.hosts = {}
+        self.heap = []
+        self.queued = 0
+
+    def __len__(self):
+        '''The number of URLs queued.'''
+        return self.queued
+
+    def crawl_delay(self, obj):
+        '''The delay to use for the Robots or Agent obj.'''
+        if isinstance(obj, Robots):
+            obj = obj.agent(self.agent)
+        delay = obj.delay
+        if delay is None:
+            delay = self.default_delay
+        if self.max_delay is not None:
+            delay = min(delay, self.max_delay)
+        return delay
+
+    def next_time(self):
+        '''The soonest time a queued URL may become ready, or None if none are queued.'''
+        if not self.queued:
+            return None
+        return self.heap[0][0]
+
+    def enqueue(self, key, url, delay, now):
+        '''Queue url for the host key.'''
+        state = self.hosts.get(key)
+        if state is None:
+            state = self.hosts[key] = HostState(now, delay)
+            heapq.heappush(self.heap, (now, key))
+        state.delay = delay
+        state.urls.append(url)
+        self.queued += 1
+
+    def reserve(self, key, delay, now):
+        '''Reserve the next slot for fetching from the host key, returning when it starts.'''
+        state = self.hosts.get(key)
+        if state is None:
+            state = self.hosts[key] = HostState(now, delay)
+        state.delay = delay
+        slot = max(state.ready, now)
+        state.ready = slot + delay
+        heapq.heappush(self.heap, (state.ready, key))
+        return slot
+
+    def pop(self, now, take=True):
+        '''
+        Return a queued URL whose host is ready at now, or None. Its host's
+        next slot is reserved. Without take, only forget outdated entries.
+        '''
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            ready, key = heap[0]
+            state = self.hosts.get(key)
+            if (state is None) or (state.ready != ready):
+                # Outdated by a later reservation
+                heapq.heappop(heap)
+            elif not state.urls:
+                # Idle, and its delay has passed
+                heapq.heappop(heap)
+                del self.hosts[key]
+            elif not take:
+                break
+            else:
+                state.ready = now + state.delay
+                heapq.heapreplace(heap, (state.ready, key))
+                self.queued -= 1
+                return state.urls.popleft()
+        return None
+
+
+class Scheduler(BaseScheduler):
+    '''
+    A politeness scheduler that may be shared among threads. URLs can be
+    queued with add and taken with next_ready or get, which only hand out a
+    URL once its host's delay has passed since the last one. Alternatively,
+    acquire waits for a host's next slot before a fetch of a URL.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        BaseScheduler.__init__(self, *args, **kwargs)
+        self.condition = threading.Condition()
+
+    def delay(self, url):
+        '''The delay between fetches from url's host.'''
+        if self.cache is None:
+            return self.default_delay
+        return self.crawl_delay(self.cache.get(url))
+
+    def add(self, url):
+        '''Queue url to be fetched.'''
+        # The delay may involve fetching robots.txt, so it's found without the lock
+        delay = self.delay(url)
+        key = Robots.robots_url(url)
+        with self.condition:
+            self.enqueue(key, url, delay, time.time())
+            self.condition.notify()
+
+    def next_ready(self):
+        '''Return a queued URL whose host may be fetched now, or None.'''
+        with self.condition:
+            return self.pop(time.time())
+
+    def get(self, timeout=None):
+        '''
+        Wait for a queued URL whose host may be fetched, and return it. Return
+        None if there isn't one within timeout seconds.
+        '''
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while True:
+                now = time.time()
+                url = self.pop(now)
+                if url is not None:
+                    return url
+                ready = self.next_time()
+                if deadline is not None:
+                    if now >= deadline:
+                        return None
+                    ready = deadline if ready is None else min(ready, deadline)
+                self.condition.wait(None if ready is None else ready - now)
+
+    def acquire(self, url):
+        '''Wait until url's host may be fetched, reserving it. Return the seconds waited.'''
+        delay = self.delay(url)
+        key = Robots.robots_url(url)
+        with self.condition:
+            now = time.time()
+            self.pop(now, take=False)
+            wait = self.reserve(key, delay, now) - now
+        if wait > 0:
+            time.sleep(wait)
+        return wait
@@ -0,0 +1,71 @@
+'''A politeness scheduler for use with asyncio.'''
+
+import asyncio
+import time
+
+from . import BaseScheduler
+from ..robots import Robots
+
+
+class AsyncScheduler(BaseScheduler):
+    '''
+    A politeness scheduler for use with asyncio, taking its delays from an
+    AsyncAgentCache, or an AsyncRobotsCache together with agent.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        BaseScheduler.__init__(self, *args, **kwargs)
+        # Set when a URL is added, created on first use inside the event loop
+        self.added = None
+
+    async def delay(self, url):
+        '''The delay between fetches from url's host.'''
+        if self.cache is None:
+            return self.default_delay
+        return self.crawl_delay(await self.cache.get(url))
+
+    async def add(self, url):
+        '''Queue url to be fetched.'''
+        delay = await self.delay(url)
+        self.enqueue(Robots.robots_url(url), url, delay, time.time())
+        if self.added is not None:
+            self.added.set()
+
+    def next_ready(self):
+        '''Return a queued URL whose host may be fetched now, or None.'''
+        return self.pop(time.time())
+
+    async def get(self, timeout=None):
+        '''
+        Wait for a queued URL whose host may be fetched, and return it. Return
+        None if there isn't one within timeout seconds.
+        '''
+        if self.added is None:
+            self.added = asyncio.Event()
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            now = time.time()
+            url = self.pop(now)
+            if url is not None:
+                return url
+            ready = self.next_time()
+            if deadline is not None:
+                if now >= deadline:
+                    return None
+                ready = deadline if ready is None else min(ready, deadline)
+            self.added.clear()
+            try:
+                await asyncio.wait_for(
+                    self.added.wait(), None if ready is None else ready - now)
+            except asyncio.TimeoutError:
+                pass
+
+    async def acquire(self, url):
+        '''Wait until url's host may be fetched, reserving it. Return the seconds waited.'''
+        delay = await self.delay(url)
+        now = time.time()
+        self.pop(now, take=False)
+        wait = self.reserve(Robots.robots_url(url), delay, now) - now
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
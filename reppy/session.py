@@ -0,0 +1,51 @@
+'''Pooled HTTP sessions for fetching robots.txt.'''
+
+from six.moves.http_cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter, DEFAULT_POOLBLOCK
+
+from .resolver import ResolvingPoolManager
+
+
+class ResolvingAdapter(HTTPAdapter):
+    '''An HTTPAdapter that resolves hosts with a CachingResolver.'''
+
+    def __init__(self, resolver, *args, **kwargs):
+        self.resolver = resolver
+        HTTPAdapter.__init__(self, *args, **kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=DEFAULT_POOLBLOCK,
+                         **pool_kwargs):
+        HTTPAdapter.init_poolmanager(self, connections, maxsize, block, **pool_kwargs)
+        self.poolmanager = ResolvingPoolManager(
+            self.resolver, num_pools=connections, maxsize=maxsize, block=block,
+            **pool_kwargs)
+
+
+def pooled_session(pool_connections=100, pool_maxsize=10, keep_alive=True,
+                   resolver=None):
+    '''
+    Return a requests.Session that reuses connections, and which may be shared
+    among threads.
+
+    Connections are pooled for up to pool_connections hosts, with at most
+    pool_maxsize connections kept for each. Without keep_alive, servers are
+    asked to close each connection after its response. If a CachingResolver is
+    provided, hosts are resolved through it.
+    '''
+    session = requests.Session()
+    if resolver is None:
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    else:
+        adapter = ResolvingAdapter(
+            resolver, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    # Cookies are never needed for robots.txt, and refusing them keeps the
+    # session free of state that is shared between hosts and threads
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
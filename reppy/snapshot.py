@@ -0,0 +1,212 @@
+'''Reading and writing archives of fetched robots.txt.
+
+A snapshot is a JSONL file where each line is an object with the url, status,
+headers and content of a robots.txt response, and optionally the time it was
+fetched and the time it expires, in seconds since the epoch. WARC files of
+response records can be read too. Files ending in .gz are compressed.
+'''
+
+import calendar
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+
+import six
+
+
+class Record(object):
+    '''A robots.txt response read from a snapshot.'''
+
+    __slots__ = ('url', 'status', 'headers', 'content', 'fetched', 'expires')
+
+    def __init__(self, url, status=200, headers=None, content=b'', fetched=None,
+                 expires=None):
+        self.url = url
+        self.status = status
+        self.headers = headers or {}
+        if isinstance(content, six.text_type):
+            content = content.encode('utf-8')
+        self.content = content
+        self.fetched = fetched
+        self.expires = expires
+
+    def to_json(self):
+        '''This record as a line of a JSONL snapshot.'''
+        record = {
+            'url': self.url,
+            'status': self.status,
+            'headers': self.headers,
+            'content': self.content.decode('utf-8', 'replace')
+        }
+        if self.fetched is not None:
+            record['fetched'] = self.fetched
+        if self.expires is not None:
+            record['expires'] = self.expires
+        return json.dumps(record, sort_keys=True)
+
+
+def open_snapshot(path, mode='rb'):
+    '''Open the snapshot at path, (de)compressing it if it ends in .gz.'''
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    return io.open(path, mode)
+
+
+def is_warc(path):
+    '''True if the snapshot at path is a WARC file.'''
+    with open_snapshot(path) as fin:
+        return fin.read(5) == b'WARC/'
+
+
+def read_jsonl(lines):
+    '''Yield a Record for each non-blank line of a JSONL snapshot.'''
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        yield Record(
+            record['url'],
+            record.get('status', 200),
+            record.get('headers'),
+            record.get('content', ''),
+            record.get('fetched'),
+            record.get('expires'))
+
+
+def read_headers(fin):
+    '''Read header lines up to a blank line, returning them keyed by lowercase name.'''
+    headers = {}
+    while True:
+        line = fin.readline()
+        if not line.strip():
+            return headers
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+
+def dechunk(body):
+    '''Decode a body sent with Transfer-Encoding: chunked.'''
+    chunks = []
+    stream = io.BytesIO(body)
+    while True:
+        size = int(stream.readline().split(b';')[0].strip() or b'0', 16)
+        if not size:
+            return b''.join(chunks)
+        chunks.append(stream.read(size))
+        stream.readline()
+
+
+def decode_body(headers, body):
+    '''The content of an HTTP response body, as archived in a WARC.'''
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        body = dechunk(body)
+    encoding = headers.get('content-encoding', '').lower()
+    if encoding in ('gzip', 'x-gzip'):
+        body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        body = zlib.decompress(body)
+    return body
+
+
+def parse_warc_date(value):
+    '''Seconds since the epoch of a WARC-Date, like 2019-05-01T12:00:00Z.'''
+    return calendar.timegm(time.strptime(value[:19], '%Y-%m-%dT%H:%M:%S'))
+
+
+def read_warc(fin):
+    '''Yield a Record for each HTTP response record in a WARC file.'''
+    for line in iter(fin.readline, b''):
+        # Records are separated by blank lines
+        if not line.strip():
+            continue
+        headers = read_headers(fin)
+        block = fin.read(int(headers.get('content-length', 0)))
+        if headers.get('warc-type') != 'response' or \
+                not headers.get('content-type', '').startswith('application/http'):
+            continue
+        http = io.BytesIO(block)
+        status = http.readline().split()[1]
+        response_headers = read_headers(http)
+        yield Record(
+            headers['warc-target-uri'].strip('<>'),
+            int(status),
+            response_headers,
+            decode_body(response_headers, http.read()),
+            parse_warc_date(headers['warc-date']))
+
+
+def read(path):
+    '''Yield a Record for each response in the JSONL or WARC snapshot at path.'''
+    warc = is_warc(path)
+    with open_snapshot(path) as fin:
+        records = read_warc(fin) if warc else read_jsonl(fin)
+        for record in records:
+            yield record
+
+
+class Index(object):
+    '''
+    Records kept in an SQLite file on disk rather than in memory, and looked up
+    by URL from any thread. Where records share a URL, the last is kept. close
+    deletes the file.
+    '''
+
+    def __init__(self, records):
+        # sqlite3 is only imported once a snapshot is indexed
+        import sqlite3
+        self.directory = tempfile.mkdtemp(prefix='reppy-snapshot-')
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            os.path.join(self.directory, 'index.sqlite'), check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE records '
+            '(url TEXT PRIMARY KEY, status INTEGER, headers TEXT, content BLOB)')
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)', (
+                (record.url, record.status, json.dumps(record.headers),
+                    sqlite3.Binary(record.content))
+                for record in records))
+        self.connection.commit()
+
+    def get(self, url, default=None):
+        '''Return (status, headers, content) of the record for url, or default.'''
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT status, headers, content FROM records WHERE url = ?',
+                (url,)).fetchone()
+        if row is None:
+            return default
+        return (row[0], json.loads(row[1]), bytes(row[2]))
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def close(self):
+        '''Delete the index.'''
+        self.connection.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def write(path, records):
+    '''Write records to a JSONL snapshot at path, returning how many there were.'''
+    count = 0
+    with open_snapshot(path, 'wb') as fout:
+        for record in records:
+            fout.write(record.to_json().encode('utf-8') + b'\n')
+            count += 1
+    return count
@@ -0,0 +1,87 @@
+'''Timing the phases of fetching robots.txt.'''
+
+import time
+from timeit import default_timer
+
+from . import logger
+
+
+class NullTiming(object):
+    '''Discards timings. Used when a fetch has no observer.'''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def mark(self, phase):
+        '''Record the time since the previous mark as phase.'''
+        pass
+
+    def record(self, **values):
+        '''Record other facts about the fetch.'''
+        pass
+
+
+NULL_TIMING = NullTiming()
+
+
+class FetchTiming(NullTiming):
+    '''
+    How long each phase of a fetch took, in seconds, and what it read. Phases
+    that didn't happen, or that the transport doesn't expose, are None. Once
+    the fetch is done, successfully or not, it is passed to observer.
+    '''
+
+    PHASES = (
+        # Resolving the host and connecting, when done by a CachingResolver's
+        # connection; both are 0 when an existing connection is reused
+        'dns',
+        'connect',
+        # Until the response's headers arrived, including any redirects
+        'first_byte',
+        # Reading and decoding the body
+        'read',
+        'response_hook',
+        # Evaluating the TTL policy
+        'ttl',
+        'parse'
+    )
+
+    def __init__(self, url, observer):
+        self.url = url
+        self.observer = observer
+        self.started = time.time()
+        for phase in self.PHASES:
+            setattr(self, phase, None)
+        self.status = None
+        # Bytes of the decoded body, and as received when the transport knows
+        self.bytes = None
+        self.wire_bytes = None
+        self.total = None
+        self.exception = None
+        self.begin = self.last = default_timer()
+
+    def __repr__(self):
+        return '<FetchTiming %s status=%s total=%s %s>' % (
+            self.url, self.status, self.total,
+            ' '.join('%s=%s' % (phase, getattr(self, phase)) for phase in self.PHASES))
+
+    def __exit__(self, exc_type, exc, tb):
+        self.total = default_timer() - self.begin
+        self.exception = exc
+        try:
+            self.observer(self)
+        except Exception:
+            logger.exception('Reppy fetch observer failed on %s' % self.url)
+        return False
+
+    def mark(self, phase):
+        now = default_timer()
+        setattr(self, phase, now - self.last)
+        self.last = now
+
+    def record(self, **values):
+        for key, value in values.items():
+            setattr(self, key, value)
@@ -0,0 +1,409 @@
+'''Transports that fetch robots.txt over HTTP.'''
+
+from contextlib import contextmanager
+import errno
+import io
+import os
+import socket
+
+import requests
+from requests.exceptions import (
+    SSLError,
+    ConnectionError,
+    URLRequired,
+    MissingSchema,
+    InvalidSchema,
+    InvalidURL,
+    TooManyRedirects,
+    ReadTimeout)
+import six
+from six.moves.urllib.parse import urljoin, urlparse
+import urllib3
+from urllib3 import exceptions as urllib3_exceptions
+
+from . import exceptions, snapshot
+from .resolver import (
+    ResolvingHTTPConnection, ResolvingHTTPSConnection, ResolvingPoolManager)
+
+
+class Headers(dict):
+    '''Response headers, looked up without regard to case.'''
+
+    def __init__(self, headers=()):
+        dict.__init__(self, ((k.lower(), v) for k, v in dict(headers).items()))
+
+    def __getitem__(self, key):
+        return dict.__getitem__(self, key.lower())
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key.lower())
+
+    def get(self, key, default=None):
+        return dict.get(self, key.lower(), default)
+
+
+class Response(object):
+    '''A response from a transport.'''
+
+    def __init__(self, url, status_code, headers):
+        # The URL that was ultimately fetched, after any redirects
+        self.url = url
+        self.status_code = status_code
+        # Case-insensitive mapping of the response headers
+        self.headers = headers
+
+    def read(self, amt):
+        '''Read up to amt bytes of the decoded body.'''
+        raise NotImplementedError('Response does not implement read.')
+
+    def read1(self, amt, timeout):
+        '''
+        Read up to amt bytes of the decoded body, returning as soon as any have
+        arrived, and waiting at most timeout seconds for them. Only returns b''
+        at the end of the body. Responses already in memory just read.
+        '''
+        return self.read(amt)
+
+    def close(self):
+        '''Release the connection.'''
+        pass
+
+    def timings(self):
+        '''
+        Return a dict of what the transport knows about the fetch, of any of the
+        FetchTiming fields dns, connect and wire_bytes.
+        '''
+        return {}
+
+
+class Transport(object):
+    '''Fetches robots.txt over HTTP.'''
+
+    def get(self, url, *args, **kwargs):
+        '''
+        Return the streamed Response for a GET of url. Failures are raised as the
+        corresponding reppy.exceptions. If a reppy.util.Deadline is provided as
+        deadline, the transport should check it between redirects.
+        '''
+        raise NotImplementedError('Transport does not implement get.')
+
+    def close(self):
+        '''Release whatever the transport holds.'''
+        pass
+
+
+@contextmanager
+def urllib3_errors():
+    '''Raise urllib3 exceptions as the corresponding reppy.exceptions.'''
+    try:
+        yield
+    except urllib3_exceptions.MaxRetryError as exc:
+        if isinstance(exc.reason, urllib3_exceptions.SSLError):
+            raise exceptions.SSLException(exc)
+        elif isinstance(exc.reason, urllib3_exceptions.ReadTimeoutError):
+            raise exceptions.ReadTimeout(exc)
+        elif isinstance(exc.reason, urllib3_exceptions.ResponseError):
+            raise exceptions.ExcessiveRedirects(exc)
+        raise exceptions.ConnectionException(exc)
+    except urllib3_exceptions.SSLError as exc:
+        raise exceptions.SSLException(exc)
+    except urllib3_exceptions.ReadTimeoutError as exc:
+        raise exceptions.ReadTimeout(exc)
+    except (urllib3_exceptions.LocationValueError,
+            urllib3_exceptions.URLSchemeUnknown) as exc:
+        raise exceptions.MalformedUrl(exc)
+    except (urllib3_exceptions.ProtocolError,
+            urllib3_exceptions.NewConnectionError) as exc:
+        raise exceptions.ConnectionException(exc)
+
+
+def urllib3_timings(response):
+    '''
+    Return the timings for a urllib3.HTTPResponse. A connection made through a
+    CachingResolver records how long resolving and connecting took, which is
+    claimed by the first response on it.
+    '''
+    timings = {}
+    connection = getattr(response, '_connection', None)
+    if isinstance(connection, (ResolvingHTTPConnection, ResolvingHTTPSConnection)):
+        timings.update(connection.timings or {'dns': 0.0, 'connect': 0.0})
+        connection.timings = None
+    return timings
+
+
+def legacy_read1(response, amt):
+    '''
+    Read what has arrived of up to amt bytes of a urllib3.HTTPResponse, for
+    urllib3 before 2.0. Its read only returns once all of amt bytes are in, so
+    this reads from its http.client response, and decodes as urllib3 would.
+    '''
+    read1 = getattr(response._fp, 'read1', None)
+    if read1 is None:
+        # Python 2's httplib can only read whole amounts
+        return response.read(amt=amt, decode_content=True)
+    response._init_decoder()
+    with response._error_catcher():
+        while True:
+            data = read1(amt)
+            response._fp_bytes_read += len(data)
+            # Compressed data may not decode to anything until there's more of it
+            decoded = response._decode(data, True, not data)
+            if decoded or not data:
+                return decoded
+
+
+def urllib3_read1(response, amt, timeout):
+    '''
+    Read up to amt bytes of the decoded body of a urllib3.HTTPResponse, returning
+    as soon as any have arrived, and waiting at most timeout seconds for them.
+    The socket's timeout is restored afterwards, as its connection is reused.
+    '''
+    sock = getattr(getattr(response, '_connection', None), 'sock', None)
+    if sock is not None:
+        # Keep the read timeout of the request, if it's shorter
+        previous = sock.gettimeout()
+        sock.settimeout(timeout if previous is None else min(previous, timeout))
+    try:
+        with urllib3_errors():
+            if hasattr(response, 'read1'):
+                return response.read1(amt, decode_content=True)
+            return legacy_read1(response, amt)
+    finally:
+        if sock is not None:
+            try:
+                sock.settimeout(previous)
+            except socket.error:
+                # The connection was closed rather than returned to the pool
+                pass
+
+
+class RequestsResponse(Response):
+    '''A Response wrapping a streamed requests.Response.'''
+
+    def __init__(self, response):
+        Response.__init__(
+            self, response.url, response.status_code, response.headers)
+        self.response = response
+        self.connection_timings = urllib3_timings(response.raw)
+
+    def __getattr__(self, name):
+        # Hooks may expect everything else a requests.Response has
+        return getattr(self.response, name)
+
+    def read(self, amt):
+        with urllib3_errors():
+            return self.response.raw.read(amt=amt, decode_content=True)
+
+    def read1(self, amt, timeout):
+        return urllib3_read1(self.response.raw, amt, timeout)
+
+    def close(self):
+        self.response.close()
+
+    def timings(self):
+        return dict(self.connection_timings, wire_bytes=self.response.raw.tell())
+
+
+class RequestsTransport(Transport):
+    '''Fetch with requests, optionally through a session.'''
+
+    def __init__(self, session=None):
+        self.session = session
+
+    def get(self, url, *args, **kwargs):
+        '''Arguments are passed on to requests.get.'''
+        get = requests.get if self.session is None else self.session.get
+        kwargs['stream'] = True
+        deadline = kwargs.pop('deadline', None)
+        if deadline is not None:
+            # The response hook runs for every response, including redirects
+            hooks = dict(kwargs.get('hooks') or {})
+            response_hooks = hooks.get('response', [])
+            if callable(response_hooks):
+                response_hooks = [response_hooks]
+            hooks['response'] = list(response_hooks) + [deadline.check]
+            kwargs['hooks'] = hooks
+        try:
+            return RequestsResponse(get(url, *args, **kwargs))
+        except SSLError as exc:
+            raise exceptions.SSLException(exc)
+        except ConnectionError as exc:
+            raise exceptions.ConnectionException(exc)
+        except (URLRequired, MissingSchema, InvalidSchema, InvalidURL) as exc:
+            raise exceptions.MalformedUrl(exc)
+        except TooManyRedirects as exc:
+            raise exceptions.ExcessiveRedirects(exc)
+        except ReadTimeout as exc:
+            raise exceptions.ReadTimeout(exc)
+
+
+class Urllib3Response(Response):
+    '''A Response wrapping a streamed urllib3.HTTPResponse.'''
+
+    def __init__(self, url, response):
+        Response.__init__(
+            self, response.geturl() or url, response.status, response.headers)
+        self.response = response
+        self.connection_timings = urllib3_timings(response)
+
+    def read(self, amt):
+        with urllib3_errors():
+            return self.response.read(amt=amt, decode_content=True)
+
+    def read1(self, amt, timeout):
+        return urllib3_read1(self.response, amt, timeout)
+
+    def close(self):
+        self.response.release_conn()
+
+    def timings(self):
+        return dict(self.connection_timings, wire_bytes=self.response.tell())
+
+
+class Urllib3Transport(Transport):
+    '''Fetch directly with a urllib3 PoolManager, without requests' overhead.'''
+
+    # How many redirects to follow, as in requests
+    MAX_REDIRECTS = 30
+
+    def __init__(self, pool_manager=None, num_pools=100, maxsize=10, resolver=None):
+        if (pool_manager is None) and (resolver is not None):
+            pool_manager = ResolvingPoolManager(
+                resolver, num_pools=num_pools, maxsize=maxsize)
+        self.pool_manager = pool_manager or urllib3.PoolManager(
+            num_pools=num_pools, maxsize=maxsize)
+
+    def get(self, url, headers=None, timeout=None, allow_redirects=True, **kwargs):
+        '''
+        Accepts requests-style headers, timeout (a number or a (connect, read)
+        tuple), allow_redirects and deadline. Anything else is ignored.
+        '''
+        if isinstance(timeout, tuple):
+            timeout = urllib3.Timeout(connect=timeout[0], read=timeout[1])
+        retries = urllib3.Retry(
+            total=None, connect=0, read=0, status=0,
+            redirect=self.MAX_REDIRECTS if allow_redirects else 0,
+            raise_on_redirect=allow_redirects)
+        with urllib3_errors():
+            response = self.pool_manager.request(
+                'GET', url, headers=headers, timeout=timeout, retries=retries,
+                preload_content=False, decode_content=True)
+        # urllib3 follows redirects internally, so check once they're done
+        deadline = kwargs.get('deadline')
+        if deadline is not None:
+            try:
+                deadline.check()
+            except exceptions.DeadlineExceeded:
+                response.release_conn()
+                raise
+        return Urllib3Response(url, response)
+
+
+class FakeResponse(Response):
+    '''A Response served from memory.'''
+
+    def __init__(self, url, status_code, headers, content):
+        Response.__init__(self, url, status_code, Headers(headers))
+        self.body = io.BytesIO(content)
+
+    def read(self, amt):
+        return self.body.read(amt)
+
+
+class FakeTransport(Transport):
+    '''
+    Serve canned responses from memory, for tests. Other URLs are 404s, and
+    redirects are followed unless allow_redirects is false.
+    '''
+
+    MAX_REDIRECTS = 30
+
+    def __init__(self):
+        self.responses = {}
+        # Each (url, kwargs) that has been fetched
+        self.requests = []
+
+    def add(self, url, status_code=200, content=b'', headers=None, exception=None):
+        '''Respond to url with the provided response, or raise exception.'''
+        if isinstance(content, six.text_type):
+            content = content.encode('utf-8')
+        self.responses[url] = (status_code, content, headers or {}, exception)
+        return self
+
+    def get(self, url, *args, **kwargs):
+        kwargs.pop('deadline', None)
+        self.requests.append((url, kwargs))
+        for _ in range(self.MAX_REDIRECTS + 1):
+            status_code, content, headers, exception = self.responses.get(
+                url, (404, b'', {}, None))
+            if exception is not None:
+                raise exception
+            response = FakeResponse(url, status_code, headers, content)
+            location = response.headers.get('location')
+            if (status_code not in (301, 302, 303, 307, 308)) or (location is None) \
+                    or not kwargs.get('allow_redirects', True):
+                return response
+            url = urljoin(url, location)
+        raise exceptions.ExcessiveRedirects('Exceeded %s redirects' % self.MAX_REDIRECTS)
+
+
+class DirectoryTransport(Transport):
+    '''
+    Serve robots.txt offline from the files in directory, each named for the
+    host (and port, if any) of its robots.txt URL, like example.com.txt or
+    example.com:8080.txt. Hosts without a file are 404s.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, url):
+        '''The path of the file for url.'''
+        return os.path.join(self.directory, urlparse(url).netloc.lower() + '.txt')
+
+    def get(self, url, *args, **kwargs):
+        try:
+            with open(self.path(url), 'rb') as fin:
+                return FakeResponse(url, 200, {}, fin.read())
+        except (IOError, OSError) as exc:
+            if exc.errno not in (errno.ENOENT, errno.EISDIR, errno.ENOTDIR):
+                raise
+            return FakeResponse(url, 404, {}, b'')
+
+
+class SnapshotTransport(Transport):
+    '''
+    Serve robots.txt offline from a snapshot (see reppy.snapshot), where each
+    line is an object with the url, status, headers and content of a robots.txt
+    response. URLs not in the snapshot are 404s.
+    '''
+
+    def __init__(self, lines=(), records=None, index=None):
+        # URL => (status, headers, content), in memory or a snapshot.Index on disk
+        self.responses = index
+        if index is None:
+            self.responses = {}
+            for record in snapshot.read_jsonl(lines) if records is None else records:
+                self.responses[record.url] = (
+                    record.status, record.headers, record.content)
+
+    @classmethod
+    def load(cls, path):
+        '''Read the JSONL or WARC snapshot at path.'''
+        return cls(records=snapshot.read(path))
+
+    @classmethod
+    def indexed(cls, path):
+        '''
+        Index the JSONL or WARC snapshot at path on disk, rather than reading it
+        into memory. close deletes the index.
+        '''
+        return cls(index=snapshot.Index(snapshot.read(path)))
+
+    def close(self):
+        if isinstance(self.responses, snapshot.Index):
+            self.responses.close()
+
+    def get(self, url, *args, **kwargs):
+        status_code, headers, content = self.responses.get(url, (404, {}, b''))
+        return FakeResponse(url, status_code, headers, content)
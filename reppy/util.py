@@ -1,6 +1,9 @@
 '''Utility functions.'''
 
 import email
+import time
+
+from . import exceptions
 
 
 def parse_date(string):
@@ -12,3 +15,57 @@ def parse_date(string):
     # Default time zone is GMT/UTC
     parsed[9] = 0 if parsed[9] is None else parsed[9]
     return email.utils.mktime_tz(parsed)
+
+
+class Deadline(object):
+    '''A budget of wall-clock seconds for a fetch, from its creation.'''
+
+    # How many bytes to read between checks of the budget
+    CHUNK_SIZE = 16384
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = time.time() + seconds
+
+    def remaining(self):
+        '''Return the seconds left of the budget, raising DeadlineExceeded if none are.'''
+        remaining = self.expires - time.time()
+        if remaining <= 0:
+            raise exceptions.DeadlineExceeded(
+                'Exceeded deadline of %s seconds' % self.seconds)
+        return remaining
+
+    def check(self, *args, **kwargs):
+        '''Raise DeadlineExceeded if the budget is spent. Usable as a requests hook.'''
+        self.remaining()
+
+    def timeout(self, timeout=None):
+        '''Clamp a requests-style timeout to what remains of the budget.'''
+        remaining = self.remaining()
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, tuple):
+            return tuple(remaining if t is None else min(t, remaining) for t in timeout)
+        return min(timeout, remaining)
+
+    def read(self, response, amt):
+        '''
+        Read up to amt bytes from a transport's response. Each read returns what
+        has arrived, waiting no longer than what remains of the budget, so a body
+        that trickles in can't outlast it.
+        '''
+        chunks = []
+        while amt > 0:
+            timeout = self.remaining()
+            try:
+                chunk = response.read1(min(amt, self.CHUNK_SIZE), timeout)
+            except exceptions.ReadTimeout:
+                # Reads time out when the budget runs out
+                self.check()
+                raise
+            if not chunk:
+                break
+            chunks.append(chunk)
+            amt -= len(chunk)
+        self.check()
+        return b''.join(chunks)
@@ -21,8 +21,15 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
 from setuptools import setup
 from setuptools.extension import Extension
+from distutils.errors import DistutilsOptionError
 
 ext_files = [
     'reppy/rep-cpp/src/agent.cpp',
@@ -37,19 +44,140 @@ ext_files = [
 kwargs = {}
 
 try:
-    from Cython.Distutils import build_ext
+    from Cython.Distutils import build_ext as base_build_ext
     print('Building from Cython')
     ext_files.append('reppy/robots.pyx')
-    kwargs['cmdclass'] = {'build_ext': build_ext}
 except ImportError:
+    from setuptools.command.build_ext import build_ext as base_build_ext
     print('Building from C++')
     ext_files.append('reppy/robots.cpp')
 
+
+class build_ext(base_build_ext):
+    '''Build the extension as an optimized release, or with tracing.
+
+    Releases are compiled with -O3, and optionally with link-time optimization
+    (--lto) and profile-guided optimization trained on the benchmark corpus
+    (--pgo, which needs GCC). --trace builds a slower extension with Cython line
+    tracing instead, so coverage can see into robots.pyx. The same options may
+    be given as a comma-separated REPPY_BUILD environment variable, like
+    REPPY_BUILD=lto,pgo, for builds driven by pip.
+    '''
+
+    OPTIONS = ('trace', 'lto', 'pgo')
+
+    user_options = base_build_ext.user_options + [
+        ('trace', None, 'build with Cython line tracing, for coverage'),
+        ('lto', None, 'build with link-time optimization'),
+        ('pgo', None, 'build with profile-guided optimization')
+    ]
+
+    boolean_options = base_build_ext.boolean_options + list(OPTIONS)
+
+    # Where the variant of the last build is recorded, in build_temp
+    VARIANT_FILE = 'reppy-variant'
+
+    def initialize_options(self):
+        base_build_ext.initialize_options(self)
+        self.trace = 0
+        self.lto = 0
+        self.pgo = 0
+        self.profile = None
+
+    def finalize_options(self):
+        base_build_ext.finalize_options(self)
+        for option in os.environ.get('REPPY_BUILD', '').split(','):
+            option = option.strip()
+            if not option:
+                continue
+            if option not in self.OPTIONS:
+                raise DistutilsOptionError('Unknown REPPY_BUILD option: %s' % option)
+            setattr(self, option, 1)
+        if self.trace and (self.lto or self.pgo):
+            raise DistutilsOptionError('--trace cannot be combined with --lto or --pgo')
+
+    def variant(self):
+        '''A description of the build, like trace or release+lto.'''
+        if self.trace:
+            return 'trace'
+        return '+'.join(
+            ['release'] + [option for option in ('lto', 'pgo') if getattr(self, option)])
+
+    def run(self):
+        # Objects and generated sources from a different variant can't be reused
+        marker = os.path.join(self.build_temp, self.VARIANT_FILE)
+        previous = None
+        if os.path.exists(marker):
+            with open(marker) as fin:
+                previous = fin.read()
+        if previous != self.variant():
+            self.force = 1
+
+        self.profile = 'generate' if self.pgo else None
+        base_build_ext.run(self)
+        if self.pgo:
+            # Rebuild with the compiler that run() set up, using the profile
+            self.train()
+            self.profile = 'use'
+            self.force = 1
+            self.build_extensions()
+
+        if not os.path.isdir(self.build_temp):
+            os.makedirs(self.build_temp)
+        with open(marker, 'w') as fout:
+            fout.write(self.variant())
+
+    def build_extension(self, ext):
+        ext.define_macros = [
+            (name, value) for name, value in ext.define_macros
+            if not name.startswith('REPPY_') and name != 'CYTHON_TRACE']
+        ext.define_macros.extend([
+            ('REPPY_VARIANT', '"%s"' % ('trace' if self.trace else 'release')),
+            ('REPPY_LTO', str(int(bool(self.lto)))),
+            ('REPPY_PGO', str(int(bool(self.pgo))))])
+        compile_args = ['-std=c++11']
+        link_args = []
+        if self.trace:
+            ext.cython_directives = {'linetrace': True}
+            ext.define_macros.append(('CYTHON_TRACE', '1'))
+        elif self.compiler.compiler_type == 'unix':
+            compile_args.append('-O3')
+            if self.lto:
+                compile_args.append('-flto')
+                link_args.append('-flto')
+            if self.profile == 'generate':
+                compile_args.append('-fprofile-generate')
+                link_args.append('-fprofile-generate')
+            elif self.profile == 'use':
+                compile_args.extend(['-fprofile-use', '-fprofile-correction'])
+        ext.extra_compile_args = compile_args
+        ext.extra_link_args = link_args
+        base_build_ext.build_extension(self, ext)
+
+    def train(self):
+        '''Run the benchmarks against the instrumented extension to profile it.'''
+        stage = tempfile.mkdtemp()
+        try:
+            shutil.copytree(
+                'reppy', os.path.join(stage, 'reppy'),
+                ignore=shutil.ignore_patterns('rep-cpp', '*.so', '*.pyd', '*.cpp'))
+            for ext in self.extensions:
+                built = self.get_ext_fullpath(ext.name)
+                shutil.copy(built, os.path.join(stage, 'reppy', os.path.basename(built)))
+            env = dict(os.environ, PYTHONPATH=stage)
+            subprocess.check_call([
+                sys.executable, 'benchmarks/suite.py',
+                '--min-time', '0.02', '--rounds', '1'], env=env)
+        finally:
+            shutil.rmtree(stage)
+
+
+kwargs['cmdclass'] = {'build_ext': build_ext}
+
 ext_modules = [
     Extension(
         'reppy.robots', ext_files,
         language='c++',
-        extra_compile_args=['-std=c++11'],
         include_dirs=[
             'reppy/rep-cpp/include',
             'reppy/rep-cpp/deps/url-cpp/include'])
@@ -77,18 +205,25 @@ Sitemaps, Allow, and Crawl-delay. Main features:
     ext_modules=ext_modules,
     packages=[
         'reppy',
-        'reppy.cache'
+        'reppy.cache',
+        'reppy.scheduler'
     ],
     package_dir={
         'reppy': 'reppy',
-        'reppy.cache': 'reppy/cache'
+        'reppy.cache': 'reppy/cache',
+        'reppy.scheduler': 'reppy/scheduler'
     },
     install_requires=[
         'cachetools',
+        'futures; python_version < "3.0"',
         'python-dateutil>=1.5, !=2.0',
         'requests',
-        'six'
+        'six',
+        'urllib3'
     ],
+    extras_require={
+        'async': ['aiohttp']
+    },
     classifiers=[
         'License :: OSI Approved :: MIT License',
         'Development Status :: 5 - Production/Stable',
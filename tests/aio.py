@@ -0,0 +1,108 @@
+'''Tests about fetching robots.txt with asyncio.'''
+
+import unittest
+
+import aiohttp
+
+from reppy import robots
+from reppy.ttl import HeaderWithDefaultPolicy
+
+from .aio_util import FakeSession, run
+
+
+class AsyncFetchTest(unittest.TestCase):
+    '''Tests about Robots.afetch.'''
+
+    def fetch(self, session, url='http://localhost:8080/robots.txt', **kwargs):
+        return run(robots.Robots.afetch(url, session=session, **kwargs))
+
+    def test_fetch_status_200(self):
+        '''A 200 parses things normally.'''
+        robot = self.fetch(FakeSession('test_fetch_status_200'))
+        self.assertFalse(robot.allowed('/path', 'agent'))
+
+    def test_fetch_status_401(self):
+        '''A 401 gives us an AllowNone Robots.'''
+        robot = self.fetch(FakeSession('test_fetch_status_401'))
+        self.assertIsInstance(robot, robots.AllowNone)
+
+    def test_fetch_status_4XX(self):
+        '''A 4XX gives us an AllowAll Robots.'''
+        robot = self.fetch(FakeSession('test_fetch_status_4XX'))
+        self.assertIsInstance(robot, robots.AllowAll)
+
+    def test_fetch_status_5XX(self):
+        '''A server error raises an exception.'''
+        with self.assertRaises(robots.exceptions.BadStatusCode):
+            self.fetch(FakeSession('test_fetch_status_5XX'))
+
+    def test_content_too_big(self):
+        '''Raises an exception if the content is too big.'''
+        with self.assertRaises(robots.exceptions.ContentTooLong):
+            self.fetch(FakeSession('test_content_too_big'), max_size=5)
+
+    def test_ttl_policy(self):
+        '''Uses the TTL policy on the response headers.'''
+        policy = HeaderWithDefaultPolicy(default=17, minimum=0)
+        robot = self.fetch(FakeSession('test_fetch_status_200'), ttl_policy=policy)
+        self.assertAlmostEqual(robot.ttl, 17, delta=1)
+
+    def test_hooks(self):
+        '''Calls the after_response_hook and after_parse_hook.'''
+        calls = []
+        self.fetch(
+            FakeSession('test_after_parse_hook'),
+            after_response_hook=lambda res: calls.append(res.status),
+            after_parse_hook=lambda robot: calls.append(
+                robot.allowed('/disallowed', 'me')))
+        self.assertEqual(calls, [200, False])
+
+    def test_connection_exception(self):
+        '''Raises a ReppyException on connection errors.'''
+        session = FakeSession(exception=aiohttp.ServerDisconnectedError())
+        with self.assertRaises(robots.exceptions.ConnectionException):
+            self.fetch(session)
+
+    def test_read_timeout(self):
+        '''Raises a ReppyException on timeouts.'''
+        session = FakeSession(exception=aiohttp.ServerTimeoutError())
+        with self.assertRaises(robots.exceptions.ReadTimeout):
+            self.fetch(session)
+
+    def test_observer(self):
+        '''Passes the timing of the fetch to the observer.'''
+        timings = []
+        self.fetch(FakeSession('test_fetch_status_200'), observer=timings.append)
+        self.assertEqual(timings[0].status, 200)
+        self.assertGreaterEqual(timings[0].parse, 0)
+
+    def test_deadline(self):
+        '''Raises DeadlineExceeded if the fetch outlasts its deadline.'''
+        session = FakeSession('test_fetch_status_200', delay=1)
+        with self.assertRaises(robots.exceptions.DeadlineExceeded):
+            self.fetch(session, deadline=0.01)
+
+    def test_within_deadline(self):
+        '''Fetches normally within the deadline.'''
+        robot = self.fetch(FakeSession('test_fetch_status_200'), deadline=10)
+        self.assertFalse(robot.allowed('/path', 'agent'))
+
+    def test_excessive_redirects(self):
+        '''Raises a ReppyException on too many redirects.'''
+        session = FakeSession(exception=aiohttp.TooManyRedirects(None, ()))
+        with self.assertRaises(robots.exceptions.ExcessiveRedirects):
+            self.fetch(session)
+
+    def test_malformed_url(self):
+        '''Raises a ReppyException on malformed URLs.'''
+        with self.assertRaises(robots.exceptions.MalformedUrl):
+            self.fetch(None, 'gobbledygook')
+
+    def test_after_response_hook_on_error(self):
+        '''Calls after_response_hook when error occurs during fetch.'''
+        calls = []
+        session = FakeSession(exception=aiohttp.ServerDisconnectedError())
+        with self.assertRaises(robots.exceptions.ConnectionException):
+            self.fetch(session, after_response_hook=calls.append)
+        self.assertIsInstance(calls[0], robots.exceptions.ConnectionException)
+        self.assertEqual(calls[0].url, 'http://localhost:8080/robots.txt')
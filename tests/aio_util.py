@@ -0,0 +1,63 @@
+'''Testing utilities for asyncio.'''
+
+import asyncio
+
+from six.moves.urllib.parse import urlparse
+
+from .util import read_fixtures
+
+
+def run(coroutine):
+    '''Run the coroutine to completion.'''
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+class FakeContent(object):
+    '''The body of a FakeResponse.'''
+
+    def __init__(self, content):
+        self.content = content
+
+    async def read(self, size):
+        chunk, self.content = self.content[:size], self.content[size:]
+        return chunk
+
+
+class FakeResponse(object):
+    '''Enough of an aiohttp response for fetching robots.txt.'''
+
+    def __init__(self, status, headers, content, exception=None, delay=0):
+        self.status = status
+        self.headers = dict((k.lower(), v) for k, v in headers.items())
+        self.content = FakeContent(content)
+        self.exception = exception
+        self.delay = delay
+
+    async def __aenter__(self):
+        await asyncio.sleep(self.delay)
+        if self.exception is not None:
+            raise self.exception
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class FakeSession(object):
+    '''Enough of an aiohttp session to serve the asis fixtures.'''
+
+    def __init__(self, *segments, **kwargs):
+        self.responses = {}
+        if segments:
+            for name, status, _, headers, content in read_fixtures(*segments):
+                self.responses['/' + name] = (status, headers, content)
+        self.exception = kwargs.get('exception')
+        self.delay = kwargs.get('delay', 0)
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        self.calls.append(url)
+        if self.exception is not None:
+            return FakeResponse(None, {}, b'', self.exception, self.delay)
+        status, headers, content = self.responses[urlparse(url).path]
+        return FakeResponse(status, headers, content, delay=self.delay)
@@ -0,0 +1,402 @@
+#! /usr/bin/env python
+'''Load test RobotsCache or AgentCache against a local server posing as many hosts.
+
+Usage: python -m tests.loadtest [--hosts N] [--threads N] [--lookups N] ...
+
+The server answers for every host under .test, which the cache resolves to
+127.0.0.1. Each host is deterministically given a robots.txt, a max-age, and
+possibly errors, a redirect or a body that is dripped out slowly, and every
+response is delayed by a latency drawn from the chosen distribution. The cache
+is then driven from many threads, each looking up URLs on hosts drawn from a
+Zipf distribution, and the throughput, latency of allowed, fetches and memory
+are reported.
+'''
+
+from __future__ import print_function
+
+import argparse
+import bisect
+import json
+import logging
+import math
+import random
+import sys
+import threading
+import time
+from timeit import default_timer
+
+from six.moves import BaseHTTPServer, socketserver
+
+from reppy import logger
+from reppy.cache import AgentCache, RobotsCache
+from reppy.resolver import CachingResolver, Resolver
+from reppy.ttl import HeaderWithDefaultPolicy
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+
+DOMAIN = 'test'
+AGENT = 'reppy-loadtest'
+WORDS = ('admin', 'api', 'cart', 'images', 'login', 'private', 'search', 'static', 'user')
+
+
+def fixed(rand, mean):
+    return mean
+
+
+def uniform(rand, mean):
+    return rand.uniform(0, 2 * mean)
+
+
+def exponential(rand, mean):
+    return rand.expovariate(1.0 / mean) if mean else 0
+
+
+def lognormal(rand, mean, sigma=1.0):
+    # A long tail, like real servers; mu is chosen so the mean is mean
+    if not mean:
+        return 0
+    return rand.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+
+
+LATENCIES = {
+    'fixed': fixed,
+    'uniform': uniform,
+    'exponential': exponential,
+    'lognormal': lognormal
+}
+
+
+class HostProfile(object):
+    '''How one simulated host behaves.'''
+
+    __slots__ = ('status', 'redirect', 'drip', 'max_age', 'body')
+
+    def __init__(self, status, redirect, drip, max_age, body):
+        self.status = status
+        self.redirect = redirect
+        self.drip = drip
+        self.max_age = max_age
+        self.body = body
+
+
+class Profiles(object):
+    '''Deterministically assigns a HostProfile to each host.'''
+
+    def __init__(self, seed=0, error_rate=0.02, missing_rate=0.1, redirect_rate=0.05,
+                 drip_rate=0.01, max_ages=(60, 3600, 86400), rules=20):
+        self.seed = seed
+        self.error_rate = error_rate
+        self.missing_rate = missing_rate
+        self.redirect_rate = redirect_rate
+        self.drip_rate = drip_rate
+        self.max_ages = max_ages
+        self.rules = rules
+
+    def __call__(self, host):
+        rand = random.Random('%s:%s' % (self.seed, host))
+        roll = rand.random()
+        if roll < self.error_rate:
+            status = rand.choice((500, 502, 503))
+        elif roll < self.error_rate + self.missing_rate:
+            status = 404
+        else:
+            status = 200
+        lines = ['User-agent: *']
+        for _ in range(rand.randint(0, 2 * self.rules)):
+            lines.append('%s: /%s/%s' % (
+                'Allow' if rand.random() < 0.2 else 'Disallow',
+                rand.choice(WORDS), rand.choice(WORDS)))
+        return HostProfile(
+            status=status,
+            redirect=rand.random() < self.redirect_rate,
+            drip=rand.random() < self.drip_rate,
+            max_age=rand.choice(self.max_ages),
+            body=('\n'.join(lines) + '\n').encode('utf-8'))
+
+
+class RobotsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''Serve robots.txt for whichever host is asked for.'''
+
+    protocol_version = 'HTTP/1.1'
+
+    # Where redirected robots.txt are moved to
+    MOVED = '/moved/robots.txt'
+
+    def do_GET(self):
+        server = self.server
+        host = self.headers.get('Host', '').split(':')[0].lower()
+        profile = server.profile(host)
+        server.record(host)
+        time.sleep(server.latency())
+
+        if profile.redirect and self.path != self.MOVED:
+            self.respond(301, b'', [('Location', self.MOVED)])
+        elif profile.status != 200:
+            self.respond(profile.status, b'')
+        else:
+            self.respond(200, profile.body, [
+                ('Content-Type', 'text/plain'),
+                ('Cache-Control', 'max-age=%d' % profile.max_age)
+            ], drip=profile.drip)
+
+    def respond(self, status, body, headers=(), drip=False):
+        self.send_response(status)
+        for key, value in headers:
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not drip:
+            self.wfile.write(body)
+            return
+        # Trickle the body out a few bytes at a time
+        for index in range(0, len(body), self.server.drip_size):
+            self.wfile.write(body[index:index + self.server.drip_size])
+            self.wfile.flush()
+            time.sleep(self.server.drip_interval)
+
+    def log_message(self, *args):
+        pass
+
+
+class RobotsServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    '''A threaded server posing as every host under DOMAIN.'''
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, profiles, latency='lognormal', mean_latency=0.02,
+                 drip_size=16, drip_interval=0.05, address=('127.0.0.1', 0)):
+        BaseHTTPServer.HTTPServer.__init__(self, address, RobotsHandler)
+        self.profiles = profiles
+        self.distribution = LATENCIES[latency]
+        self.mean_latency = mean_latency
+        self.drip_size = drip_size
+        self.drip_interval = drip_interval
+        self.random = random.Random(profiles.seed)
+        self.lock = threading.Lock()
+        # Host => HostProfile, for each host that has been asked for
+        self.hosts = {}
+        # Host => number of requests
+        self.requests = {}
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def profile(self, host):
+        with self.lock:
+            profile = self.hosts.get(host)
+            if profile is None:
+                profile = self.hosts[host] = self.profiles(host)
+            return profile
+
+    def record(self, host):
+        with self.lock:
+            self.requests[host] = self.requests.get(host, 0) + 1
+
+    def latency(self):
+        with self.lock:
+            return self.distribution(self.random, self.mean_latency)
+
+    def start(self):
+        '''Serve from a background thread.'''
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class LoopbackResolver(Resolver):
+    '''Resolve every host under DOMAIN to 127.0.0.1.'''
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+
+    def lookup(self, host, port):
+        return (['127.0.0.1'], self.ttl)
+
+
+class Zipf(object):
+    '''Draws ranks in [0, count) with probability proportional to 1 / (rank + 1) ** exponent.'''
+
+    def __init__(self, count, exponent=1.1):
+        self.cumulative = []
+        total = 0.0
+        for rank in range(1, count + 1):
+            total += 1.0 / rank ** exponent
+            self.cumulative.append(total)
+        self.total = total
+
+    def sample(self, rand):
+        return bisect.bisect_left(self.cumulative, rand.random() * self.total)
+
+
+def percentile(ordered, fraction):
+    '''The value at fraction of the way through ordered values.'''
+    if not ordered:
+        return None
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def max_rss():
+    '''Peak resident memory of this process, in bytes, if known.'''
+    if resource is None:  # pragma: no cover
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, and macOS bytes
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def drive(cache, port, hosts=1000, threads=16, lookups=10000, exponent=1.1, seed=0):
+    '''
+    Look up lookups URLs, split among threads, with cache. Return a dict of
+    the throughput, latency percentiles of allowed, and the cache's counts.
+    '''
+    zipf = Zipf(hosts, exponent)
+    agent_cache = isinstance(cache, AgentCache)
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+
+    def worker(index, count):
+        rand = random.Random('%s:%s' % (seed, index))
+        local = []
+        failed = {}
+        for _ in range(count):
+            url = 'http://host-%d.%s:%d/%s/%s' % (
+                zipf.sample(rand), DOMAIN, port, rand.choice(WORDS), rand.choice(WORDS))
+            start = default_timer()
+            try:
+                if agent_cache:
+                    cache.allowed(url)
+                else:
+                    cache.allowed(url, AGENT)
+            except Exception as exc:
+                name = type(exc).__name__
+                failed[name] = failed.get(name, 0) + 1
+            local.append(default_timer() - start)
+        with lock:
+            latencies.extend(local)
+            for name, count in failed.items():
+                errors[name] = errors.get(name, 0) + count
+
+    shares = [lookups // threads + (1 if i < lookups % threads else 0) for i in range(threads)]
+    workers = [threading.Thread(target=worker, args=(i, share)) for i, share in enumerate(shares)]
+    start = default_timer()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = default_timer() - start
+
+    latencies.sort()
+    metrics = cache.metrics
+    return {
+        'lookups': len(latencies),
+        'elapsed': elapsed,
+        'throughput': len(latencies) / elapsed if elapsed else None,
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+        'max': latencies[-1] if latencies else None,
+        'errors': errors,
+        'fetches': metrics.fetches.get(),
+        'failures': metrics.failures.snapshot(),
+        'hit_rate': metrics.hit_rate,
+        'entries': len(cache.cache),
+        'max_rss': max_rss()
+    }
+
+
+def run(args):
+    '''Start the server, drive the cache against it and return the report.'''
+    profiles = Profiles(
+        seed=args.seed, error_rate=args.error_rate, missing_rate=args.missing_rate,
+        redirect_rate=args.redirect_rate, drip_rate=args.drip_rate,
+        max_ages=tuple(int(age) for age in args.max_ages.split(',')), rules=args.rules)
+    server = RobotsServer(
+        profiles, latency=args.latency, mean_latency=args.mean_latency,
+        drip_interval=args.drip_interval).start()
+    try:
+        kwargs = dict(
+            capacity=args.capacity,
+            ttl_policy=HeaderWithDefaultPolicy(default=600, minimum=args.min_ttl),
+            resolver=CachingResolver(LoopbackResolver()),
+            pool_maxsize=args.threads,
+            timeout=args.timeout)
+        if args.cache == 'agent':
+            cache = AgentCache(AGENT, **kwargs)
+        else:
+            cache = RobotsCache(**kwargs)
+        report = drive(
+            cache, server.port, hosts=args.hosts, threads=args.threads,
+            lookups=args.lookups, exponent=args.exponent, seed=args.seed)
+        report['server_requests'] = sum(server.requests.values())
+        report['server_hosts'] = len(server.requests)
+        return report
+    finally:
+        server.stop()
+
+
+def parser():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--cache', choices=('robots', 'agent'), default='robots')
+    parser.add_argument('--hosts', type=int, default=5000, help='Number of simulated hosts')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--lookups', type=int, default=50000, help='Total calls to allowed')
+    parser.add_argument('--exponent', type=float, default=1.1, help='Of the Zipf distribution')
+    parser.add_argument('--capacity', type=int, default=10000, help='Of the cache')
+    parser.add_argument('--latency', choices=sorted(LATENCIES), default='lognormal')
+    parser.add_argument('--mean-latency', type=float, default=0.02, help='In seconds')
+    parser.add_argument('--error-rate', type=float, default=0.02, help='Fraction of hosts with 5XX')
+    parser.add_argument('--missing-rate', type=float, default=0.1, help='Fraction of hosts with 404')
+    parser.add_argument('--redirect-rate', type=float, default=0.05)
+    parser.add_argument('--drip-rate', type=float, default=0.01,
+                        help='Fraction of hosts that trickle out their body')
+    parser.add_argument('--drip-interval', type=float, default=0.05,
+                        help='Seconds between the chunks of dripped bodies')
+    parser.add_argument('--max-ages', default='60,3600,86400',
+                        help='Comma-separated Cache-Control max-ages the hosts use')
+    parser.add_argument('--min-ttl', type=int, default=0, help='Minimum TTL of the cache')
+    parser.add_argument('--rules', type=int, default=20, help='Mean rules per robots.txt')
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    parser.add_argument('--verbose', action='store_true', help='Log each failed fetch')
+    return parser
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    if not args.verbose:
+        # Failures are expected, and are counted in the report instead
+        logger.setLevel(logging.CRITICAL)
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+        return 0
+    print('lookups:     %d in %.2fs (%.1f/s)' % (
+        report['lookups'], report['elapsed'], report['throughput']))
+    print('allowed:     p50 %.3fms, p99 %.3fms, max %.3fms' % (
+        report['p50'] * 1e3, report['p99'] * 1e3, report['max'] * 1e3))
+    print('hit rate:    %.4f' % report['hit_rate'])
+    print('fetches:     %d (%d requests to %d hosts served)' % (
+        report['fetches'], report['server_requests'], report['server_hosts']))
+    print('failures:    %s' % (report['failures'] or 'none'))
+    print('errors:      %s' % (report['errors'] or 'none'))
+    print('entries:     %d' % report['entries'])
+    if report['max_rss'] is not None:
+        print('max rss:     %.1f MiB' % (report['max_rss'] / 1048576.0))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,4 @@
+import threading
 import unittest
 
 from reppy.robots import Agent, Robots
@@ -15,6 +16,46 @@ class AgentTest(unittest.TestCase):
         agent = Agent().disallow('/path').allow('/path/')
         self.assertEqual(len(agent), 2)
 
+    def test_concurrent_mutation(self):
+        '''Rules may be added while other threads check paths.'''
+        agent = Agent().disallow('/private')
+        results = []
+        def check():
+            for _ in range(200):
+                results.append(agent.allowed('/private/page'))
+        def add(thread):
+            for index in range(200):
+                agent.allow('/public-%d-%d' % (thread, index))
+        threads = [threading.Thread(target=check) for _ in range(4)]
+        threads.extend(threading.Thread(target=add, args=(index,)) for index in range(4))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(agent), 801)
+        self.assertEqual(results, [False] * 800)
+
+    def test_robots_txt(self):
+        '''Writes a robots.txt giving its rules to each of the names.'''
+        agent = Agent().disallow('/path').allow('/path/')
+        self.assertEqual(
+            agent.robots_txt(['one', 'two']),
+            'User-agent: one\nUser-agent: two\nAllow: /path/\nDisallow: /path\n')
+        self.assertEqual(Agent().robots_txt(), 'User-agent: *\n')
+
+    def test_stats(self):
+        '''Reports what evaluating its rules costs.'''
+        agent = Agent().disallow('/path/*/page').allow('/a-path-longer-than-fifteen')
+        stats = agent.stats
+        self.assertEqual(stats['groups'], 1)
+        self.assertEqual(stats['directives'], 2)
+        self.assertEqual(stats['wildcards'], 1)
+        self.assertEqual(
+            stats['pattern_bytes'], len('/path/*/page') + len('/a-path-longer-than-fifteen'))
+        # The longer pattern can't be stored inline
+        self.assertGreater(
+            stats['memory'], Agent().disallow('/path/*/page').allow('/short').stats['memory'])
+
     def test_make_allowed(self):
         '''Make an agent that allows a path.'''
         agent = Agent().disallow('/path').allow('/path/')
@@ -26,6 +67,12 @@ class AgentTest(unittest.TestCase):
         agent = Agent().disallow('/path')
         self.assertFalse(agent.allowed('/path'))
 
+    def test_allowed_many(self):
+        '''Checks many paths at once.'''
+        agent = Agent().disallow('/path').allow('/path/')
+        self.assertEqual(
+            agent.allowed_many(['/path/', '/path', '/other']), [True, False, True])
+
     def test_checks_allowed(self):
         '''Answers the allowed question.'''
         agent = self.parse('''
@@ -0,0 +1,109 @@
+'''Tests about our asyncio caches.'''
+
+import asyncio
+import unittest
+
+import aiohttp
+import mock
+
+from reppy.cache import aio
+from reppy.cache.policy import ReraiseExceptionPolicy
+from reppy.robots import AllowNone
+import reppy.exceptions
+
+from ..aio_util import FakeSession, run
+
+
+class TestAsyncBaseCache(unittest.TestCase):
+    '''Tests about AsyncBaseCache.'''
+
+    def test_does_not_implement_fetch(self):
+        '''Does not implement the fetch method.'''
+        with self.assertRaises(NotImplementedError):
+            run(aio.AsyncBaseCache(10).fetch('http://example.com/robots.txt'))
+
+    def test_coalesces_concurrent_lookups(self):
+        '''Concurrent lookups of the same robots.txt share one fetch.'''
+        session = FakeSession('test_caches_robots', delay=0.01)
+        cache = aio.AsyncRobotsCache(10, session=session)
+        async def lookups():
+            return await asyncio.gather(*[
+                cache.allowed('http://example.com/allowed', 'agent')
+                for _ in range(10)])
+        self.assertEqual(run(lookups()), [True] * 10)
+        self.assertEqual(len(session.calls), 1)
+        self.assertEqual(cache.pending, {})
+
+    def test_caches(self):
+        '''Fetches each robots.txt once while it is fresh.'''
+        session = FakeSession('test_caches_robots')
+        cache = aio.AsyncRobotsCache(10, session=session)
+        async def lookups():
+            await cache.get('http://example.com/a')
+            await cache.get('http://example.com/b')
+        run(lookups())
+        self.assertEqual(len(session.calls), 1)
+
+    def test_closes_owned_session(self):
+        '''Closes the session it created, but not one it was given.'''
+        session = mock.Mock()
+        cache = aio.AsyncRobotsCache(10, session=session)
+        run(cache.close())
+        self.assertFalse(session.close.called)
+
+        async def create_and_close():
+            async with aio.AsyncRobotsCache(10) as cache:
+                await cache.fetch_robots('gobbledygook')
+        with self.assertRaises(reppy.exceptions.MalformedUrl):
+            run(create_and_close())
+
+
+class TestAsyncRobotsCache(unittest.TestCase):
+    '''Tests about AsyncRobotsCache.'''
+
+    def test_robots_allowed(self):
+        '''Can check for allowed.'''
+        cache = aio.AsyncRobotsCache(10, session=FakeSession('test_robots_allowed'))
+        self.assertFalse(run(cache.allowed('http://example.com/disallowed', 'agent')))
+        self.assertTrue(run(cache.allowed('http://example.com/allowed', 'agent')))
+
+    def test_returns_allow_none_on_failure(self):
+        '''Returns a AllowNone object on exception.'''
+        session = FakeSession(exception=aiohttp.ServerDisconnectedError())
+        cache = aio.AsyncRobotsCache(10, session=session)
+        self.assertIsInstance(run(cache.get('http://example.com/')), AllowNone)
+
+    def test_reraises_with_policy(self):
+        '''Honors the cache policy.'''
+        session = FakeSession(exception=aiohttp.ServerDisconnectedError())
+        cache = aio.AsyncRobotsCache(
+            10, cache_policy=ReraiseExceptionPolicy(ttl=600), session=session)
+        for _ in range(2):
+            with self.assertRaises(reppy.exceptions.ConnectionException):
+                run(cache.get('http://example.com/'))
+        self.assertEqual(len(session.calls), 1)
+
+    def test_passes_fetch_arguments(self):
+        '''Passes max_size on to afetch.'''
+        cache = aio.AsyncRobotsCache(
+            10, cache_policy=ReraiseExceptionPolicy(ttl=600), max_size=5,
+            session=FakeSession('test_content_too_big'))
+        with self.assertRaises(reppy.exceptions.ContentTooLong):
+            run(cache.get('http://example.com/'))
+
+
+class TestAsyncAgentCache(unittest.TestCase):
+    '''Tests about AsyncAgentCache.'''
+
+    def test_agent_allowed(self):
+        '''Can check for allowed.'''
+        cache = aio.AsyncAgentCache(
+            'agent', 10, session=FakeSession('test_agent_allowed'))
+        self.assertFalse(run(cache.allowed('http://example.com/disallowed')))
+        self.assertTrue(run(cache.allowed('http://example.com/allowed')))
+
+    def test_allows_none_on_failure(self):
+        '''Nothing is allowed on failure.'''
+        session = FakeSession(exception=aiohttp.ServerDisconnectedError())
+        cache = aio.AsyncAgentCache('agent', 10, session=session)
+        self.assertFalse(run(cache.allowed('http://example.com/path')))
@@ -2,13 +2,21 @@ from __future__ import print_function
 
 '''Tests about our caching utilities.'''
 
+import os
+import shutil
+import tempfile
 import unittest
 import mock
 
 import sys
+import threading
+import time
 
 from reppy import cache
-from reppy import logger
+from reppy import logger, snapshot
+from reppy.cache.policy import CircuitBreakerPolicy, ReraiseExceptionPolicy
+from reppy.resolver import CachingResolver, StaticResolver
+from reppy.transport import FakeTransport
 import reppy.exceptions
 
 from ..util import requests_fixtures
@@ -17,29 +25,44 @@ from ..util import requests_fixtures
 class TestExpiringObject(unittest.TestCase):
     '''Tests about ExpiringObject.'''
 
-    def test_uses_factory(self):
-        '''Uses the result from the factory.'''
-        factory = mock.Mock(return_value=(10, 'result'))
-        obj = cache.ExpiringObject(factory)
+    def test_returns_object(self):
+        '''Returns the wrapped object.'''
+        obj = cache.ExpiringObject(10, 'result')
         self.assertEqual(obj.get(), 'result')
         self.assertEqual(obj.expires, 10)
 
-    def test_memoizes_cached_result(self):
-        '''Memoizes what's returned by the factory.'''
-        factory = mock.Mock(return_value=(10, 'result'))
-        obj = cache.ExpiringObject(factory)
-        with mock.patch.object(cache.time, 'time', return_value=0):
-            for _ in range(10):
-                obj.get()
-        self.assertEqual(factory.call_count, 1)
-
     def test_reraise_exception(self):
-        '''If the provided factory returns an exception, reraise it.'''
-        factory = mock.Mock(return_value=(10, ValueError('Kaboom!')))
-        obj = cache.ExpiringObject(factory)
+        '''If the wrapped object is an exception, reraise it.'''
+        obj = cache.ExpiringObject(10, ValueError('Kaboom!'))
         with self.assertRaises(ValueError):
             obj.get()
-        self.assertEqual(obj.expires, 10)
+
+    def test_expired(self):
+        '''Expired once the current time reaches its expiration.'''
+        obj = cache.ExpiringObject(10, 'result')
+        with mock.patch.object(cache.time, 'time', return_value=9):
+            self.assertFalse(obj.expired)
+        with mock.patch.object(cache.time, 'time', return_value=10):
+            self.assertTrue(obj.expired)
+
+    def test_has_no_dict(self):
+        '''Entries use slots rather than a per-instance dict.'''
+        obj = cache.ExpiringObject(10, 'result')
+        self.assertFalse(hasattr(obj, '__dict__'))
+
+
+class TestStripedLock(unittest.TestCase):
+    '''Tests about StripedLock.'''
+
+    def test_same_key_same_lock(self):
+        '''A key always maps to the same lock.'''
+        locks = cache.StripedLock(8)
+        self.assertIs(locks('key'), locks('key'))
+
+    def test_bounded_locks(self):
+        '''Many keys share a fixed number of locks.'''
+        locks = cache.StripedLock(8)
+        self.assertEqual(len(set(locks(str(i)) for i in range(100))), 8)
 
 
 class TestBaseCache(unittest.TestCase):
@@ -50,6 +73,322 @@ class TestBaseCache(unittest.TestCase):
         with self.assertRaises(NotImplementedError):
             cache.BaseCache(10).fetch('http://example.com/robots.txt')
 
+    def test_pooled_session(self):
+        '''Creates a pooled session that is passed on to fetch.'''
+        base = cache.BaseCache(10, pool_connections=7, pool_maxsize=3, keep_alive=False)
+        self.assertIs(base.kwargs['session'], base.session)
+        adapter = base.session.get_adapter('http://example.com/')
+        self.assertEqual(adapter._pool_connections, 7)
+        self.assertEqual(adapter._pool_maxsize, 3)
+        self.assertEqual(base.session.headers['Connection'], 'close')
+        self.assertEqual(set(base.kwargs), set(['session']))
+
+    def test_resolver(self):
+        '''The pooled session resolves hosts with the provided resolver.'''
+        caching = CachingResolver(StaticResolver({}))
+        base = cache.BaseCache(10, resolver=caching)
+        adapter = base.session.get_adapter('http://example.com/')
+        self.assertIs(adapter.poolmanager.resolver, caching)
+        self.assertIs(base.resolver, caching)
+        self.assertNotIn('resolver', base.kwargs)
+
+    def test_provided_session(self):
+        '''Uses the session it is given.'''
+        session = mock.Mock()
+        self.assertIs(cache.BaseCache(10, session=session).session, session)
+
+    def test_memoizes_cached_result(self):
+        '''Memoizes what's returned by fetch.'''
+        base = cache.BaseCache(10)
+        with mock.patch.object(base, 'fetch', return_value=(10, 'result')) as fetch:
+            with mock.patch.object(cache.time, 'time', return_value=0):
+                for _ in range(10):
+                    self.assertEqual(base.get('http://example.com/'), 'result')
+        self.assertEqual(fetch.call_count, 1)
+
+    def test_refetches_when_expired(self):
+        '''Fetches again once the entry has expired.'''
+        base = cache.BaseCache(10)
+        with mock.patch.object(base, 'fetch', return_value=(10, 'result')) as fetch:
+            with mock.patch.object(cache.time, 'time', return_value=0):
+                base.get('http://example.com/')
+            with mock.patch.object(cache.time, 'time', return_value=10):
+                base.get('http://example.com/')
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_single_fetch_when_contended(self):
+        '''Concurrent misses on the same robots.txt only fetch once.'''
+        base = cache.BaseCache(10)
+        started = threading.Event()
+        def fetch(url):
+            started.wait(1)
+            return (time.time() + 60, 'result')
+        with mock.patch.object(base, 'fetch', side_effect=fetch) as fetch:
+            threads = [
+                threading.Thread(target=base.get, args=('http://example.com/',))
+                for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            started.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(fetch.call_count, 1)
+
+    def test_shared_lock_not_held_while_fetching(self):
+        '''Hosts that share a lock don't wait on each other's fetches.'''
+        base = cache.BaseCache(10)
+        base.locks = cache.StripedLock(1)
+        release = threading.Event()
+        def fetch(url):
+            if url == 'http://slow.com/robots.txt':
+                release.wait(5)
+            return (time.time() + 60, url)
+        with mock.patch.object(base, 'fetch', side_effect=fetch):
+            slow = threading.Thread(target=base.get, args=('http://slow.com/',))
+            slow.start()
+            try:
+                self.assertEqual(
+                    base.get('http://fast.com/'), 'http://fast.com/robots.txt')
+                self.assertFalse(release.is_set())
+            finally:
+                release.set()
+                slow.join()
+        self.assertEqual(base.pending, {})
+
+    def test_waiters_share_failures(self):
+        '''Threads waiting on a fetch that raises get the same exception.'''
+        base = cache.BaseCache(10)
+        started = threading.Event()
+        release = threading.Event()
+        raised = []
+        def fetch(url):
+            started.set()
+            release.wait(5)
+            raise ValueError('failed')
+        def refresh():
+            try:
+                base.refresh('http://example.com/robots.txt')
+            except KeyError as exc:
+                raised.append(exc)
+        with mock.patch.object(base, 'fetch', side_effect=fetch) as fetch:
+            with mock.patch.object(
+                    base.cache_policy, 'exception', side_effect=KeyError('policy')):
+                threads = [threading.Thread(target=refresh) for _ in range(2)]
+                threads[0].start()
+                started.wait(5)
+                threads[1].start()
+                # Give the second thread time to start waiting on the first
+                time.sleep(0.05)
+                release.set()
+                for thread in threads:
+                    thread.join()
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(len(raised), 2)
+        self.assertEqual(base.pending, {})
+
+    def test_entries_fetches_missing_concurrently(self):
+        '''Fetches all the missing entries, across several threads.'''
+        base = cache.BaseCache(10)
+        threads = set()
+        all_started = threading.Event()
+        def fetch(url):
+            threads.add(threading.current_thread())
+            if len(threads) == 3:
+                all_started.set()
+            # Only returns once all three fetches are in flight at the same time
+            all_started.wait(1)
+            return (time.time() + 60, url)
+        urls = ['http://%s.example.com/robots.txt' % c for c in 'abc']
+        with mock.patch.object(base, 'fetch', side_effect=fetch):
+            entries = base.entries(urls, concurrency=3)
+        self.assertEqual(
+            dict((url, entry.get()) for url, entry in entries.items()),
+            dict((url, url) for url in urls))
+        self.assertEqual(len(threads), 3)
+
+    def test_entries_skips_fresh(self):
+        '''Does not refetch entries that are already cached.'''
+        base = cache.BaseCache(10)
+        with mock.patch.object(base, 'fetch', return_value=(10, 'result')) as fetch:
+            with mock.patch.object(cache.time, 'time', return_value=0):
+                base.get('http://example.com/')
+                base.entries(['http://example.com/robots.txt'])
+        self.assertEqual(fetch.call_count, 1)
+
+    def test_prefetch(self):
+        '''Fetches each robots.txt once, and summarizes the outcome.'''
+        base = cache.BaseCache(10)
+        def fetch(url):
+            if url.startswith('http://bad'):
+                raise ValueError('Kaboom')
+            return (time.time() + 60, url)
+        with mock.patch.object(base, 'fetch', side_effect=fetch) as mock_fetch:
+            summary = base.prefetch([
+                'http://a.example.com/1',
+                'http://a.example.com/2',
+                'http://b.example.com/',
+                'http://bad.example.com/'
+            ])
+        self.assertEqual(mock_fetch.call_count, 3)
+        self.assertEqual(
+            sorted(summary.fetched),
+            ['http://a.example.com/robots.txt', 'http://b.example.com/robots.txt'])
+        self.assertEqual(list(summary.failed), ['http://bad.example.com/robots.txt'])
+        self.assertIsInstance(
+            summary.failed['http://bad.example.com/robots.txt'], ValueError)
+        self.assertEqual(base.get('http://a.example.com/'), 'http://a.example.com/robots.txt')
+
+    def test_prefetch_skips_fresh(self):
+        '''Does not fetch entries that are already fresh.'''
+        base = cache.BaseCache(10)
+        with mock.patch.object(base, 'fetch', return_value=(10, 'result')) as fetch:
+            with mock.patch.object(cache.time, 'time', return_value=0):
+                base.get('http://example.com/')
+                summary = base.prefetch(['http://example.com/'])
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(summary.fresh, ['http://example.com/robots.txt'])
+        self.assertEqual(summary.fetched, {})
+
+    def test_prefetch_callback(self):
+        '''Invokes the callback as each robots.txt is warm.'''
+        base = cache.BaseCache(10)
+        calls = []
+        with mock.patch.object(base, 'fetch', return_value=(time.time() + 60, 'result')):
+            base.prefetch(
+                ['http://example.com/'],
+                callback=lambda url, exc: calls.append((url, exc)))
+        self.assertEqual(calls, [('http://example.com/robots.txt', None)])
+
+    def test_prefetch_deadline(self):
+        '''Returns by the deadline, reporting fetches that are still pending.'''
+        base = cache.BaseCache(10)
+        release = threading.Event()
+        def fetch(url):
+            release.wait(5)
+            return (time.time() + 60, url)
+        try:
+            with mock.patch.object(base, 'fetch', side_effect=fetch):
+                summary = base.prefetch(
+                    ['http://a.example.com/', 'http://b.example.com/'],
+                    concurrency=1, deadline=0.05)
+        finally:
+            release.set()
+        self.assertEqual(summary.fetched, {})
+        self.assertEqual(len(summary.pending), 2)
+
+    def test_map_groups(self):
+        '''Calls func once per robots.txt and returns results in input order.'''
+        base = cache.BaseCache(10)
+        calls = []
+        def func(obj, group):
+            calls.append((obj, group))
+            return [(obj, url) for url in group]
+        urls = [
+            'http://a.example.com/1',
+            'http://b.example.com/1',
+            'http://a.example.com/2'
+        ]
+        with mock.patch.object(base, 'fetch', side_effect=lambda url: (
+                time.time() + 60, url)):
+            results = base.map_groups(urls, func)
+        self.assertEqual(results, [
+            ('http://a.example.com/robots.txt', 'http://a.example.com/1'),
+            ('http://b.example.com/robots.txt', 'http://b.example.com/1'),
+            ('http://a.example.com/robots.txt', 'http://a.example.com/2')
+        ])
+        self.assertEqual(len(calls), 2)
+
+
+class TestDecisionCache(unittest.TestCase):
+    '''Tests about memoizing decisions in the cache.'''
+
+    def setUp(self):
+        self.cache = cache.BaseCache(10, decision_capacity=10)
+        self.func = mock.Mock(return_value=True)
+
+    def test_disabled_by_default(self):
+        '''Decisions are not cached unless asked for.'''
+        self.assertIsNone(cache.BaseCache(10).decisions)
+
+    def test_memoizes_decisions(self):
+        '''Only makes a decision once for a URL and agent.'''
+        with mock.patch.object(self.cache, 'fetch', return_value=(10, 'result')):
+            with mock.patch.object(cache.time, 'time', return_value=0):
+                for _ in range(3):
+                    self.assertTrue(self.cache.decide(
+                        'http://example.com/path#fragment', 'agent', self.func))
+                self.cache.decide('http://example.com/path', 'agent', self.func)
+        self.func.assert_called_once_with('result')
+        self.assertEqual(self.cache.decisions.hits, 3)
+        self.assertEqual(self.cache.decisions.misses, 1)
+        self.assertEqual(self.cache.decisions.hit_rate, 0.75)
+
+    def test_keyed_on_agent(self):
+        '''Decisions for different agents are independent.'''
+        with mock.patch.object(self.cache, 'fetch', return_value=(10, 'result')):
+            with mock.patch.object(cache.time, 'time', return_value=0):
+                self.cache.decide('http://example.com/path', 'one', self.func)
+                self.cache.decide('http://example.com/path', 'two', self.func)
+        self.assertEqual(self.func.call_count, 2)
+
+    def test_invalidated_on_refresh(self):
+        '''Decisions are remade once the underlying entry is refreshed.'''
+        with mock.patch.object(self.cache, 'fetch', return_value=(10, 'result')):
+            with mock.patch.object(cache.time, 'time', return_value=0):
+                self.cache.decide('http://example.com/path', 'agent', self.func)
+            with mock.patch.object(cache.time, 'time', return_value=10):
+                self.cache.decide('http://example.com/path', 'agent', self.func)
+        self.assertEqual(self.func.call_count, 2)
+
+    def test_invalidated_on_eviction(self):
+        '''Decisions are remade once the underlying entry is evicted.'''
+        with mock.patch.object(self.cache, 'fetch', return_value=(10, 'result')):
+            with mock.patch.object(cache.time, 'time', return_value=0):
+                self.cache.decide('http://example.com/path', 'agent', self.func)
+                self.cache.cache.clear()
+                self.cache.decide('http://example.com/path', 'agent', self.func)
+        self.assertEqual(self.func.call_count, 2)
+
+    def test_robots_cache(self):
+        '''RobotsCache decisions can be memoized.'''
+        robots_cache = cache.RobotsCache(10, decision_capacity=10)
+        with requests_fixtures('test_robots_allowed'):
+            for _ in range(2):
+                self.assertFalse(
+                    robots_cache.allowed('http://example.com/disallowed', 'agent'))
+        self.assertEqual(robots_cache.decisions.hits, 1)
+
+
+class TestConcurrency(unittest.TestCase):
+    '''Tests about sharing a cache between threads.'''
+
+    def test_shared_lookups(self):
+        '''Threads get consistent answers while entries are fetched and evicted.'''
+        transport = FakeTransport()
+        for index in range(20):
+            transport.add(
+                'http://host-%d.com/robots.txt' % index, 200,
+                'User-agent: *\nDisallow: /private')
+        robots_cache = cache.RobotsCache(5, transport=transport, decision_capacity=10)
+        errors = []
+        def lookups(offset):
+            try:
+                for index in range(200):
+                    host = 'http://host-%d.com' % ((offset + index) % 20)
+                    if robots_cache.allowed(host + '/private', 'agent') or \
+                            not robots_cache.allowed(host + '/public', 'agent'):
+                        errors.append(host)
+            except Exception as exc:
+                errors.append(exc)
+        threads = [threading.Thread(target=lookups, args=(index,)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(robots_cache.cache), 5)
+        self.assertGreater(robots_cache.metrics.evictions.get(), 0)
+
 
 class TestRobotsCache(unittest.TestCase):
     '''Tests about RobotsCache.'''
@@ -97,6 +436,548 @@ class TestRobotsCache(unittest.TestCase):
             self.cache.allowed('http://example.com/allowed', 'agent'))
 
 
+    def test_allowed_many(self):
+        '''Checks many URLs across hosts, in order.'''
+        with requests_fixtures('test_robots_allowed'):
+            self.assertEqual(self.cache.allowed_many([
+                'http://a.example.com/disallowed',
+                'http://b.example.com/allowed',
+                'http://a.example.com/allowed',
+                'http://b.example.com/disallowed'
+            ], 'agent'), [False, True, True, False])
+        self.assertEqual(len(self.cache.cache), 2)
+
+    def test_allowed_many_failure(self):
+        '''Applies the cache policy to hosts that fail.'''
+        self.assertEqual(
+            self.cache.allowed_many(['http://does-not-resolve/'], 'agent'), [False])
+
+    def test_filter_allowed(self):
+        '''Lazily yields the allowed URLs, or every decision, in order.'''
+        urls = [
+            'http://a.example.com/disallowed',
+            'http://b.example.com/allowed',
+            'http://a.example.com/allowed',
+            'http://b.example.com/disallowed'
+        ]
+        with requests_fixtures('test_robots_allowed'):
+            self.assertEqual(
+                list(self.cache.filter_allowed(iter(urls), 'agent', window=3)),
+                ['http://b.example.com/allowed', 'http://a.example.com/allowed'])
+            self.assertEqual(
+                list(self.cache.filter_allowed(urls, 'agent', pairs=True)),
+                list(zip(urls, [False, True, True, False])))
+
+    def test_filter_allowed_reads_ahead(self):
+        '''Holds at most two windows of URLs, prefetching the next.'''
+        transport = FakeTransport()
+        robots_cache = cache.RobotsCache(100, transport=transport)
+        read = []
+        def urls():
+            for index in range(100):
+                read.append(index)
+                yield 'http://host-%d.com/' % index
+        allowed = robots_cache.filter_allowed(urls(), 'agent', window=10)
+        self.assertEqual(read, [])
+        self.assertEqual(next(allowed), 'http://host-0.com/')
+        self.assertEqual(len(read), 20)
+        # The next window's fetches may still be in flight
+        self.assertGreaterEqual(len(transport.requests), 10)
+        self.assertEqual(len(list(allowed)), 99)
+        self.assertEqual(len(transport.requests), 100)
+
+
+class TestCacheMetrics(unittest.TestCase):
+    '''Tests about the metrics kept by the caches.'''
+
+    URL = 'http://example.com/robots.txt'
+
+    def test_counts(self):
+        '''Counts hits, misses, fetches, failures and evictions.'''
+        fake = FakeTransport().add(self.URL, content='User-agent: *').add(
+            'http://failing.com/robots.txt', exception=reppy.exceptions.ReadTimeout())
+        robots_cache = cache.RobotsCache(1, transport=fake)
+        robots_cache.get(self.URL)
+        robots_cache.get(self.URL)
+        robots_cache.get('http://failing.com/')
+        snapshot = robots_cache.metrics.snapshot()
+        self.assertEqual(snapshot['hits_total'], 1)
+        self.assertEqual(snapshot['misses_total'], 2)
+        self.assertEqual(snapshot['fetches_total'], 2)
+        self.assertEqual(snapshot['failures_total'], {'ReadTimeout': 1})
+        self.assertEqual(snapshot['evictions_total'], 1)
+        self.assertEqual(snapshot['entries'], 1)
+        self.assertEqual(snapshot['fetch_seconds']['count'], 2)
+        self.assertEqual(snapshot['lock_wait_seconds']['count'], 2)
+
+    def test_counts_not_modified(self):
+        '''Counts revalidations that found the robots.txt unchanged.'''
+        fake = FakeTransport().add(
+            self.URL, content='User-agent: *', headers={'ETag': '"abc"'})
+        agent_cache = cache.AgentCache('agent', 10, transport=fake)
+        agent_cache.get(self.URL)
+        fake.add(self.URL, status_code=304)
+        agent_cache.fetch(self.URL)
+        self.assertEqual(agent_cache.metrics.not_modified.get(), 1)
+
+    def test_prefetch(self):
+        '''Lookups by prefetch are counted once.'''
+        fake = FakeTransport().add(self.URL, content='User-agent: *')
+        robots_cache = cache.RobotsCache(10, transport=fake)
+        robots_cache.prefetch(['http://example.com/'])
+        robots_cache.allowed_many(['http://example.com/a', 'http://other.com/'], 'agent')
+        self.assertEqual(robots_cache.metrics.hits.get(), 1)
+        self.assertEqual(robots_cache.metrics.misses.get(), 2)
+
+    def test_filter_allowed(self):
+        '''Lookups by the streaming methods are counted once, however far they read ahead.'''
+        fake = FakeTransport()
+        robots_cache = cache.RobotsCache(10, transport=fake)
+        urls = ['http://%s.com/%i' % (host, index) for host in 'abc' for index in range(2)]
+        self.assertEqual(list(robots_cache.filter_allowed(urls, 'agent', window=2)), urls)
+        self.assertEqual(robots_cache.metrics.fetches.get(), 3)
+        self.assertEqual(
+            robots_cache.metrics.hits.get() + robots_cache.metrics.misses.get(), 3)
+
+
+class TestCostSampling(unittest.TestCase):
+    '''Tests about sampling the cost of decisions.'''
+
+    def setUp(self):
+        self.transport = FakeTransport().add(
+            'http://a.com/robots.txt', content='User-agent: *\nDisallow: /*.pdf$').add(
+            'http://b.com/robots.txt', content='User-agent: *')
+
+    def test_disabled(self):
+        '''Nothing is sampled by default.'''
+        robots_cache = cache.RobotsCache(10, transport=self.transport)
+        robots_cache.allowed('http://a.com/', 'agent')
+        self.assertIsNone(robots_cache.sampler)
+        self.assertEqual(robots_cache.most_expensive(), [])
+
+    def test_samples_allowed(self):
+        '''Samples allowed, and reports the stats of the most expensive.'''
+        robots_cache = cache.RobotsCache(10, transport=self.transport, sample_rate=1.0)
+        robots_cache.allowed('http://a.com/file.pdf', 'agent')
+        robots_cache.allowed('http://b.com/', 'agent')
+        expensive = robots_cache.most_expensive(1)
+        self.assertEqual(len(expensive), 1)
+        self.assertIn(
+            expensive[0]['url'], ('http://a.com/robots.txt', 'http://b.com/robots.txt'))
+        self.assertEqual(expensive[0]['samples'], 1)
+        self.assertEqual(expensive[0]['stats']['groups'], 1)
+
+    def test_samples_allowed_many(self):
+        '''Samples allowed_many, counting each URL.'''
+        agent_cache = cache.AgentCache('agent', 10, transport=self.transport, sample_rate=1.0)
+        agent_cache.allowed_many(['http://a.com/1', 'http://a.com/2.pdf'])
+        [cost] = agent_cache.most_expensive()
+        self.assertEqual((cost['url'], cost['samples']), ('http://a.com/robots.txt', 2))
+        self.assertEqual(cost['stats']['wildcards'], 1)
+
+    def test_samples_decisions(self):
+        '''Samples decisions that are not memoized.'''
+        robots_cache = cache.RobotsCache(
+            10, transport=self.transport, sample_rate=1.0, decision_capacity=10)
+        robots_cache.allowed('http://a.com/', 'agent')
+        robots_cache.allowed('http://a.com/', 'agent')
+        self.assertEqual(robots_cache.most_expensive()[0]['samples'], 1)
+
+
+class TestRedirectSharing(unittest.TestCase):
+    '''Tests about sharing entries among robots.txt that redirect to one place.'''
+
+    SHARED = 'https://cdn.example.com/robots.txt'
+
+    def setUp(self):
+        self.transport = FakeTransport().add(
+            self.SHARED, content='User-agent: *\nDisallow: /disallowed',
+            headers={'Cache-Control': 'max-age=1000', 'ETag': '"v1"'})
+        for host in ('a.com', 'b.com'):
+            self.transport.add(
+                'http://%s/robots.txt' % host, 301, headers={'Location': self.SHARED})
+        self.cache = cache.RobotsCache(10, transport=self.transport, alias_ttl=5000)
+
+    def fetched(self):
+        '''The URLs that have been fetched.'''
+        return [url for url, _ in self.transport.requests]
+
+    def entry(self, url):
+        '''The entry cached for the robots.txt of url.'''
+        return self.cache.cache[cache.Robots.robots_url(url)]
+
+    def assertRules(self, robots_cache, sites, allowed):
+        '''Assert that allowed gets the shared rules right on each of sites.'''
+        for site in sites:
+            self.assertTrue(allowed(robots_cache, site + '/allowed'), site)
+            self.assertFalse(allowed(robots_cache, site + '/disallowed'), site)
+
+    def test_shares_entry(self):
+        '''Aliases share the fetch, rules and expiration of where they redirect.'''
+        with mock.patch('time.time', return_value=0):
+            robots = self.cache.get('http://a.com/')
+        self.assertEqual(robots.url, self.SHARED)
+        self.assertEqual(self.fetched(), ['http://a.com/robots.txt'])
+        self.assertEqual(self.entry(self.SHARED).expires, self.entry('http://a.com/').expires)
+        self.assertEqual(self.cache.get(self.SHARED).url, self.SHARED)
+        self.assertEqual(self.cache.get(self.SHARED).etag, '"v1"')
+
+    def test_allowed_on_each_host(self):
+        '''Each alias and where they redirect apply the rules to their own host.'''
+        sites = ('http://a.com', 'http://b.com', 'https://cdn.example.com')
+        caches = [
+            (cache.RobotsCache(10, transport=self.transport, alias_ttl=5000),
+                lambda robots_cache, url: robots_cache.allowed(url, 'agent')),
+            (cache.AgentCache('agent', 10, transport=self.transport, alias_ttl=5000),
+                lambda robots_cache, url: robots_cache.allowed(url)),
+            (cache.MultiAgentCache(
+                ['agent', 'other'], 10, transport=self.transport, alias_ttl=5000),
+                lambda robots_cache, url: robots_cache.allowed(url, 'agent'))
+        ]
+        for robots_cache, allowed in caches:
+            with mock.patch('time.time', return_value=0):
+                self.assertRules(robots_cache, sites, allowed)
+            # Once expired, refreshed through where they redirect
+            with mock.patch('time.time', return_value=2000):
+                self.assertRules(robots_cache, sites, allowed)
+
+    def test_allowed_on_target_host(self):
+        '''Hosts that redirect within a site don't take over its rules.'''
+        target = 'https://www.x.com/robots.txt'
+        self.transport.add(
+            target, content='User-agent: *\nDisallow: /disallowed',
+            headers={'Cache-Control': 'max-age=1000'})
+        for host in ('x.com', 'y.com'):
+            self.transport.add(
+                'http://%s/robots.txt' % host, 301, headers={'Location': target})
+        sites = ('http://x.com', 'http://y.com', 'https://www.x.com')
+        for now in (0, 2000):
+            with mock.patch('time.time', return_value=now):
+                self.assertRules(
+                    self.cache, sites,
+                    lambda robots_cache, url: robots_cache.allowed(url, 'agent'))
+
+    def test_shares_failures(self):
+        '''Aliases share the failure of where they redirect.'''
+        robots_cache = cache.RobotsCache(
+            10, transport=self.transport, alias_ttl=5000,
+            cache_policy=ReraiseExceptionPolicy(ttl=600))
+        with mock.patch('time.time', return_value=0):
+            robots_cache.get('http://a.com/')
+        self.transport.add(self.SHARED, exception=reppy.exceptions.ReadTimeout())
+        with mock.patch('time.time', return_value=2000):
+            with self.assertRaises(reppy.exceptions.ReadTimeout):
+                robots_cache.get('http://a.com/')
+        self.assertIs(
+            robots_cache.cache[self.SHARED].obj,
+            robots_cache.cache['http://a.com/robots.txt'].obj)
+
+    def test_skips_redirects(self):
+        '''Once expired, aliases are refreshed from where they redirected.'''
+        with mock.patch('time.time', return_value=0):
+            first = self.cache.get('http://a.com/')
+        with mock.patch('time.time', return_value=2000):
+            second = self.cache.get('http://a.com/')
+        self.assertIsNot(first, second)
+        self.assertEqual(self.fetched(), ['http://a.com/robots.txt', self.SHARED])
+        self.assertEqual(second.url, self.SHARED)
+
+    def test_shares_refreshes_among_aliases(self):
+        '''A refresh through one alias serves the others.'''
+        with mock.patch('time.time', return_value=0):
+            self.cache.get('http://a.com/')
+            self.cache.get('http://b.com/')
+        with mock.patch('time.time', return_value=2000):
+            self.cache.get('http://a.com/')
+            self.cache.get('http://b.com/')
+            self.assertFalse(self.cache.allowed('http://b.com/disallowed', 'agent'))
+        self.assertEqual(self.fetched(), [
+            'http://a.com/robots.txt', 'http://b.com/robots.txt', self.SHARED])
+        self.assertEqual(
+            self.entry('http://a.com/').expires, self.entry('http://b.com/').expires)
+
+    def test_forgets_redirects(self):
+        '''Redirects are followed again after alias_ttl.'''
+        with mock.patch('time.time', return_value=0):
+            self.cache.get('http://a.com/')
+        with mock.patch('time.time', return_value=5000):
+            self.cache.get('http://a.com/')
+        self.assertEqual(
+            self.fetched(), ['http://a.com/robots.txt', 'http://a.com/robots.txt'])
+
+    def test_no_redirect(self):
+        '''URLs that don't redirect have no alias.'''
+        self.cache.get(self.SHARED)
+        self.assertEqual(len(self.cache.aliases), 0)
+        self.assertEqual(self.cache.canonical(self.SHARED), self.SHARED)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    '''Tests about caches with a CircuitBreakerPolicy.'''
+
+    URL = 'http://example.com/robots.txt'
+
+    def test_fails_fast_while_open(self):
+        '''Does not fetch while the circuit is open, and recovers after.'''
+        fake = FakeTransport().add(
+            self.URL, exception=reppy.exceptions.ReadTimeout('Kaboom'))
+        robots_cache = cache.RobotsCache(
+            10, transport=fake,
+            cache_policy=CircuitBreakerPolicy(
+                ttls={reppy.exceptions.ReadTimeout: 100}, threshold=1,
+                factory=cache.AllowNone))
+        with mock.patch('time.time', return_value=0):
+            self.assertFalse(robots_cache.allowed('http://example.com/', 'agent'))
+            # Losing the cached failure doesn't lead to another fetch
+            robots_cache.cache.clear()
+            _, exception = robots_cache.refresh(self.URL)
+        self.assertIsInstance(exception, reppy.exceptions.CircuitOpen)
+        self.assertEqual(len(fake.requests), 1)
+
+        fake.add(self.URL, content='User-agent: *')
+        with mock.patch('time.time', return_value=100):
+            self.assertTrue(robots_cache.allowed('http://example.com/', 'agent'))
+        self.assertEqual(len(fake.requests), 2)
+        self.assertNotIn(self.URL, robots_cache.cache_policy.failures)
+
+
+class TestRevalidation(unittest.TestCase):
+    '''Tests about revalidating expired entries.'''
+
+    URL = 'http://example.com/robots.txt'
+
+    def setUp(self):
+        self.transport = FakeTransport().add(
+            self.URL, content='User-agent: *\nDisallow: /disallowed',
+            headers={'ETag': '"abc"', 'Cache-Control': 'max-age=1000'})
+
+    def expire_and_revalidate(self, robots_cache):
+        '''Fetch, then refetch once expired with the server reporting no change.'''
+        with mock.patch('time.time', return_value=0):
+            first = robots_cache.get(self.URL)
+        self.transport.add(
+            self.URL, status_code=304, headers={'Cache-Control': 'max-age=2000'})
+        with mock.patch('time.time', return_value=1000):
+            second = robots_cache.get(self.URL)
+        return first, second
+
+    def test_robots_cache(self):
+        '''Keeps the cached Robots, with a new expiration.'''
+        robots_cache = cache.RobotsCache(10, transport=self.transport)
+        first, second = self.expire_and_revalidate(robots_cache)
+        self.assertIs(first, second)
+        self.assertEqual(second.expires, 3000)
+        self.assertEqual(robots_cache.cache[self.URL].expires, 3000)
+        self.assertEqual(
+            self.transport.requests[1][1]['headers'], {'If-None-Match': '"abc"'})
+
+    def test_agent_cache(self):
+        '''Keeps the cached Agent.'''
+        agent_cache = cache.AgentCache('agent', 10, transport=self.transport)
+        first, second = self.expire_and_revalidate(agent_cache)
+        self.assertIs(first, second)
+        self.assertFalse(agent_cache.allowed('http://example.com/disallowed'))
+
+    def test_multi_agent_cache(self):
+        '''Keeps the cached Agents.'''
+        multi_cache = cache.MultiAgentCache(
+            ['one', 'two'], 10, transport=self.transport)
+        first, second = self.expire_and_revalidate(multi_cache)
+        self.assertIs(first, second)
+        self.assertIn('If-None-Match', self.transport.requests[1][1]['headers'])
+
+    def test_unconditional_without_validators(self):
+        '''Cached objects without validators are fetched unconditionally.'''
+        self.transport.add(self.URL, content='User-agent: *')
+        robots_cache = cache.RobotsCache(10, transport=self.transport)
+        robots_cache.get(self.URL)
+        robots_cache.fetch(self.URL)
+        self.assertNotIn('headers', self.transport.requests[1][1])
+
+
+class TestSnapshots(unittest.TestCase):
+    '''Tests about loading and dumping snapshots.'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'snapshot.jsonl')
+        self.level = logger.level
+        logger.setLevel('CRITICAL')
+
+    def tearDown(self):
+        logger.setLevel(self.level)
+        shutil.rmtree(self.directory)
+
+    def write(self, *records):
+        snapshot.write(self.path, records)
+
+    def test_load(self):
+        '''Loads records, expiring them by the ttl_policy from when they were fetched.'''
+        self.write(
+            snapshot.Record(
+                'http://a.com/robots.txt', 200, {'Cache-Control': 'max-age=3600'},
+                'User-agent: *\nDisallow: /private', fetched=1000),
+            snapshot.Record('http://b.com/robots.txt', 403, fetched=1000),
+            snapshot.Record('http://c.com/robots.txt', 404, fetched=1000))
+        robots_cache = cache.RobotsCache(10, transport=FakeTransport())
+        with mock.patch('time.time', return_value=2000):
+            summary = robots_cache.load_snapshot(self.path, batch_size=2)
+            self.assertEqual(summary.loaded, 3)
+            self.assertEqual(robots_cache.cache['http://a.com/robots.txt'].expires, 4600)
+            self.assertEqual(robots_cache.cache['http://b.com/robots.txt'].expires, 4600)
+            self.assertFalse(robots_cache.allowed('http://a.com/private', 'agent'))
+            self.assertFalse(robots_cache.allowed('http://b.com/public', 'agent'))
+            self.assertTrue(robots_cache.allowed('http://c.com/private', 'agent'))
+        self.assertEqual(robots_cache.metrics.fetches.get(), 0)
+
+    def test_load_drops_expired(self):
+        '''Records that have expired, or that can't be loaded, are dropped.'''
+        self.write(
+            snapshot.Record('http://a.com/robots.txt', 200, fetched=0),
+            snapshot.Record('http://b.com/robots.txt', 200, expires=1000),
+            snapshot.Record('http://c.com/robots.txt', 503, fetched=5000))
+        robots_cache = cache.RobotsCache(10)
+        with mock.patch('time.time', return_value=5000):
+            summary = robots_cache.load_snapshot(self.path)
+        self.assertEqual((summary.loaded, summary.expired, summary.failed), (0, 2, 1))
+        self.assertEqual(len(robots_cache.cache), 0)
+
+    def test_load_ttl(self):
+        '''A ttl replaces every record's expiration, even if it had expired.'''
+        self.write(
+            snapshot.Record('http://a.com/robots.txt', 200, fetched=0),
+            snapshot.Record('http://b.com/robots.txt', 200, expires=1000))
+        robots_cache = cache.RobotsCache(10)
+        with mock.patch('time.time', return_value=5000):
+            summary = robots_cache.load_snapshot(self.path, ttl=60)
+        self.assertEqual((summary.loaded, summary.expired), (2, 0))
+        self.assertEqual(robots_cache.cache['http://a.com/robots.txt'].expires, 5060)
+        self.assertEqual(robots_cache.cache['http://b.com/robots.txt'].expires, 5060)
+
+    def test_load_keeps_fresh(self):
+        '''Fresh entries are newer than the snapshot, and kept.'''
+        self.write(snapshot.Record('http://a.com/robots.txt', content='Disallow: /'))
+        robots_cache = cache.RobotsCache(10, transport=FakeTransport())
+        robots_cache.get('http://a.com/')
+        summary = robots_cache.load_snapshot(self.path)
+        self.assertEqual((summary.loaded, summary.skipped), (0, 1))
+        self.assertIn('skipped=1', repr(summary))
+
+    def test_dump(self):
+        '''Dumps fresh entries with their validators and expirations.'''
+        transport = FakeTransport().add(
+            'http://a.com/robots.txt', 200, 'User-agent: *\nDisallow: /private',
+            {'etag': '"abc"', 'last-modified': 'yesterday'}).add(
+            'http://b.com/robots.txt', 200, 'User-agent: *\nDisallow: /', {})
+        robots_cache = cache.RobotsCache(10, transport=transport)
+        with mock.patch('time.time', return_value=0):
+            robots_cache.get('http://a.com/')
+            robots_cache.cache_policy.exception(
+                'http://c.com/robots.txt', ValueError('failed'))
+            robots_cache.cache['http://c.com/robots.txt'] = cache.ExpiringObject(
+                600, ValueError('failed'))
+        with mock.patch('time.time', return_value=3600):
+            robots_cache.get('http://b.com/')
+            self.assertEqual(robots_cache.dump_snapshot(self.path), 1)
+        records = list(snapshot.read(self.path))
+        self.assertEqual(records[0].url, 'http://b.com/robots.txt')
+        self.assertEqual(records[0].fetched, 3600)
+        self.assertEqual(records[0].expires, 7200)
+
+    def test_dump_skips_substitutes(self):
+        '''What the cache_policy substituted for failed fetches isn't dumped.'''
+        transport = FakeTransport().add(
+            'http://a.com/robots.txt', 200, 'User-agent: *\nDisallow: /private').add(
+            'http://b.com/robots.txt', 500, '')
+        robots_cache = cache.RobotsCache(10, transport=transport)
+        robots_cache.prefetch(['http://a.com/', 'http://b.com/'])
+        self.assertFalse(robots_cache.allowed('http://b.com/', 'agent'))
+        self.assertIsInstance(
+            robots_cache.cache['http://b.com/robots.txt'], cache.SubstituteObject)
+        self.assertEqual(robots_cache.dump_snapshot(self.path), 1)
+        self.assertEqual(
+            [record.url for record in snapshot.read(self.path)],
+            ['http://a.com/robots.txt'])
+
+    def test_load_counts_no_lookups(self):
+        '''Loading doesn't count toward the cache's hits and misses.'''
+        self.write(
+            snapshot.Record('http://a.com/robots.txt'),
+            snapshot.Record('http://b.com/robots.txt'))
+        robots_cache = cache.RobotsCache(10, transport=FakeTransport())
+        robots_cache.get('http://a.com/')
+        self.assertEqual(robots_cache.metrics.misses.get(), 1)
+        summary = robots_cache.load_snapshot(self.path)
+        self.assertEqual((summary.loaded, summary.skipped), (1, 1))
+        self.assertEqual(robots_cache.metrics.hits.get(), 0)
+        self.assertEqual(robots_cache.metrics.misses.get(), 1)
+
+    def test_dump_skips_redirect_targets(self):
+        '''Where redirects led isn't loaded as the robots.txt of its host.'''
+        transport = FakeTransport().add(
+            'http://a.com/robots.txt', 301,
+            headers={'Location': 'https://cdn.com/a/robots.txt'}).add(
+            'https://cdn.com/a/robots.txt', 200, 'User-agent: *\nDisallow: /a-secret').add(
+            'https://cdn.com/robots.txt', 200, 'User-agent: *\nDisallow: /cdn-only')
+        original = cache.RobotsCache(10, transport=transport)
+        original.prefetch(['http://a.com/', 'https://cdn.com/'])
+        self.assertIn('https://cdn.com/a/robots.txt', original.cache)
+        self.assertEqual(original.dump_snapshot(self.path), 2)
+        restored = cache.RobotsCache(10, transport=FakeTransport())
+        self.assertEqual(restored.load_snapshot(self.path).loaded, 2)
+        for robots_cache in (original, restored):
+            self.assertFalse(robots_cache.allowed('http://a.com/a-secret', 'agent'))
+            self.assertTrue(robots_cache.allowed('http://a.com/cdn-only', 'agent'))
+            self.assertFalse(robots_cache.allowed('https://cdn.com/cdn-only', 'agent'))
+            self.assertTrue(robots_cache.allowed('https://cdn.com/a-secret', 'agent'))
+        self.assertEqual(restored.metrics.fetches.get(), 0)
+
+    def rules(self, obj):
+        '''The rules of a cached obj, for comparison.'''
+        if isinstance(obj, tuple):
+            return [str(agent) for agent in obj]
+        if isinstance(obj, cache.Robots):
+            return [str(obj.agent('one')), str(obj.agent('two')), obj.sitemaps]
+        return str(obj)
+
+    def test_round_trip(self):
+        '''Each kind of cache loads what it dumped.'''
+        transport = FakeTransport().add(
+            'http://a.com/robots.txt', 200,
+            'User-agent: one\nCrawl-delay: 5\nDisallow: /one\n\n'
+            'User-agent: *\nDisallow: /all\nSitemap: http://a.com/sitemap.xml',
+            {'etag': '"abc"'}).add(
+            'http://b.com/robots.txt', 200, 'User-agent: *\nDisallow: /all')
+        caches = [
+            lambda **kwargs: cache.RobotsCache(10, **kwargs),
+            lambda **kwargs: cache.AgentCache('one', 10, **kwargs),
+            lambda **kwargs: cache.MultiAgentCache(['one', 'two'], 10, **kwargs)
+        ]
+        for make in caches:
+            original = make(transport=transport)
+            original.prefetch(['http://a.com/', 'http://b.com/'])
+            self.assertEqual(original.dump_snapshot(self.path), 2)
+            restored = make(transport=FakeTransport())
+            self.assertEqual(restored.load_snapshot(self.path).loaded, 2)
+            for url in ('http://a.com/robots.txt', 'http://b.com/robots.txt'):
+                self.assertAlmostEqual(
+                    restored.cache[url].expires, original.cache[url].expires, delta=1)
+            self.assertEqual(
+                self.rules(restored.get('http://a.com/')),
+                self.rules(original.get('http://a.com/')))
+            self.assertEqual(
+                cache.BaseCache.validators(restored.get('http://a.com/'))['etag'], '"abc"')
+            self.assertEqual(restored.metrics.fetches.get(), 0)
+
+    def test_not_implemented(self):
+        '''BaseCache doesn't know what to build or dump.'''
+        base = cache.BaseCache(10)
+        with self.assertRaises(NotImplementedError):
+            base.build(None)
+        with self.assertRaises(NotImplementedError):
+            base.content(None)
+
+
 class TestAgentCache(unittest.TestCase):
     '''Tests about AgentCache.'''
 
@@ -143,6 +1024,25 @@ class TestAgentCache(unittest.TestCase):
             self.assertTrue(
                 self.cache.allowed('http://example.com/allowed'))
 
+    def test_allowed_many(self):
+        '''Checks many URLs across hosts, in order.'''
+        with requests_fixtures('test_agent_allowed'):
+            self.assertEqual(self.cache.allowed_many([
+                'http://a.example.com/disallowed',
+                'http://b.example.com/allowed',
+                'http://a.example.com/allowed',
+                'http://b.example.com/disallowed'
+            ]), [False, True, True, False])
+
+    def test_filter_allowed(self):
+        '''Lazily yields the allowed URLs in order.'''
+        with requests_fixtures('test_agent_allowed'):
+            self.assertEqual(list(self.cache.filter_allowed([
+                'http://a.example.com/disallowed',
+                'http://b.example.com/allowed',
+                'http://a.example.com/allowed'
+            ], window=2)), ['http://b.example.com/allowed', 'http://a.example.com/allowed'])
+
     def test_caches_agent(self):
         '''Caches agent responses.'''
         with requests_fixtures('test_caches_agent'):
@@ -154,3 +1054,68 @@ class TestAgentCache(unittest.TestCase):
             self.cache.allowed('http://example.com/disallowed'))
         self.assertTrue(
             self.cache.allowed('http://example.com/allowed'))
+
+
+class TestMultiAgentCache(unittest.TestCase):
+    '''Tests about MultiAgentCache.'''
+
+    def setUp(self):
+        self.cache = cache.MultiAgentCache(['one', 'two', 'three'], 10)
+
+    def test_agent_allowed(self):
+        '''Routes each check to the rules for that agent.'''
+        with requests_fixtures('test_multi_agent_allowed'):
+            self.assertFalse(self.cache.allowed('http://example.com/one', 'one'))
+            self.assertTrue(self.cache.allowed('http://example.com/two', 'one'))
+            self.assertFalse(self.cache.allowed('http://example.com/two', 'two'))
+            self.assertFalse(self.cache.allowed('http://example.com/disallowed', 'three'))
+            self.assertTrue(self.cache.allowed('http://example.com/one', 'three'))
+
+    def test_fetches_once(self):
+        '''Fetches the robots.txt once for all agents.'''
+        with requests_fixtures('test_multi_agent_allowed'):
+            with mock.patch.object(
+                    self.cache, 'fetch', wraps=self.cache.fetch) as fetch:
+                for agent in ('one', 'two', 'three'):
+                    self.cache.allowed('http://example.com/', agent)
+        self.assertEqual(fetch.call_count, 1)
+
+    def test_shares_identical_agents(self):
+        '''Agents that share the same rules share a single Agent.'''
+        with requests_fixtures('test_agent_allowed'):
+            self.assertIsInstance(self.cache.get('http://example.com/'), cache.Agent)
+            self.assertIs(
+                self.cache.agent('http://example.com/', 'one'),
+                self.cache.agent('http://example.com/', 'three'))
+
+    def test_unknown_agent(self):
+        '''Raises an exception for agents that are not cached.'''
+        with self.assertRaises(ValueError):
+            self.cache.allowed('http://example.com/', 'four')
+
+    def test_allows_none_on_failure(self):
+        '''Nothing is allowed on failure.'''
+        self.assertFalse(self.cache.allowed('http://does-not-resolve/', 'one'))
+
+    def test_allowed_many(self):
+        '''Checks many URLs across hosts, in order.'''
+        with requests_fixtures('test_multi_agent_allowed'):
+            self.assertEqual(self.cache.allowed_many([
+                'http://a.example.com/one',
+                'http://b.example.com/two',
+                'http://a.example.com/two'
+            ], 'two'), [True, False, False])
+
+    def test_filter_allowed(self):
+        '''Yields each decision for the agent in order.'''
+        with requests_fixtures('test_multi_agent_allowed'):
+            self.assertEqual(list(self.cache.filter_allowed([
+                'http://a.example.com/one',
+                'http://b.example.com/two',
+                'http://a.example.com/two'
+            ], 'two', pairs=True)), [
+                ('http://a.example.com/one', True),
+                ('http://b.example.com/two', False),
+                ('http://a.example.com/two', False)])
+        with self.assertRaises(ValueError):
+            self.cache.filter_allowed([], 'four')
@@ -0,0 +1,130 @@
+'''Tests about cache metrics.'''
+
+import unittest
+
+from cachetools import LRUCache
+import mock
+
+from reppy.cache import metrics
+
+
+class TestCounter(unittest.TestCase):
+    '''Tests about Counter.'''
+
+    def test_counts(self):
+        '''Counts up.'''
+        counter = metrics.Counter('hits_total', 'Hits.')
+        counter.inc()
+        counter.inc(amount=2)
+        self.assertEqual(counter.snapshot(), 3)
+
+    def test_labelled(self):
+        '''Counts each label value separately.'''
+        counter = metrics.Counter('failures_total', 'Failures.', 'exception')
+        counter.inc('ReadTimeout')
+        counter.inc('ReadTimeout')
+        counter.inc('SSLException')
+        self.assertEqual(counter.snapshot(), {'ReadTimeout': 2, 'SSLException': 1})
+        self.assertEqual(counter.get('ReadTimeout'), 2)
+
+
+class TestHistogram(unittest.TestCase):
+    '''Tests about Histogram.'''
+
+    def test_buckets(self):
+        '''Counts observations at or below each bound, cumulatively.'''
+        histogram = metrics.Histogram('seconds', 'Seconds.', (1, 5))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value)
+        self.assertEqual(histogram.snapshot(), {
+            'buckets': [(1, 2), (5, 3), (float('inf'), 4)],
+            'sum': 14.5,
+            'count': 4
+        })
+
+
+class TestCacheMetrics(unittest.TestCase):
+    '''Tests about CacheMetrics.'''
+
+    def setUp(self):
+        self.cache = mock.Mock(cache=LRUCache(maxsize=10))
+        self.cache.cache.update({'a': 1, 'b': 2})
+        self.metrics = metrics.CacheMetrics(self.cache)
+
+    def test_snapshot(self):
+        '''Snapshots every metric.'''
+        self.metrics.hits.inc()
+        self.metrics.misses.inc()
+        self.metrics.failures.inc('ReadTimeout')
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['hits_total'], 1)
+        self.assertEqual(snapshot['failures_total'], {'ReadTimeout': 1})
+        self.assertEqual(snapshot['entries'], 2)
+        self.assertEqual(snapshot['capacity'], 10)
+        self.assertEqual(snapshot['hit_rate'], 0.5)
+        self.assertEqual(snapshot['fetch_seconds']['count'], 0)
+
+    def test_hit_rate_without_lookups(self):
+        '''The hit rate is 0 before any lookups.'''
+        self.assertEqual(self.metrics.hit_rate, 0.0)
+
+    def test_prometheus(self):
+        '''Exports in the Prometheus text format.'''
+        self.metrics.hits.inc()
+        self.metrics.failures.inc('Read"Timeout')
+        self.metrics.lock_wait_seconds.observe(0.005)
+        text = self.metrics.prometheus(labels={'cache': 'robots'})
+        self.assertTrue(text.endswith('\n'))
+        lines = text.splitlines()
+        self.assertIn('# TYPE reppy_cache_hits_total counter', lines)
+        self.assertIn('reppy_cache_hits_total{cache="robots"} 1', lines)
+        self.assertIn(
+            'reppy_cache_failures_total{cache="robots",exception="Read\\"Timeout"} 1',
+            lines)
+        self.assertIn('# TYPE reppy_cache_lock_wait_seconds histogram', lines)
+        self.assertIn(
+            'reppy_cache_lock_wait_seconds_bucket{cache="robots",le="0.01"} 1', lines)
+        self.assertIn(
+            'reppy_cache_lock_wait_seconds_bucket{cache="robots",le="+Inf"} 1', lines)
+        self.assertIn('reppy_cache_lock_wait_seconds_count{cache="robots"} 1', lines)
+        self.assertIn('reppy_cache_entries{cache="robots"} 2', lines)
+
+    def test_prometheus_prefix(self):
+        '''Names start with the provided prefix.'''
+        lines = self.metrics.prometheus(prefix='crawler_robots').splitlines()
+        self.assertIn('crawler_robots_misses_total 0', lines)
+
+
+class TestCostSampler(unittest.TestCase):
+    '''Tests about CostSampler.'''
+
+    def test_sampled(self):
+        '''Samples at the provided rate.'''
+        with mock.patch.object(metrics.random, 'random', return_value=0.5):
+            self.assertTrue(metrics.CostSampler(0.6).sampled())
+            self.assertFalse(metrics.CostSampler(0.4).sampled())
+
+    def test_top(self):
+        '''Lists the robots.txt with the highest mean cost first.'''
+        sampler = metrics.CostSampler(1)
+        sampler.record('http://a.com/robots.txt', 1.0)
+        sampler.record('http://a.com/robots.txt', 3.0)
+        sampler.record('http://b.com/robots.txt', 4.0, count=4)
+        sampler.record('http://c.com/robots.txt', 5.0)
+        self.assertEqual(sampler.top(2), [
+            ('http://c.com/robots.txt', 1, 5.0, 5.0),
+            ('http://a.com/robots.txt', 2, 2.0, 3.0)])
+
+    def test_timed(self):
+        '''Times the wrapped function.'''
+        sampler = metrics.CostSampler(1)
+        func = sampler.timed('http://a.com/robots.txt', lambda x, y: x + y, 2)
+        self.assertEqual(func(1, 2), 3)
+        self.assertEqual(sampler.top()[0][:2], ('http://a.com/robots.txt', 2))
+
+    def test_capacity(self):
+        '''Keeps the costs of up to capacity robots.txt.'''
+        sampler = metrics.CostSampler(1, capacity=1)
+        sampler.record('http://a.com/robots.txt', 1.0)
+        sampler.record('http://b.com/robots.txt', 1.0)
+        self.assertEqual([row[0] for row in sampler.top()], ['http://b.com/robots.txt'])
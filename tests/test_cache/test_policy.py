@@ -4,6 +4,7 @@ import unittest
 
 import mock
 
+from reppy import exceptions
 from reppy.cache import policy
 
 
@@ -57,3 +58,79 @@ class TestReraiseExceptionPolicy(unittest.TestCase):
         exception = ValueError('Kaboom')
         _, value = self.policy.exception('http://example.com/', exception)
         self.assertEqual(value, exception)
+
+
+class TestCircuitBreakerPolicy(unittest.TestCase):
+    '''Tests about CircuitBreakerPolicy.'''
+
+    def setUp(self):
+        self.url = 'http://example.com/robots.txt'
+        self.policy = policy.CircuitBreakerPolicy(
+            ttl=10, ttls={exceptions.ReadTimeout: 100}, max_ttl=1000, threshold=2)
+
+    def fail(self, exception, now=0):
+        '''Record a failure at the provided time, returning the expiration.'''
+        with mock.patch.object(policy.time, 'time', return_value=now):
+            expiration, _ = self.policy.exception(self.url, exception)
+        return expiration
+
+    def test_ttl_by_exception_class(self):
+        '''Uses the TTL for the class of the exception.'''
+        self.assertEqual(self.fail(exceptions.ReadTimeout('Kaboom')), 100)
+
+    def test_default_ttl(self):
+        '''Uses the default TTL for unlisted exceptions.'''
+        self.assertEqual(self.fail(ValueError('Kaboom')), 10)
+
+    def test_subclass_ttl(self):
+        '''Subclasses of listed exceptions use their TTL.'''
+        class Subclass(exceptions.ReadTimeout):
+            pass
+        self.assertEqual(self.fail(Subclass('Kaboom')), 100)
+
+    def test_exponential_backoff(self):
+        '''Repeated failures back off exponentially, up to max_ttl.'''
+        expirations = [self.fail(exceptions.ReadTimeout('Kaboom')) for _ in range(5)]
+        self.assertEqual(expirations, [100, 200, 400, 800, 1000])
+
+    def test_success_resets(self):
+        '''A success resets the backoff.'''
+        self.fail(exceptions.ReadTimeout('Kaboom'))
+        self.policy.success(self.url)
+        self.assertEqual(self.fail(exceptions.ReadTimeout('Kaboom')), 100)
+
+    def test_closed_below_threshold(self):
+        '''Attempts are allowed below the threshold.'''
+        self.fail(exceptions.ReadTimeout('Kaboom'))
+        with mock.patch.object(policy.time, 'time', return_value=0):
+            self.policy.attempt(self.url)
+
+    def test_opens_at_threshold(self):
+        '''Attempts fail fast once the threshold is reached, until the TTL passes.'''
+        self.fail(exceptions.ReadTimeout('Kaboom'))
+        self.fail(exceptions.ReadTimeout('Kaboom'))
+        with mock.patch.object(policy.time, 'time', return_value=199):
+            with self.assertRaises(exceptions.CircuitOpen):
+                self.policy.attempt(self.url)
+        with mock.patch.object(policy.time, 'time', return_value=200):
+            self.policy.attempt(self.url)
+
+    def test_circuit_open_is_not_a_failure(self):
+        '''CircuitOpen expires with the circuit, without backing off further.'''
+        self.fail(exceptions.ReadTimeout('Kaboom'))
+        self.fail(exceptions.ReadTimeout('Kaboom'))
+        self.assertEqual(self.fail(exceptions.CircuitOpen('open'), now=50), 200)
+        self.assertEqual(self.policy.failures[self.url][0], 2)
+
+    def test_uses_factory(self):
+        '''Returns the factory's object in place of the exception, if provided.'''
+        factory = mock.Mock()
+        self.policy.factory = factory
+        _, value = self.policy.exception(self.url, ValueError('Kaboom'))
+        self.assertEqual(value, factory.return_value)
+
+    def test_returns_exception(self):
+        '''Returns the exception without a factory.'''
+        exception = ValueError('Kaboom')
+        _, value = self.policy.exception(self.url, exception)
+        self.assertIs(value, exception)
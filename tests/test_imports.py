@@ -0,0 +1,51 @@
+'''Tests about what importing reppy loads.'''
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loaded(statement):
+    '''The top-level modules that running statement in a fresh interpreter loads.'''
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        'import json, sys\n'
+        'before = set(sys.modules)\n'
+        'exec(sys.argv[1])\n'
+        'print(json.dumps(sorted(set('
+        'name.split(".")[0] for name in set(sys.modules) - before))))',
+        statement], cwd=ROOT)
+    return set(json.loads(output.decode('utf-8')))
+
+
+class ImportTest(unittest.TestCase):
+    '''Tests about deferring the imports that parsing doesn't need.'''
+
+    def test_parse(self):
+        '''Parsing loads neither the HTTP stack nor cachetools.'''
+        modules = loaded(
+            'import reppy\n'
+            'reppy.Robots.parse("http://a.com/robots.txt", "Disallow: /")')
+        for name in ('requests', 'urllib3', 'six', 'cachetools'):
+            self.assertNotIn(name, modules)
+
+    def test_cache(self):
+        '''Importing the caches loads neither the HTTP stack nor cachetools.'''
+        modules = loaded('import reppy.cache')
+        for name in ('requests', 'urllib3', 'cachetools'):
+            self.assertNotIn(name, modules)
+
+    def test_fetch(self):
+        '''Fetching loads requests.'''
+        modules = loaded(
+            'from reppy.robots import Robots\n'
+            'try:\n'
+            '    Robots.fetch("http://localhost:0/robots.txt")\n'
+            'except Exception:\n'
+            '    pass')
+        self.assertIn('requests', modules)
@@ -0,0 +1,88 @@
+'''Tests about the cache load-test harness.'''
+
+import random
+import unittest
+
+from reppy.robots import Robots
+
+from . import loadtest
+
+
+class ZipfTest(unittest.TestCase):
+    '''Tests about Zipf.'''
+
+    def test_sample(self):
+        '''Draws ranks in range, favoring the lowest.'''
+        zipf = loadtest.Zipf(10)
+        rand = random.Random(0)
+        counts = [0] * 10
+        for _ in range(1000):
+            counts[zipf.sample(rand)] += 1
+        self.assertEqual(sum(counts), 1000)
+        self.assertEqual(counts.index(max(counts)), 0)
+
+
+class ProfilesTest(unittest.TestCase):
+    '''Tests about Profiles.'''
+
+    def test_deterministic(self):
+        '''Hosts get the same profile every time.'''
+        first = loadtest.Profiles(seed=1)('host-1.test')
+        second = loadtest.Profiles(seed=1)('host-1.test')
+        self.assertEqual(
+            (first.status, first.redirect, first.max_age, first.body),
+            (second.status, second.redirect, second.max_age, second.body))
+
+    def test_rates(self):
+        '''Every host errors when the error rate is 1.'''
+        profiles = loadtest.Profiles(error_rate=1.0)
+        self.assertTrue(all(
+            profiles('host-%d.test' % i).status >= 500 for i in range(10)))
+
+
+class RobotsServerTest(unittest.TestCase):
+    '''Tests about RobotsServer.'''
+
+    def fetch(self, **kwargs):
+        profiles = loadtest.Profiles(
+            error_rate=0, missing_rate=0, max_ages=(1234,), **kwargs)
+        server = loadtest.RobotsServer(
+            profiles, latency='fixed', mean_latency=0, drip_interval=0).start()
+        try:
+            return server, Robots.fetch(
+                'http://127.0.0.1:%d/robots.txt' % server.port)
+        finally:
+            server.stop()
+
+    def test_serves_robots(self):
+        '''Serves each host's robots.txt with its max-age.'''
+        server, robots = self.fetch(redirect_rate=0)
+        self.assertEqual(server.requests, {'127.0.0.1': 1})
+        self.assertAlmostEqual(robots.ttl, 1234, delta=5)
+
+    def test_redirects(self):
+        '''Redirected hosts move their robots.txt.'''
+        server, robots = self.fetch(redirect_rate=1.0)
+        self.assertEqual(server.requests, {'127.0.0.1': 2})
+        self.assertTrue(robots.url.endswith(loadtest.RobotsHandler.MOVED))
+
+    def test_drips(self):
+        '''Dripped bodies arrive intact.'''
+        _, robots = self.fetch(redirect_rate=0, drip_rate=1.0, rules=40)
+        self.assertAlmostEqual(robots.ttl, 1234, delta=5)
+
+
+class RunTest(unittest.TestCase):
+    '''Tests about running the harness.'''
+
+    def test_run(self):
+        '''Reports on every lookup.'''
+        for cache in ('robots', 'agent'):
+            args = loadtest.parser().parse_args([
+                '--cache', cache, '--hosts', '20', '--threads', '4', '--lookups', '200',
+                '--mean-latency', '0', '--drip-interval', '0', '--error-rate', '0'])
+            report = loadtest.run(args)
+            self.assertEqual(report['lookups'], 200)
+            self.assertLessEqual(report['server_hosts'], 20)
+            self.assertGreater(report['fetches'], 0)
+            self.assertLessEqual(report['p50'], report['p99'])
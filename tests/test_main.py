@@ -0,0 +1,134 @@
+'''Tests about the command-line interface.'''
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from reppy import __main__ as main, logger
+
+
+class MainTest(unittest.TestCase):
+    '''Tests about python -m reppy.'''
+
+    def setUp(self):
+        self.level = logger.level
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'example.com.txt'), 'w') as fout:
+            fout.write('User-agent: *\nDisallow: /private')
+        self.snapshot = os.path.join(self.directory, 'snapshot.jsonl')
+        with open(self.snapshot, 'w') as fout:
+            fout.write(json.dumps({
+                'url': 'http://example.com/robots.txt',
+                'status': 200,
+                'content': 'User-agent: *\nDisallow: /public'}) + '\n')
+        self.urls = os.path.join(self.directory, 'urls.txt')
+        with open(self.urls, 'w') as fout:
+            fout.write('http://example.com/private\n\nhttp://other.com/private\n')
+
+    def tearDown(self):
+        logger.setLevel(self.level)
+        shutil.rmtree(self.directory)
+
+    def run_main(self, *argv, **kwargs):
+        stdin = io.StringIO(kwargs.pop('stdin', u''))
+        stdout = io.StringIO()
+        self.assertEqual(main.main(list(argv), stdin=stdin, stdout=stdout), 0)
+        return stdout.getvalue()
+
+    def test_tsv(self):
+        '''Writes each URL and its decision.'''
+        self.assertEqual(
+            self.run_main('-a', 'agent', '--offline', self.directory, self.urls),
+            'http://example.com/private\tdeny\nhttp://other.com/private\tallow\n')
+
+    def test_jsonl(self):
+        '''Writes a JSON object for each URL.'''
+        output = self.run_main(
+            '-a', 'agent', '-f', 'jsonl', '--offline', self.directory, self.urls)
+        self.assertEqual([json.loads(line) for line in output.splitlines()], [
+            {'url': 'http://example.com/private', 'allowed': False},
+            {'url': 'http://other.com/private', 'allowed': True}])
+
+    def test_filters(self):
+        '''Writes only the allowed or disallowed URLs.'''
+        self.assertEqual(
+            self.run_main('-a', 'agent', '-f', 'allowed', '--offline', self.directory, self.urls),
+            'http://other.com/private\n')
+        self.assertEqual(
+            self.run_main('-a', 'agent', '-f', 'disallowed', '--offline', self.directory, self.urls),
+            'http://example.com/private\n')
+
+    def test_stdin(self):
+        '''Reads URLs from stdin without files, or for -.'''
+        for paths in ([], ['-']):
+            self.assertEqual(
+                self.run_main(
+                    '-a', 'agent', '--offline', self.directory,
+                    stdin=u'http://example.com/private\n', *paths),
+                'http://example.com/private\tdeny\n')
+
+    def test_snapshot(self):
+        '''Reads robots.txt from a snapshot.'''
+        self.assertEqual(
+            self.run_main('-a', 'agent', '--snapshot', self.snapshot, self.urls),
+            'http://example.com/private\tallow\nhttp://other.com/private\tallow\n')
+
+    def test_snapshot_evicted(self):
+        '''Hosts evicted from the cache are read from the snapshot again.'''
+        with open(self.snapshot, 'w') as fout:
+            for host in ('a.com', 'b.com', 'c.com'):
+                fout.write(json.dumps({
+                    'url': 'http://%s/robots.txt' % host,
+                    'content': 'User-agent: *\nDisallow: /'}) + '\n')
+        urls = ['http://%s.com/page' % host for host in 'abcab']
+        self.assertEqual(
+            self.run_main(
+                '-a', 'agent', '-f', 'allowed', '--capacity', '1', '--batch-size', '1',
+                '--snapshot', self.snapshot, stdin=u'\n'.join(urls)),
+            '')
+
+    def test_snapshot_server_errors(self):
+        '''Server errors in the snapshot are left to the cache policy.'''
+        with open(self.snapshot, 'w') as fout:
+            fout.write(json.dumps({'url': 'http://d.com/robots.txt', 'status': 503}) + '\n')
+        self.assertEqual(
+            self.run_main(
+                '-a', 'agent', '--snapshot', self.snapshot, stdin=u'http://d.com/page'),
+            'http://d.com/page\tdeny\n')
+
+    def test_snapshot_indexed(self):
+        '''Indexes the snapshot rather than reading it into memory, and deletes the index.'''
+        indexed = main.SnapshotTransport.indexed
+        transports = []
+
+        def index(path):
+            transports.append(indexed(path))
+            return transports[-1]
+
+        with mock.patch.object(main.SnapshotTransport, 'load') as load:
+            with mock.patch.object(main.SnapshotTransport, 'indexed', side_effect=index):
+                self.run_main('-a', 'agent', '--snapshot', self.snapshot, self.urls)
+        self.assertFalse(load.called)
+        self.assertFalse(os.path.exists(transports[0].responses.directory))
+
+    def test_batches(self):
+        '''Checks URLs in batches of batch_size, in order.'''
+        with mock.patch.object(
+                main.RobotsCache, 'allowed_many',
+                autospec=True, side_effect=lambda self, urls, *args: [True] * len(urls)) as allowed:
+            output = self.run_main(
+                '-a', 'agent', '--batch-size', '1', '--offline', self.directory, self.urls)
+        self.assertEqual(allowed.call_count, 2)
+        self.assertEqual(output.count('allow'), 2)
+
+    def test_fetches(self):
+        '''Fetches robots.txt without --offline or --snapshot.'''
+        args = main.parser().parse_args(['-a', 'agent', '--timeout', '3'])
+        cache = main.cache(args)
+        self.assertEqual(cache.kwargs['timeout'], 3)
+        self.assertIsNotNone(cache.session)
@@ -0,0 +1,169 @@
+'''Tests about caching DNS resolution.'''
+
+import socket
+import threading
+import unittest
+
+import mock
+from six.moves import BaseHTTPServer
+
+from reppy import resolver, robots, session, transport
+
+
+class RobotsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''Serve the same robots.txt for every request.'''
+
+    # Keep connections alive between requests
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        content = b'User-agent: *\nDisallow: /path'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class StaticResolverTest(unittest.TestCase):
+    '''Tests about StaticResolver.'''
+
+    def test_lookup(self):
+        '''Looks up the provided addresses.'''
+        static = resolver.StaticResolver({'example.com': ['10.0.0.1']}, ttl=7)
+        self.assertEqual(static.lookup('example.com', 80), (['10.0.0.1'], 7))
+        self.assertEqual(static.lookups, ['example.com'])
+
+    def test_unknown(self):
+        '''Other hosts don't resolve.'''
+        with self.assertRaises(socket.gaierror):
+            resolver.StaticResolver({}).lookup('example.com', 80)
+
+
+class SystemResolverTest(unittest.TestCase):
+    '''Tests about SystemResolver.'''
+
+    def test_lookup(self):
+        '''Returns each distinct address, with the fixed TTL.'''
+        infos = [
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.1', 80)),
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.1', 80)),
+            (socket.AF_INET6, socket.SOCK_STREAM, 6, '', ('::1', 80, 0, 0))]
+        with mock.patch.object(resolver.socket, 'getaddrinfo', return_value=infos):
+            self.assertEqual(
+                resolver.SystemResolver(ttl=7).lookup('example.com', 80),
+                (['10.0.0.1', '::1'], 7))
+
+
+class CachingResolverTest(unittest.TestCase):
+    '''Tests about CachingResolver.'''
+
+    def setUp(self):
+        self.static = resolver.StaticResolver(
+            {'example.com': ['10.0.0.1'], 'other.com': ['10.0.0.2']}, ttl=10)
+        self.resolver = resolver.CachingResolver(self.static, max_ttl=100)
+
+    def resolve(self, host, now=0):
+        with mock.patch.object(resolver.time, 'time', return_value=now):
+            return self.resolver.resolve(host, 80)
+
+    def test_caches(self):
+        '''Answers repeated resolutions from the cache.'''
+        self.assertEqual(self.resolve('example.com'), ['10.0.0.1'])
+        self.assertEqual(self.resolve('EXAMPLE.com'), ['10.0.0.1'])
+        self.assertEqual(self.resolve('other.com'), ['10.0.0.2'])
+        self.assertEqual(self.static.lookups, ['example.com', 'other.com'])
+        self.assertEqual((self.resolver.hits, self.resolver.misses), (1, 2))
+        self.assertAlmostEqual(self.resolver.hit_rate, 1.0 / 3)
+
+    def test_respects_ttl(self):
+        '''Looks hosts up again once their TTL has passed.'''
+        self.resolve('example.com', now=0)
+        self.resolve('example.com', now=9)
+        self.resolve('example.com', now=10)
+        self.assertEqual(len(self.static.lookups), 2)
+
+    def test_max_ttl(self):
+        '''Caps the TTL at max_ttl.'''
+        self.static.ttl = 1000
+        self.resolve('example.com', now=0)
+        self.resolve('example.com', now=100)
+        self.assertEqual(len(self.static.lookups), 2)
+
+    def test_does_not_cache_failures(self):
+        '''Failed lookups are retried.'''
+        for _ in range(2):
+            with self.assertRaises(socket.gaierror):
+                self.resolve('unknown.com')
+        self.assertEqual(self.static.lookups, ['unknown.com', 'unknown.com'])
+
+    def test_hit_rate_without_resolutions(self):
+        '''The hit rate is 0 before any resolution.'''
+        self.assertEqual(self.resolver.hit_rate, 0.0)
+
+
+class ResolvingFetchTest(unittest.TestCase):
+    '''Tests about fetching through a CachingResolver.'''
+
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), RobotsHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.port = self.server.server_address[1]
+        self.resolver = resolver.CachingResolver(resolver.StaticResolver({
+            'robots.invalid': ['127.0.0.1'],
+            # Nothing listens on 127.0.0.2, so connections to it are refused
+            'fallback.invalid': ['127.0.0.2', '127.0.0.1']
+        }))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def url(self, host):
+        return 'http://%s:%s/robots.txt' % (host, self.port)
+
+    def test_pooled_session(self):
+        '''Sessions resolve hosts with the resolver.'''
+        pooled = session.pooled_session(resolver=self.resolver, keep_alive=False)
+        for _ in range(2):
+            robot = robots.Robots.fetch(self.url('robots.invalid'), session=pooled)
+            self.assertFalse(robot.allowed('/path', 'agent'))
+        self.assertEqual((self.resolver.hits, self.resolver.misses), (1, 1))
+
+    def test_timings(self):
+        '''Reports resolving and connecting on new connections only.'''
+        observer = mock.Mock()
+        pooled = session.pooled_session(resolver=self.resolver)
+        for _ in range(2):
+            robots.Robots.fetch(
+                self.url('robots.invalid'), session=pooled, observer=observer)
+        first, second = [args[0] for args, _ in observer.call_args_list]
+        self.assertGreater(first.connect, 0)
+        self.assertEqual((second.dns, second.connect), (0.0, 0.0))
+        self.assertEqual(first.wire_bytes, 29)
+
+    def test_urllib3_transport(self):
+        '''Urllib3Transport resolves hosts with the resolver.'''
+        robot = robots.Robots.fetch(
+            self.url('robots.invalid'),
+            transport=transport.Urllib3Transport(resolver=self.resolver))
+        self.assertFalse(robot.allowed('/path', 'agent'))
+        self.assertEqual(self.resolver.misses, 1)
+
+    def test_tries_each_address(self):
+        '''Falls back to the next address when a connection is refused.'''
+        robot = robots.Robots.fetch(
+            self.url('fallback.invalid'),
+            session=session.pooled_session(resolver=self.resolver))
+        self.assertFalse(robot.allowed('/path', 'agent'))
+
+    def test_unresolvable(self):
+        '''Hosts that don't resolve raise a ConnectionException.'''
+        with self.assertRaises(robots.exceptions.ConnectionException):
+            robots.Robots.fetch(
+                self.url('unknown.invalid'),
+                session=session.pooled_session(resolver=self.resolver))
@@ -7,12 +7,14 @@ from __future__ import print_function
 http://www.robotstxt.org/norobots-rfc.txt'''
 
 import codecs
+import threading
 import unittest
 
 import mock
+import requests
 from requests.exceptions import SSLError
 
-from reppy import robots
+from reppy import robots, transport
 
 from .util import requests_fixtures
 
@@ -38,6 +40,49 @@ class RobotsTest(unittest.TestCase):
             robot = robots.Robots.parse('http://example.com/robots.txt', '', expires=15)
             self.assertEqual(robot.ttl, 5)
 
+    def test_concurrent_use(self):
+        '''Threads may share a robots.txt from its first use, and revalidate it.'''
+        content = '\n'.join('Disallow: /private-%d' % index for index in range(100))
+        robot = robots.Robots.parse(
+            'http://example.com/robots.txt', 'User-agent: *\n' + content, expires=0)
+        results = []
+        def check():
+            for index in range(100):
+                robot.expires = index
+                results.append(robot.allowed('/private-%d' % index, 'agent'))
+                results.extend(robot.allowed_many(['/public', '/private-0'], 'agent'))
+        threads = [threading.Thread(target=check) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 1200)
+        self.assertEqual(results.count(True), 400)
+        self.assertEqual(robot.expires, 99)
+
+    def test_robots_txt(self):
+        '''Writes an equivalent robots.txt.'''
+        robot = robots.Robots.parse('http://example.com/robots.txt', '''
+            User-agent: one
+            User-agent: two
+            Crawl-delay: 2.5
+            Disallow: /private*$
+            Allow: /private/ok
+
+            User-agent: *
+            Disallow: /
+            Sitemap: http://example.com/sitemap.xml
+        ''')
+        content = robot.robots_txt()
+        self.assertIn(
+            'User-agent: one\nCrawl-delay: 2.5\nAllow: /private/ok\n'
+            'Disallow: /private*$\n', content)
+        self.assertTrue(content.endswith('Sitemap: http://example.com/sitemap.xml\n'))
+        reparsed = robots.Robots.parse('http://example.com/robots.txt', content)
+        for name in ('one', 'two', 'other'):
+            self.assertEqual(str(reparsed.agent(name)), str(robot.agent(name)))
+        self.assertEqual(reparsed.sitemaps, robot.sitemaps)
+
     def test_no_leading_user_agent(self):
         '''Treats missing User-Agent as default user agent'''
         robot = robots.Robots.parse('http://example.com/robots.txt', '''
@@ -83,6 +128,22 @@ class RobotsTest(unittest.TestCase):
         self.assertTrue(robot.allowed('/tmp', 'agent'))
         self.assertTrue(robot.allowed('/path', 'agent'))
 
+    def test_allowed_many(self):
+        '''Checks many paths against one agent at once.'''
+        robot = robots.Robots.parse('http://example.com/robots.txt', '''
+            User-agent: *
+            Disallow: /tmp
+
+            User-agent: agent
+            Disallow: /private
+        ''')
+        self.assertEqual(
+            robot.allowed_many(['/tmp', '/private', '/public'], 'agent'),
+            [True, False, True])
+        self.assertEqual(
+            robot.allowed_many(['/tmp', '/private', '/public'], 'other'),
+            [False, True, True])
+
     def test_grouping(self):
         '''Multiple consecutive User-Agent lines are allowed.'''
         robot = robots.Robots.parse('http://example.com/robots.txt', '''
@@ -136,6 +197,36 @@ class RobotsTest(unittest.TestCase):
             'http://a.com/sitemap.xml', 'http://b.com/sitemap.xml'
         ])
 
+    def test_stats(self):
+        '''Reports what evaluating its rules costs.'''
+        robot = robots.Robots.parse('http://example.com/robots.txt', '''
+            User-agent: one
+            User-agent: two
+            Disallow: /*.pdf$
+            Allow: /public
+
+            User-agent: *
+            Disallow: /private/*/page
+            Sitemap: http://a.com/sitemap.xml
+        ''')
+        stats = robot.stats
+        # Both agents of the first group, and the default
+        self.assertEqual(stats['groups'], 3)
+        self.assertEqual(stats['directives'], 5)
+        self.assertEqual(stats['wildcards'], 3)
+        self.assertEqual(
+            stats['pattern_bytes'],
+            2 * (len('/*.pdf$') + len('/public')) + len('/private/*/page'))
+        self.assertGreater(stats['memory'], robots.Robots.parse(
+            'http://example.com/robots.txt', '').stats['memory'])
+
+    def test_stats_empty(self):
+        '''An empty robots.txt has just the default group.'''
+        stats = robots.Robots.parse('http://example.com/robots.txt', '').stats
+        self.assertEqual(
+            (stats['groups'], stats['directives'], stats['wildcards'], stats['pattern_bytes']),
+            (1, 0, 0, 0))
+
     def test_case_insensitivity(self):
         '''Make sure user agent matches are case insensitive'''
         robot = robots.Robots.parse('http://example.com/robots.txt', '''
@@ -211,9 +302,146 @@ class RobotsTest(unittest.TestCase):
             with self.assertRaises(robots.exceptions.ReppyException):
                 robots.Robots.fetch('http://localhost:8080/robots.txt', max_size=5)
 
+    def test_session(self):
+        '''Fetches with the provided session.'''
+        session = mock.Mock(wraps=requests.Session())
+        with requests_fixtures('test_fetch_status_200'):
+            robot = robots.Robots.fetch(
+                'http://localhost:8080/robots.txt', session=session)
+            self.assertFalse(robot.allowed('/path', 'agent'))
+        session.get.assert_called_once_with(
+            'http://localhost:8080/robots.txt', stream=True)
+
+    def test_transport(self):
+        '''Fetches with the provided transport.'''
+        fake = transport.FakeTransport().add(
+            'http://example.com/robots.txt', content='User-agent: *\nDisallow: /path')
+        robot = robots.Robots.fetch(
+            'http://example.com/robots.txt', transport=fake, timeout=5)
+        self.assertFalse(robot.allowed('/path', 'agent'))
+        self.assertEqual(
+            fake.requests, [('http://example.com/robots.txt', {'timeout': 5})])
+
+    def test_transport_exception(self):
+        '''Passes exceptions raised by the transport to after_response_hook.'''
+        hook = mock.Mock()
+        fake = transport.FakeTransport().add(
+            'http://example.com/robots.txt',
+            exception=robots.exceptions.ReadTimeout('Kaboom'))
+        with self.assertRaises(robots.exceptions.ReadTimeout) as context:
+            robots.Robots.fetch(
+                'http://example.com/robots.txt', transport=fake,
+                after_response_hook=hook)
+        self.assertEqual(context.exception.url, 'http://example.com/robots.txt')
+        hook.assert_called_once_with(context.exception)
+
+    def test_final_url(self):
+        '''Remembers the URL that redirects led to.'''
+        fake = transport.FakeTransport().add(
+            'http://example.com/robots.txt', 301,
+            headers={'Location': 'https://cdn.example.com/shared/robots.txt'}).add(
+            'https://cdn.example.com/shared/robots.txt', content='User-agent: *')
+        robot = robots.Robots.fetch('http://example.com/robots.txt', transport=fake)
+        self.assertEqual(robot.url, 'https://cdn.example.com/shared/robots.txt')
+
+    def test_parsed_url(self):
+        '''Parsed robots.txt have the URL they were parsed with.'''
+        robot = robots.Robots.parse('http://example.com/robots.txt', '')
+        self.assertEqual(robot.url, 'http://example.com/robots.txt')
+
+    def test_captures_validators(self):
+        '''Remembers the ETag and Last-Modified of the response.'''
+        fake = transport.FakeTransport().add(
+            'http://example.com/robots.txt', content='User-agent: *',
+            headers={'ETag': '"abc"', 'Last-Modified': 'Tue, 01 Jan 2019 00:00:00 GMT'})
+        robot = robots.Robots.fetch('http://example.com/robots.txt', transport=fake)
+        self.assertEqual(robot.etag, '"abc"')
+        self.assertEqual(robot.last_modified, 'Tue, 01 Jan 2019 00:00:00 GMT')
+        self.assertEqual(robot.agent('agent').etag, '"abc"')
+
+    def test_conditional_fetch(self):
+        '''Sends validators as conditional headers.'''
+        fake = transport.FakeTransport().add(
+            'http://example.com/robots.txt', content='User-agent: *')
+        robots.Robots.fetch(
+            'http://example.com/robots.txt', transport=fake,
+            headers={'User-Agent': 'agent'},
+            etag='"abc"', last_modified='Tue, 01 Jan 2019 00:00:00 GMT')
+        self.assertEqual(fake.requests[0][1]['headers'], {
+            'User-Agent': 'agent',
+            'If-None-Match': '"abc"',
+            'If-Modified-Since': 'Tue, 01 Jan 2019 00:00:00 GMT'
+        })
+
+    def test_not_modified(self):
+        '''Returns NotModified for a 304 to a conditional fetch.'''
+        fake = transport.FakeTransport().add(
+            'http://example.com/robots.txt', status_code=304,
+            headers={'Cache-Control': 'max-age=1000'})
+        with mock.patch('time.time', return_value=0):
+            result = robots.Robots.fetch(
+                'http://example.com/robots.txt', transport=fake, etag='"abc"')
+        self.assertIsInstance(result, robots.NotModified)
+        self.assertEqual(result.expires, 1000)
+
+    def test_unconditional_not_modified(self):
+        '''A 304 to an unconditional fetch is a bad status.'''
+        fake = transport.FakeTransport().add(
+            'http://example.com/robots.txt', status_code=304)
+        with self.assertRaises(robots.exceptions.BadStatusCode):
+            robots.Robots.fetch('http://example.com/robots.txt', transport=fake)
+
+    def test_observer(self):
+        '''Passes the timing of the fetch to the observer.'''
+        observer = mock.Mock()
+        fake = transport.FakeTransport().add(
+            'http://example.com/robots.txt', content='User-agent: *')
+        robots.Robots.fetch(
+            'http://example.com/robots.txt', transport=fake, observer=observer)
+        timing, = observer.call_args[0]
+        self.assertEqual(timing.url, 'http://example.com/robots.txt')
+        self.assertEqual((timing.status, timing.bytes), (200, 13))
+        for phase in ('first_byte', 'read', 'ttl', 'parse'):
+            self.assertGreaterEqual(getattr(timing, phase), 0)
+        self.assertIsNone(timing.dns)
+        self.assertIsNone(timing.exception)
+
+    def test_observer_failure(self):
+        '''Passes the timing of failed fetches to the observer.'''
+        observer = mock.Mock()
+        fake = transport.FakeTransport().add('http://example.com/robots.txt', 500)
+        with self.assertRaises(robots.exceptions.BadStatusCode):
+            robots.Robots.fetch(
+                'http://example.com/robots.txt', transport=fake, observer=observer)
+        timing, = observer.call_args[0]
+        self.assertEqual(timing.status, 500)
+        self.assertIsInstance(timing.exception, robots.exceptions.BadStatusCode)
+
+    def test_deadline(self):
+        '''Raises DeadlineExceeded if the fetch outlasts its deadline.'''
+        hook = mock.Mock()
+        fake = transport.FakeTransport().add(
+            'http://example.com/robots.txt', content='User-agent: *')
+        with mock.patch('time.time', side_effect=[0, 0, 0, 11]):
+            with self.assertRaises(robots.exceptions.DeadlineExceeded) as context:
+                robots.Robots.fetch(
+                    'http://example.com/robots.txt', transport=fake, deadline=10,
+                    after_response_hook=hook)
+        hook.assert_called_once_with(context.exception)
+        self.assertEqual(fake.requests[0][1]['timeout'], 10)
+
+    def test_within_deadline(self):
+        '''Fetches normally within the deadline.'''
+        fake = transport.FakeTransport().add(
+            'http://example.com/robots.txt', content='User-agent: *\nDisallow: /path')
+        robot = robots.Robots.fetch(
+            'http://example.com/robots.txt', transport=fake, deadline=10, timeout=5)
+        self.assertFalse(robot.allowed('/path', 'agent'))
+        self.assertEqual(fake.requests[0][1]['timeout'], 5)
+
     def test_ssl_exception(self):
         '''Raises a ReppyException on SSL errors.'''
-        with mock.patch.object(robots.requests, 'get', side_effect=SSLError('Kaboom')):
+        with mock.patch.object(transport.requests, 'get', side_effect=SSLError('Kaboom')):
             with self.assertRaises(robots.exceptions.SSLException):
                 robots.Robots.fetch('https://localhost:8080/robots.txt')
 
@@ -433,3 +661,15 @@ class AllowAllTest(unittest.TestCase):
         '''Allows nothing.'''
         robot = robots.AllowAll('http://example.com/robots.txt')
         self.assertTrue(robot.allowed('/', 'agent'))
+
+
+class BuildTest(unittest.TestCase):
+    '''Tests about reporting how the extension was built.'''
+
+    def test_build(self):
+        '''Reports the variant, and tracing only for trace builds.'''
+        self.assertIn(robots.BUILD['variant'], ('release', 'trace', 'unknown'))
+        self.assertEqual(
+            robots.BUILD['tracing'], robots.BUILD['variant'] == 'trace')
+        if robots.BUILD['variant'] == 'trace':
+            self.assertFalse(robots.BUILD['lto'] or robots.BUILD['pgo'])
@@ -0,0 +1,91 @@
+'''Tests about the asyncio politeness scheduler.'''
+
+import asyncio
+import time
+import unittest
+
+import mock
+
+from reppy.cache.aio import AsyncRobotsCache
+from reppy.scheduler import aio
+
+from ..aio_util import run
+
+
+class FakeAgentCache(object):
+    '''Enough of an AsyncAgentCache to provide delays.'''
+
+    def __init__(self, delay):
+        self.agent = mock.Mock(delay=delay)
+        self.urls = []
+
+    async def get(self, url):
+        self.urls.append(url)
+        return self.agent
+
+
+class TestAsyncScheduler(unittest.TestCase):
+    '''Tests about AsyncScheduler.'''
+
+    def test_waits_for_delay(self):
+        '''Hands out a host's URLs once its delay has passed since the last.'''
+        sched = aio.AsyncScheduler(default_delay=2)
+        with mock.patch('time.time', return_value=0):
+            run(sched.add('http://a.com/1'))
+            run(sched.add('http://a.com/2'))
+            run(sched.add('http://b.com/1'))
+            self.assertEqual(
+                set([sched.next_ready(), sched.next_ready()]),
+                set(['http://a.com/1', 'http://b.com/1']))
+            self.assertIsNone(sched.next_ready())
+        with mock.patch('time.time', return_value=2):
+            self.assertEqual(sched.next_ready(), 'http://a.com/2')
+
+    def test_delay_from_cache(self):
+        '''Uses the Crawl-delay from the cache, or the default.'''
+        self.assertEqual(
+            run(aio.AsyncScheduler(FakeAgentCache(5)).delay('http://a.com/')), 5)
+        self.assertEqual(
+            run(aio.AsyncScheduler(FakeAgentCache(None), default_delay=3).delay(
+                'http://a.com/')), 3)
+
+    def test_robots_cache_without_agent(self):
+        '''An AsyncRobotsCache without an agent is refused.'''
+        with self.assertRaises(ValueError):
+            aio.AsyncScheduler(AsyncRobotsCache(10))
+
+    def test_get(self):
+        '''Waits for the next ready URL.'''
+        sched = aio.AsyncScheduler(FakeAgentCache(0.05))
+        async def crawl():
+            await sched.add('http://a.com/1')
+            await sched.add('http://a.com/2')
+            return [await sched.get(), await sched.get()]
+        start = time.time()
+        self.assertEqual(run(crawl()), ['http://a.com/1', 'http://a.com/2'])
+        self.assertGreaterEqual(time.time() - start, 0.05)
+
+    def test_get_timeout(self):
+        '''Returns None if nothing is ready in time.'''
+        self.assertIsNone(run(aio.AsyncScheduler().get(timeout=0.01)))
+
+    def test_get_wakes_on_add(self):
+        '''Waiting tasks are woken by URLs being added.'''
+        sched = aio.AsyncScheduler()
+        async def crawl():
+            waiter = asyncio.ensure_future(sched.get(timeout=5))
+            await asyncio.sleep(0.01)
+            await sched.add('http://a.com/1')
+            return await waiter
+        self.assertEqual(run(crawl()), 'http://a.com/1')
+
+    def test_acquire(self):
+        '''Waits for and reserves the next slot for the host.'''
+        sched = aio.AsyncScheduler(default_delay=0.05)
+        async def fetches():
+            return [await sched.acquire('http://a.com/%d' % i) for i in range(2)]
+        start = time.time()
+        first, second = run(fetches())
+        self.assertEqual(first, 0)
+        self.assertGreater(second, 0)
+        self.assertGreaterEqual(time.time() - start, 0.05)
@@ -0,0 +1,8 @@
+'''Tests about the asyncio politeness scheduler.'''
+
+import sys
+
+# The tests use async def, which older Pythons can't even parse, so they're only
+# imported where asyncio is supported
+if sys.version_info >= (3, 5):
+    from .aio import *
@@ -0,0 +1,189 @@
+'''Tests about the politeness scheduler.'''
+
+import threading
+import time
+import unittest
+
+import mock
+
+from reppy import scheduler
+from reppy.cache import AgentCache, RobotsCache
+from reppy.transport import FakeTransport
+
+
+def transport():
+    '''A FakeTransport where slow.com has a Crawl-delay of 5, and others have none.'''
+    return FakeTransport().add(
+        'http://slow.com/robots.txt', 200,
+        'User-agent: agent\nCrawl-delay: 5\n\nUser-agent: *\nCrawl-delay: 60')
+
+
+class TestScheduler(unittest.TestCase):
+    '''Tests about Scheduler.'''
+
+    def setUp(self):
+        self.scheduler = scheduler.Scheduler(default_delay=2)
+
+    def next_ready(self, now):
+        with mock.patch('time.time', return_value=now):
+            return self.scheduler.next_ready()
+
+    def add(self, url, now=0):
+        with mock.patch('time.time', return_value=now):
+            self.scheduler.add(url)
+
+    def test_waits_for_delay(self):
+        '''Hands out a host's URLs once its delay has passed since the last.'''
+        self.add('http://a.com/1')
+        self.add('http://a.com/2')
+        self.assertEqual(self.next_ready(0), 'http://a.com/1')
+        self.assertIsNone(self.next_ready(1.9))
+        self.assertEqual(self.next_ready(2), 'http://a.com/2')
+        self.assertIsNone(self.next_ready(10))
+
+    def test_hosts_are_independent(self):
+        '''Each host has its own delay.'''
+        for url in ('http://a.com/1', 'http://a.com/2', 'http://b.com/1'):
+            self.add(url)
+        self.assertEqual(
+            set([self.next_ready(0), self.next_ready(0)]),
+            set(['http://a.com/1', 'http://b.com/1']))
+        self.assertIsNone(self.next_ready(0))
+
+    def test_earliest_host_first(self):
+        '''Hands out the host that has been ready the longest.'''
+        self.add('http://a.com/1')
+        self.add('http://a.com/2')
+        self.next_ready(0)
+        self.add('http://b.com/1', now=1)
+        self.add('http://b.com/2', now=1)
+        self.next_ready(1)
+        self.assertEqual(self.next_ready(5), 'http://a.com/2')
+        self.assertEqual(self.next_ready(5), 'http://b.com/2')
+
+    def test_len(self):
+        '''Counts the queued URLs.'''
+        self.add('http://a.com/1')
+        self.add('http://b.com/1')
+        self.assertEqual(len(self.scheduler), 2)
+        self.next_ready(0)
+        self.assertEqual(len(self.scheduler), 1)
+
+    def test_next_time(self):
+        '''Reports the soonest time a URL may be ready.'''
+        self.assertIsNone(self.scheduler.next_time())
+        self.add('http://a.com/1')
+        self.add('http://a.com/2')
+        self.next_ready(0)
+        self.assertEqual(self.scheduler.next_time(), 2)
+
+    def test_forgets_idle_hosts(self):
+        '''Hosts without queued URLs are forgotten once their delay has passed.'''
+        self.add('http://a.com/1')
+        self.next_ready(0)
+        self.assertIn('http://a.com/robots.txt', self.scheduler.hosts)
+        self.next_ready(2)
+        self.assertEqual(self.scheduler.hosts, {})
+        self.assertEqual(self.scheduler.heap, [])
+
+    def test_acquire(self):
+        '''Waits for and reserves the next slot for the host.'''
+        with mock.patch('time.sleep') as sleep:
+            with mock.patch('time.time', return_value=0):
+                self.assertEqual(self.scheduler.acquire('http://a.com/1'), 0)
+                self.assertEqual(self.scheduler.acquire('http://a.com/2'), 2)
+                self.assertEqual(self.scheduler.acquire('http://a.com/3'), 4)
+                self.assertEqual(self.scheduler.acquire('http://b.com/1'), 0)
+        self.assertEqual(sleep.call_args_list, [mock.call(2), mock.call(4)])
+
+    def test_acquire_forgets_idle_hosts(self):
+        '''Hosts that were only acquired are also forgotten.'''
+        with mock.patch('time.time', return_value=0):
+            self.scheduler.acquire('http://a.com/1')
+        with mock.patch('time.time', return_value=2):
+            self.scheduler.acquire('http://b.com/1')
+        self.assertEqual(list(self.scheduler.hosts), ['http://b.com/robots.txt'])
+
+    def test_acquire_respects_queued(self):
+        '''Acquiring a host delays its queued URLs.'''
+        self.add('http://a.com/1')
+        with mock.patch('time.time', return_value=0):
+            self.scheduler.acquire('http://a.com/2')
+        self.assertIsNone(self.next_ready(1))
+        self.assertEqual(self.next_ready(2), 'http://a.com/1')
+
+    def test_get(self):
+        '''Waits for the next ready URL.'''
+        self.scheduler = scheduler.Scheduler(default_delay=0.05)
+        self.scheduler.add('http://a.com/1')
+        self.scheduler.add('http://a.com/2')
+        start = time.time()
+        self.assertEqual(self.scheduler.get(), 'http://a.com/1')
+        self.assertEqual(self.scheduler.get(), 'http://a.com/2')
+        self.assertGreaterEqual(time.time() - start, 0.05)
+
+    def test_get_timeout(self):
+        '''Returns None if nothing is ready in time.'''
+        self.assertIsNone(self.scheduler.get(timeout=0.01))
+        self.scheduler.add('http://a.com/1')
+        self.scheduler.add('http://a.com/2')
+        self.scheduler.get()
+        self.assertIsNone(self.scheduler.get(timeout=0.01))
+
+    def test_get_wakes_on_add(self):
+        '''Waiting threads are woken by URLs being added.'''
+        timer = threading.Timer(0.01, self.scheduler.add, ['http://a.com/1'])
+        timer.start()
+        self.assertEqual(self.scheduler.get(timeout=5), 'http://a.com/1')
+        timer.join()
+
+
+class TestSchedulerDelays(unittest.TestCase):
+    '''Tests about the delays Scheduler uses.'''
+
+    def test_agent_cache(self):
+        '''Uses the Crawl-delay from an AgentCache.'''
+        cache = AgentCache('agent', 10, transport=transport())
+        sched = scheduler.Scheduler(cache)
+        self.assertEqual(sched.delay('http://slow.com/page'), 5)
+        self.assertEqual(sched.delay('http://other.com/page'), 1.0)
+
+    def test_robots_cache(self):
+        '''Uses the Crawl-delay for agent from a RobotsCache.'''
+        cache = RobotsCache(10, transport=transport())
+        self.assertEqual(
+            scheduler.Scheduler(cache, 'agent').delay('http://slow.com/page'), 5)
+        self.assertEqual(
+            scheduler.Scheduler(cache, 'other').delay('http://slow.com/page'), 60)
+
+    def test_robots_cache_without_agent(self):
+        '''A RobotsCache without an agent is refused.'''
+        cache = RobotsCache(10, transport=transport())
+        with self.assertRaises(ValueError):
+            scheduler.Scheduler(cache)
+
+    def test_default_delay(self):
+        '''Uses the default delay when there's no Crawl-delay.'''
+        cache = AgentCache('agent', 10, transport=transport())
+        sched = scheduler.Scheduler(cache, default_delay=3)
+        self.assertEqual(sched.delay('http://other.com/page'), 3)
+
+    def test_max_delay(self):
+        '''Caps the delay at max_delay.'''
+        cache = RobotsCache(10, transport=transport())
+        sched = scheduler.Scheduler(cache, 'other', max_delay=10)
+        self.assertEqual(sched.delay('http://slow.com/page'), 10)
+
+    def test_without_cache(self):
+        '''Uses the default delay without a cache.'''
+        self.assertEqual(scheduler.Scheduler().delay('http://slow.com/page'), 1.0)
+
+    def test_scheduled_with_delay(self):
+        '''Queued URLs are handed out with the host's delay.'''
+        cache = AgentCache('agent', 10, transport=transport())
+        sched = scheduler.Scheduler(cache)
+        with mock.patch('time.time', return_value=0):
+            sched.add('http://slow.com/1')
+            sched.add('http://slow.com/2')
+            sched.next_ready()
+            self.assertEqual(sched.next_time(), 5)
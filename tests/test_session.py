@@ -0,0 +1,51 @@
+import unittest
+
+import requests
+from requests.cookies import create_cookie, MockRequest
+
+from reppy import resolver, session
+
+
+class PooledSessionTest(unittest.TestCase):
+    '''Tests about pooled_session.'''
+
+    def test_pool_size(self):
+        '''Configures the connection pools.'''
+        pooled = session.pooled_session(pool_connections=7, pool_maxsize=3)
+        for prefix in ('http://', 'https://'):
+            adapter = pooled.get_adapter(prefix + 'example.com/')
+            self.assertEqual(adapter._pool_connections, 7)
+            self.assertEqual(adapter._pool_maxsize, 3)
+
+    def test_shares_adapter(self):
+        '''HTTP and HTTPS share one set of pools.'''
+        pooled = session.pooled_session()
+        self.assertIs(
+            pooled.get_adapter('http://example.com/'),
+            pooled.get_adapter('https://example.com/'))
+
+    def test_keep_alive(self):
+        '''Connections are kept alive by default.'''
+        self.assertNotEqual(
+            session.pooled_session().headers.get('Connection'), 'close')
+
+    def test_no_keep_alive(self):
+        '''Asks for connections to be closed without keep_alive.'''
+        self.assertEqual(
+            session.pooled_session(keep_alive=False).headers['Connection'], 'close')
+
+    def test_refuses_cookies(self):
+        '''Does not keep cookies between requests.'''
+        pooled = session.pooled_session()
+        request = MockRequest(
+            requests.Request('GET', 'http://example.com/robots.txt').prepare())
+        cookie = create_cookie('name', 'value', domain='example.com')
+        self.assertFalse(pooled.cookies.get_policy().set_ok(cookie, request))
+
+    def test_resolver(self):
+        '''Resolves hosts with the provided resolver.'''
+        caching = resolver.CachingResolver(resolver.StaticResolver({}))
+        adapter = session.pooled_session(resolver=caching).get_adapter(
+            'http://example.com/')
+        self.assertIsInstance(adapter.poolmanager, resolver.ResolvingPoolManager)
+        self.assertIs(adapter.poolmanager.resolver, caching)
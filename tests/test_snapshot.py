@@ -0,0 +1,108 @@
+'''Tests about reading and writing snapshots.'''
+
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+
+from reppy import snapshot
+
+
+def warc_record(url, http, warc_type='response', date='2019-05-01T12:00:00Z'):
+    '''A WARC record of the HTTP message http for url.'''
+    return (
+        b'WARC/1.0\r\n'
+        b'WARC-Type: ' + warc_type.encode('ascii') + b'\r\n'
+        b'WARC-Target-URI: ' + url.encode('ascii') + b'\r\n'
+        b'WARC-Date: ' + date.encode('ascii') + b'\r\n'
+        b'Content-Type: application/http; msgtype=' + warc_type.encode('ascii') + b'\r\n'
+        b'Content-Length: ' + str(len(http)).encode('ascii') + b'\r\n'
+        b'\r\n' + http + b'\r\n\r\n')
+
+
+class SnapshotTest(unittest.TestCase):
+    '''Tests about reppy.snapshot.'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name, content=None, opener=open):
+        path = os.path.join(self.directory, name)
+        if content is not None:
+            with opener(path, 'wb') as fout:
+                fout.write(content)
+        return path
+
+    def test_read_jsonl(self):
+        '''Reads each non-blank line of a JSONL snapshot, with defaults.'''
+        records = list(snapshot.read(self.path('snapshot.jsonl', (
+            b'{"url": "http://a.com/robots.txt", "status": 403, "headers": {"etag": "x"}, '
+            b'"content": "User-agent: *", "fetched": 10, "expires": 20}\n\n'
+            b'{"url": "http://b.com/robots.txt"}\n'))))
+        self.assertEqual(
+            [(r.url, r.status, r.headers, r.content, r.fetched, r.expires) for r in records],
+            [('http://a.com/robots.txt', 403, {'etag': 'x'}, b'User-agent: *', 10, 20),
+             ('http://b.com/robots.txt', 200, {}, b'', None, None)])
+
+    def test_read_warc(self):
+        '''Reads the HTTP response records of a WARC file.'''
+        path = self.path('snapshot.warc', warc_record(
+            'http://a.com/robots.txt',
+            b'GET /robots.txt HTTP/1.1\r\nHost: a.com\r\n\r\n', 'request') + warc_record(
+            'http://a.com/robots.txt',
+            b'HTTP/1.1 200 OK\r\nCache-Control: max-age=60\r\n\r\nUser-agent: *\n'))
+        records = list(snapshot.read(path))
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].url, 'http://a.com/robots.txt')
+        self.assertEqual(records[0].status, 200)
+        self.assertEqual(records[0].headers, {'cache-control': 'max-age=60'})
+        self.assertEqual(records[0].content, b'User-agent: *\n')
+        self.assertEqual(records[0].fetched, 1556712000)
+
+    def test_read_warc_encoded(self):
+        '''Decodes chunked and compressed bodies.'''
+        encodings = {
+            b'deflate': zlib.compress(b'Disallow: /'),
+            b'gzip': gzip.compress(b'Disallow: /')
+        }
+        for encoding, body in encodings.items():
+            chunked = b'%x\r\n%s\r\n0\r\n\r\n' % (len(body), body)
+            path = self.path('snapshot.warc.gz', warc_record(
+                'http://a.com/robots.txt',
+                b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n'
+                b'Content-Encoding: ' + encoding + b'\r\n\r\n' + chunked), gzip.open)
+            self.assertEqual(
+                [record.content for record in snapshot.read(path)], [b'Disallow: /'])
+
+    def test_write(self):
+        '''Writes records that read back the same, compressed for .gz.'''
+        path = self.path('snapshot.jsonl.gz')
+        written = snapshot.write(path, iter([
+            snapshot.Record('http://a.com/robots.txt', 200, {'etag': 'x'}, u'Disallow: /',
+                            fetched=10, expires=20),
+            snapshot.Record('http://b.com/robots.txt')]))
+        self.assertEqual(written, 2)
+        records = list(snapshot.read(path))
+        self.assertEqual(
+            [(r.url, r.headers, r.content, r.fetched, r.expires) for r in records],
+            [('http://a.com/robots.txt', {'etag': 'x'}, b'Disallow: /', 10, 20),
+             ('http://b.com/robots.txt', {}, b'', None, None)])
+
+    def test_index(self):
+        '''Indexes records on disk by URL, keeping the last of each.'''
+        index = snapshot.Index(iter([
+            snapshot.Record('http://a.com/robots.txt', 200, {'etag': 'x'}, b'\xff'),
+            snapshot.Record('http://b.com/robots.txt', 503),
+            snapshot.Record('http://a.com/robots.txt', 200, {}, u'Disallow: /')]))
+        with index:
+            self.assertEqual(len(index), 2)
+            self.assertEqual(
+                index.get('http://a.com/robots.txt'), (200, {}, b'Disallow: /'))
+            self.assertEqual(index.get('http://b.com/robots.txt'), (503, {}, b''))
+            self.assertIsNone(index.get('http://c.com/robots.txt'))
+        self.assertFalse(os.path.exists(index.directory))
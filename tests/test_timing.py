@@ -0,0 +1,74 @@
+'''Tests about timing fetches.'''
+
+import unittest
+
+import mock
+
+from reppy import timing
+
+
+class NullTimingTest(unittest.TestCase):
+    '''Tests about NullTiming.'''
+
+    def test_discards(self):
+        '''Accepts and discards everything.'''
+        with timing.NULL_TIMING as null:
+            null.mark('read')
+            null.record(status=200)
+        self.assertFalse(hasattr(null, 'read'))
+
+
+class FetchTimingTest(unittest.TestCase):
+    '''Tests about FetchTiming.'''
+
+    def setUp(self):
+        self.observer = mock.Mock()
+        with mock.patch.object(timing, 'default_timer', return_value=10):
+            self.timing = timing.FetchTiming('http://example.com/robots.txt', self.observer)
+
+    def test_unknown_phases(self):
+        '''Phases are None until marked.'''
+        for phase in timing.FetchTiming.PHASES:
+            self.assertIsNone(getattr(self.timing, phase))
+
+    def test_mark(self):
+        '''Each mark records the time since the previous one.'''
+        with mock.patch.object(timing, 'default_timer', side_effect=[11, 14]):
+            self.timing.mark('first_byte')
+            self.timing.mark('read')
+        self.assertEqual((self.timing.first_byte, self.timing.read), (1, 3))
+
+    def test_record(self):
+        '''Records other facts.'''
+        self.timing.record(status=200, bytes=10)
+        self.assertEqual((self.timing.status, self.timing.bytes), (200, 10))
+
+    def test_observes_success(self):
+        '''Passes itself to the observer when done.'''
+        with mock.patch.object(timing, 'default_timer', return_value=15):
+            with self.timing:
+                pass
+        self.observer.assert_called_once_with(self.timing)
+        self.assertEqual(self.timing.total, 5)
+        self.assertIsNone(self.timing.exception)
+
+    def test_observes_failure(self):
+        '''Records the exception of a failed fetch.'''
+        exception = ValueError('Kaboom')
+        with self.assertRaises(ValueError):
+            with self.timing:
+                raise exception
+        self.assertIs(self.timing.exception, exception)
+        self.observer.assert_called_once_with(self.timing)
+
+    def test_observer_failure(self):
+        '''Exceptions from the observer are logged, not raised.'''
+        self.observer.side_effect = ValueError('Kaboom')
+        with mock.patch.object(timing.logger, 'exception') as log:
+            with self.timing:
+                pass
+        self.assertEqual(log.call_count, 1)
+
+    def test_repr(self):
+        '''Has a readable representation.'''
+        self.assertIn('http://example.com/robots.txt', repr(self.timing))
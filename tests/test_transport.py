@@ -0,0 +1,532 @@
+'''Tests about the transports.'''
+
+import io
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+import zlib
+
+import mock
+import requests
+from six.moves import BaseHTTPServer, socketserver
+import urllib3
+from urllib3 import exceptions as urllib3_exceptions
+
+from reppy import exceptions, transport, util
+from reppy.robots import Robots
+
+from .util import requests_fixtures
+
+
+class HeadersTest(unittest.TestCase):
+    '''Tests about Headers.'''
+
+    def test_case_insensitive(self):
+        '''Headers are looked up without regard to case.'''
+        headers = transport.Headers({'Cache-Control': 'max-age=10'})
+        self.assertEqual(headers['cache-control'], 'max-age=10')
+        self.assertEqual(headers.get('CACHE-CONTROL'), 'max-age=10')
+        self.assertIn('Cache-control', headers)
+        self.assertEqual(headers.get('expires'), None)
+
+
+class BaseTest(unittest.TestCase):
+    '''Tests about the base classes.'''
+
+    def test_transport_does_not_implement_get(self):
+        '''Does not implement get.'''
+        with self.assertRaises(NotImplementedError):
+            transport.Transport().get('http://example.com/robots.txt')
+
+    def test_response_does_not_implement_read(self):
+        '''Does not implement read.'''
+        response = transport.Response('http://example.com/robots.txt', 200, {})
+        with self.assertRaises(NotImplementedError):
+            response.read(10)
+        response.close()
+
+
+class FakeTransportTest(unittest.TestCase):
+    '''Tests about FakeTransport.'''
+
+    def test_serves_responses(self):
+        '''Serves the responses it has been given.'''
+        fake = transport.FakeTransport().add(
+            'http://example.com/robots.txt', 200, u'content',
+            {'Expires': 'never'})
+        response = fake.get('http://example.com/robots.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers.get('expires'), 'never')
+        self.assertEqual(response.read(3), b'con')
+        self.assertEqual(response.read(10), b'tent')
+
+    def test_not_found(self):
+        '''Other URLs are not found.'''
+        fake = transport.FakeTransport()
+        self.assertEqual(fake.get('http://example.com/robots.txt').status_code, 404)
+
+    def test_raises(self):
+        '''Raises the exception it was given.'''
+        fake = transport.FakeTransport().add(
+            'http://example.com/robots.txt', exception=exceptions.SSLException('Kaboom'))
+        with self.assertRaises(exceptions.SSLException):
+            fake.get('http://example.com/robots.txt')
+
+
+class FakeTransportRedirectTest(unittest.TestCase):
+    '''Tests about redirects with FakeTransport.'''
+
+    def setUp(self):
+        self.fake = transport.FakeTransport().add(
+            'http://example.com/robots.txt', 301,
+            headers={'Location': 'https://www.example.com/robots.txt'}).add(
+            'https://www.example.com/robots.txt', 200, 'User-agent: *')
+
+    def test_follows_redirects(self):
+        '''Follows redirects to the final response.'''
+        response = self.fake.get('http://example.com/robots.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.url, 'https://www.example.com/robots.txt')
+
+    def test_allow_redirects(self):
+        '''Does not follow redirects without allow_redirects.'''
+        response = self.fake.get('http://example.com/robots.txt', allow_redirects=False)
+        self.assertEqual(response.status_code, 301)
+
+    def test_excessive_redirects(self):
+        '''Raises ExcessiveRedirects for redirect loops.'''
+        self.fake.add('http://loop.com/robots.txt', 302, headers={'Location': '/robots.txt'})
+        with self.assertRaises(exceptions.ExcessiveRedirects):
+            self.fake.get('http://loop.com/robots.txt')
+
+
+class DirectoryTransportTest(unittest.TestCase):
+    '''Tests about DirectoryTransport.'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'example.com:8080.txt'), 'wb') as fout:
+            fout.write(b'User-agent: *\nDisallow: /')
+        self.transport = transport.DirectoryTransport(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_serves_files(self):
+        '''Serves the file named for the host and port.'''
+        response = self.transport.get('http://EXAMPLE.com:8080/robots.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.read(100), b'User-agent: *\nDisallow: /')
+
+    def test_missing(self):
+        '''Hosts without a file are 404s.'''
+        self.assertEqual(
+            self.transport.get('http://example.com/robots.txt').status_code, 404)
+
+
+class SnapshotTransportTest(unittest.TestCase):
+    '''Tests about SnapshotTransport.'''
+
+    def setUp(self):
+        self.transport = transport.SnapshotTransport([
+            '{"url": "http://example.com/robots.txt", "status": 200, '
+            '"headers": {"Cache-Control": "max-age=60"}, "content": "User-agent: *"}',
+            '',
+            '{"url": "http://gone.com/robots.txt", "status": 410}'])
+
+    def test_serves_records(self):
+        '''Serves the recorded responses.'''
+        response = self.transport.get('http://example.com/robots.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['cache-control'], 'max-age=60')
+        self.assertEqual(response.read(100), b'User-agent: *')
+        self.assertEqual(self.transport.get('http://gone.com/robots.txt').status_code, 410)
+
+    def test_missing(self):
+        '''URLs not in the snapshot are 404s.'''
+        self.assertEqual(
+            self.transport.get('http://other.com/robots.txt').status_code, 404)
+
+    def test_load(self):
+        '''Reads snapshots from files.'''
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'snapshot.jsonl')
+            with open(path, 'w') as fout:
+                fout.write('{"url": "http://example.com/robots.txt", "content": ""}\n')
+            loaded = transport.SnapshotTransport.load(path)
+            self.assertEqual(list(loaded.responses), ['http://example.com/robots.txt'])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_indexed(self):
+        '''Serves snapshots from an index on disk, which close deletes.'''
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'snapshot.jsonl')
+            with open(path, 'w') as fout:
+                fout.write(
+                    '{"url": "http://example.com/robots.txt", "status": 503, '
+                    '"headers": {"Retry-After": "60"}}\n')
+            indexed = transport.SnapshotTransport.indexed(path)
+            response = indexed.get('http://example.com/robots.txt')
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.headers['retry-after'], '60')
+            self.assertEqual(indexed.get('http://other.com/robots.txt').status_code, 404)
+            indexed.close()
+            self.assertFalse(os.path.exists(indexed.responses.directory))
+        finally:
+            shutil.rmtree(directory)
+
+
+class RequestsTransportTest(unittest.TestCase):
+    '''Tests about RequestsTransport.'''
+
+    def test_response(self):
+        '''Streams the response.'''
+        with requests_fixtures('test_fetch_status_200'):
+            response = transport.RequestsTransport().get(
+                'http://example.com/robots.txt')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.url, 'http://example.com/robots.txt')
+            self.assertIn(b'Disallow', response.read(100))
+            # Anything else is found on the requests.Response
+            self.assertEqual(response.reason, b'OK\n')
+            response.close()
+
+    def test_session(self):
+        '''Uses the provided session.'''
+        session = mock.Mock()
+        transport.RequestsTransport(session).get('http://example.com/robots.txt')
+        session.get.assert_called_once_with(
+            'http://example.com/robots.txt', stream=True)
+
+    def test_deadline_hook(self):
+        '''Checks the deadline on each response, including redirects.'''
+        session = mock.Mock()
+        existing = mock.Mock()
+        deadline = util.Deadline(10)
+        transport.RequestsTransport(session).get(
+            'http://example.com/robots.txt', deadline=deadline,
+            hooks={'response': existing})
+        _, kwargs = session.get.call_args
+        self.assertEqual(kwargs['hooks'], {'response': [existing, deadline.check]})
+        self.assertNotIn('deadline', kwargs)
+
+    def assertMaps(self, error, expected):
+        '''Assert that the requests error is raised as expected.'''
+        with mock.patch.object(transport.requests, 'get', side_effect=error):
+            with self.assertRaises(expected):
+                transport.RequestsTransport().get('http://example.com/robots.txt')
+
+    def test_exceptions(self):
+        '''Raises requests exceptions as reppy exceptions.'''
+        self.assertMaps(
+            requests.exceptions.SSLError('Kaboom'), exceptions.SSLException)
+        self.assertMaps(
+            requests.exceptions.ConnectionError('Kaboom'),
+            exceptions.ConnectionException)
+        self.assertMaps(
+            requests.exceptions.MissingSchema('Kaboom'), exceptions.MalformedUrl)
+        self.assertMaps(
+            requests.exceptions.TooManyRedirects('Kaboom'),
+            exceptions.ExcessiveRedirects)
+        self.assertMaps(
+            requests.exceptions.ReadTimeout('Kaboom'), exceptions.ReadTimeout)
+
+    def test_read_exceptions(self):
+        '''Raises exceptions while reading the body as reppy exceptions.'''
+        raw = mock.Mock()
+        raw.read.side_effect = urllib3_exceptions.ReadTimeoutError(None, None, 'Kaboom')
+        response = transport.RequestsResponse(mock.Mock(raw=raw))
+        with self.assertRaises(exceptions.ReadTimeout):
+            response.read(10)
+
+
+def gzipped(content):
+    '''The content, gzip-compressed.'''
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(content) + compressor.flush()
+
+
+class Urllib3ReadTest(unittest.TestCase):
+    '''Tests about reading urllib3 responses as bytes arrive.'''
+
+    CONTENT = b'User-agent: *\nDisallow: /path\n' * 100
+
+    def response(self, body):
+        return urllib3.HTTPResponse(
+            body=body, headers={'Content-Encoding': 'gzip'}, status=200,
+            preload_content=False)
+
+    def test_read1(self):
+        '''Reads what has arrived, waiting at most the timeout.'''
+        response = mock.Mock()
+        response._connection.sock.gettimeout.return_value = 5
+        response.read1.return_value = b'User-agent'
+        self.assertEqual(transport.urllib3_read1(response, 100, 2), b'User-agent')
+        response.read1.assert_called_once_with(100, decode_content=True)
+        self.assertEqual(
+            response._connection.sock.settimeout.call_args_list,
+            [mock.call(2), mock.call(5)])
+
+    def test_read1_keeps_shorter_timeout(self):
+        '''Doesn't lengthen a shorter read timeout.'''
+        response = mock.Mock()
+        response._connection.sock.gettimeout.return_value = 1
+        transport.urllib3_read1(response, 100, 2)
+        self.assertEqual(
+            response._connection.sock.settimeout.call_args_list, [mock.call(1)] * 2)
+
+    def test_read1_without_timeout(self):
+        '''Bounds reads of sockets without a timeout.'''
+        response = mock.Mock()
+        response._connection.sock.gettimeout.return_value = None
+        transport.urllib3_read1(response, 100, 2)
+        self.assertEqual(
+            response._connection.sock.settimeout.call_args_list,
+            [mock.call(2), mock.call(None)])
+
+    def test_read1_restores_timeout(self):
+        '''Restores the socket's timeout for the next request on its connection.'''
+        response = mock.Mock()
+        sock = response._connection.sock
+        sock.gettimeout.return_value = 5
+        response.read1.side_effect = urllib3.exceptions.ReadTimeoutError(None, None, '')
+        with self.assertRaises(exceptions.ReadTimeout):
+            transport.urllib3_read1(response, 100, 2)
+        self.assertEqual(sock.settimeout.call_args_list, [mock.call(2), mock.call(5)])
+
+    def test_read1_closed(self):
+        '''Sockets closed by the read are left alone.'''
+        response = mock.Mock()
+        sock = response._connection.sock
+        sock.gettimeout.return_value = 5
+        sock.settimeout.side_effect = [None, socket.error(9, 'Bad file descriptor')]
+        response.read1.return_value = b''
+        self.assertEqual(transport.urllib3_read1(response, 100, 2), b'')
+
+    def test_read1_legacy(self):
+        '''Older urllib3 responses, without read1, are read from http.client.'''
+        response = mock.Mock(spec=['read'])
+        with mock.patch.object(
+                transport, 'legacy_read1', return_value=b'User-agent') as legacy:
+            self.assertEqual(transport.urllib3_read1(response, 100, 2), b'User-agent')
+        legacy.assert_called_once_with(response, 100)
+
+    def test_legacy_read1(self):
+        '''Decodes compressed bodies read partially.'''
+        response = self.response(io.BufferedReader(
+            io.BytesIO(gzipped(self.CONTENT)), buffer_size=64))
+        chunks = []
+        while True:
+            chunk = transport.legacy_read1(response, 64)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        self.assertEqual(b''.join(chunks), self.CONTENT)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(response.tell(), len(gzipped(self.CONTENT)))
+
+    def test_legacy_read1_without_partial_reads(self):
+        '''Falls back to read where http.client can't read partially.'''
+        body = mock.Mock(spec=['read', 'close'])
+        body.read.side_effect = [gzipped(self.CONTENT), b'']
+        response = self.response(body)
+        self.assertEqual(transport.legacy_read1(response, 100000), self.CONTENT)
+
+
+class DripHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''
+    Serve the robots.txt at /<drips>/robots.txt one 100-byte line every 0.1s,
+    or at /chunked/<drips>/robots.txt in a chunk for each. At
+    /stall/<drips>/robots.txt, another line is promised that never comes.
+    '''
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        segments = self.path.strip('/').split('/')
+        chunked = segments[0] == 'chunked'
+        stall = segments[0] == 'stall'
+        drips = int(segments[-2])
+        self.send_response(200)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Content-Length', str(100 * (drips + stall)))
+        self.end_headers()
+        line = b'#' * 99 + b'\n'
+        try:
+            for _ in range(drips):
+                if chunked:
+                    self.wfile.write(('%x\r\n' % len(line)).encode('ascii') + line + b'\r\n')
+                else:
+                    self.wfile.write(line)
+                self.wfile.flush()
+                time.sleep(0.1)
+            if stall:
+                time.sleep(5)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except socket.error:
+            # The client gave up
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class DripServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    '''Serve each request in a thread, without waiting for them to finish.'''
+
+    daemon_threads = True
+
+
+class DeadlineFetchTest(unittest.TestCase):
+    '''Tests about deadlines on fetches of a body that trickles in.'''
+
+    def setUp(self):
+        self.server = DripServer(('127.0.0.1', 0), DripHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def url(self, path):
+        return 'http://127.0.0.1:%s%s' % (self.server.server_address[1], path)
+
+    def transports(self):
+        return [transport.RequestsTransport(), transport.Urllib3Transport()]
+
+    def test_deadline(self):
+        '''Gives up on a slow body once the deadline has passed.'''
+        for path in ('/100/robots.txt', '/chunked/100/robots.txt'):
+            for fetch_transport in self.transports():
+                start = time.time()
+                with self.assertRaises(exceptions.DeadlineExceeded):
+                    Robots.fetch(self.url(path), transport=fetch_transport, deadline=0.3)
+                # The whole body would take 10s
+                self.assertLess(time.time() - start, 1)
+
+    def test_deadline_too_long(self):
+        '''Gives up on the byte past max_size once the deadline has passed.'''
+        for fetch_transport in self.transports():
+            start = time.time()
+            with self.assertRaises(exceptions.DeadlineExceeded):
+                Robots.fetch(
+                    self.url('/stall/5/robots.txt'), transport=fetch_transport,
+                    max_size=500, timeout=5, deadline=1)
+            self.assertLess(time.time() - start, 1.3)
+
+    def test_within_deadline(self):
+        '''Reads a slow body that arrives within the deadline.'''
+        for path in ('/3/robots.txt', '/chunked/3/robots.txt'):
+            for fetch_transport in self.transports():
+                robots = Robots.fetch(self.url(path), transport=fetch_transport, deadline=5)
+                self.assertEqual(robots.sitemaps, [])
+
+
+class Urllib3TransportTest(unittest.TestCase):
+    '''Tests about Urllib3Transport.'''
+
+    def setUp(self):
+        self.pool_manager = mock.Mock()
+        self.transport = transport.Urllib3Transport(self.pool_manager)
+
+    def respond(self, status, content, headers=None):
+        '''Have the pool manager return the provided response.'''
+        self.pool_manager.request.return_value = urllib3.HTTPResponse(
+            body=io.BytesIO(content), headers=headers or {}, status=status,
+            preload_content=False)
+
+    def test_response(self):
+        '''Streams the response.'''
+        self.respond(200, b'User-agent: *', {'Cache-Control': 'max-age=10'})
+        response = self.transport.get('http://example.com/robots.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.url, 'http://example.com/robots.txt')
+        self.assertEqual(response.headers.get('cache-control'), 'max-age=10')
+        self.assertEqual(response.read(100), b'User-agent: *')
+        response.close()
+
+    def test_request_arguments(self):
+        '''Translates requests-style arguments.'''
+        self.respond(200, b'')
+        self.transport.get(
+            'http://example.com/robots.txt', headers={'User-Agent': 'me'},
+            timeout=(1, 2), allow_redirects=False)
+        _, kwargs = self.pool_manager.request.call_args
+        self.assertEqual(kwargs['headers'], {'User-Agent': 'me'})
+        self.assertEqual(kwargs['timeout'].connect_timeout, 1)
+        self.assertEqual(kwargs['timeout'].read_timeout, 2)
+        self.assertEqual(kwargs['retries'].redirect, 0)
+        self.assertFalse(kwargs['preload_content'])
+
+    def test_deadline(self):
+        '''Raises DeadlineExceeded if the deadline passed during redirects.'''
+        self.respond(200, b'')
+        deadline = util.Deadline(10)
+        with mock.patch.object(util.time, 'time', return_value=deadline.expires):
+            with self.assertRaises(exceptions.DeadlineExceeded):
+                self.transport.get('http://example.com/robots.txt', deadline=deadline)
+
+    def test_fetch(self):
+        '''Can be used to fetch robots.txt.'''
+        from reppy.robots import Robots
+        self.respond(200, b'User-agent: *\nDisallow: /path')
+        robot = Robots.fetch('http://example.com/robots.txt', transport=self.transport)
+        self.assertFalse(robot.allowed('/path', 'agent'))
+
+    def assertMaps(self, error, expected):
+        '''Assert that the urllib3 error is raised as expected.'''
+        self.pool_manager.request.side_effect = error
+        with self.assertRaises(expected):
+            self.transport.get('http://example.com/robots.txt')
+
+    def test_exceptions(self):
+        '''Raises urllib3 exceptions as reppy exceptions.'''
+        url = 'http://example.com/robots.txt'
+        self.assertMaps(
+            urllib3_exceptions.MaxRetryError(
+                None, url, urllib3_exceptions.SSLError('Kaboom')),
+            exceptions.SSLException)
+        self.assertMaps(
+            urllib3_exceptions.MaxRetryError(
+                None, url, urllib3_exceptions.ReadTimeoutError(None, url, 'Kaboom')),
+            exceptions.ReadTimeout)
+        self.assertMaps(
+            urllib3_exceptions.MaxRetryError(
+                None, url, urllib3_exceptions.ResponseError('too many redirects')),
+            exceptions.ExcessiveRedirects)
+        self.assertMaps(
+            urllib3_exceptions.MaxRetryError(None, url, None),
+            exceptions.ConnectionException)
+        self.assertMaps(
+            urllib3_exceptions.SSLError('Kaboom'), exceptions.SSLException)
+        self.assertMaps(
+            urllib3_exceptions.ReadTimeoutError(None, url, 'Kaboom'),
+            exceptions.ReadTimeout)
+        self.assertMaps(
+            urllib3_exceptions.LocationParseError('gobbledygook'),
+            exceptions.MalformedUrl)
+        self.assertMaps(
+            urllib3_exceptions.ProtocolError('Kaboom'),
+            exceptions.ConnectionException)
+
+    def test_connection_refused(self):
+        '''A real connection failure is a ConnectionException.'''
+        with self.assertRaises(exceptions.ConnectionException):
+            transport.Urllib3Transport().get('http://localhost:8080/robots.txt')
+
+    def test_malformed_url(self):
+        '''A real malformed URL is a MalformedUrl.'''
+        with self.assertRaises(exceptions.MalformedUrl):
+            transport.Urllib3Transport().get('gobbledygook://')
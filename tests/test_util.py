@@ -1,6 +1,8 @@
 import unittest
 
-from reppy import util
+import mock
+
+from reppy import exceptions, transport, util
 
 
 class ParseDateTest(unittest.TestCase):
@@ -25,3 +27,73 @@ class ParseDateTest(unittest.TestCase):
         '''An obsolete date format that is also supported.'''
         self.assertEqual(
             util.parse_date('Sun Nov  6 08:49:37 1994'), 784111777)
+
+
+class DeadlineTest(unittest.TestCase):
+    '''Tests about Deadline.'''
+
+    def setUp(self):
+        with mock.patch.object(util.time, 'time', return_value=100):
+            self.deadline = util.Deadline(10)
+
+    def at(self, now):
+        '''Pretend that it is now.'''
+        return mock.patch.object(util.time, 'time', return_value=now)
+
+    def test_check(self):
+        '''Raises DeadlineExceeded once the budget is spent.'''
+        with self.at(109):
+            self.deadline.check()
+        with self.at(110):
+            with self.assertRaises(exceptions.DeadlineExceeded):
+                self.deadline.check()
+
+    def test_timeout(self):
+        '''Clamps timeouts to the remaining budget.'''
+        with self.at(104):
+            self.assertEqual(self.deadline.timeout(), 6)
+            self.assertEqual(self.deadline.timeout(3), 3)
+            self.assertEqual(self.deadline.timeout(30), 6)
+            self.assertEqual(self.deadline.timeout((3, None)), (3, 6))
+
+    def response(self, content):
+        return transport.FakeResponse('http://example.com/robots.txt', 200, {}, content)
+
+    def test_read(self):
+        '''Reads up to amt bytes in chunks.'''
+        self.deadline.CHUNK_SIZE = 2
+        with self.at(104):
+            self.assertEqual(self.deadline.read(self.response(b'abcde'), 3), b'abc')
+
+    def test_read_past_deadline(self):
+        '''Stops reading once the budget is spent.'''
+        self.deadline.CHUNK_SIZE = 2
+        response = self.response(b'abcdef')
+        with mock.patch.object(util.time, 'time', side_effect=[104, 112]):
+            with self.assertRaises(exceptions.DeadlineExceeded):
+                self.deadline.read(response, 6)
+        self.assertEqual(response.body.tell(), 2)
+
+    def test_read_waits_for_remaining_budget(self):
+        '''Waits no longer than what remains of the budget for each read.'''
+        response = mock.Mock()
+        response.read1.side_effect = [b'abc', b'']
+        with self.at(104):
+            self.assertEqual(self.deadline.read(response, 10), b'abc')
+        response.read1.assert_called_with(10 - 3, 6)
+
+    def test_read_timeout_past_deadline(self):
+        '''A read that times out as the budget runs out exceeds the deadline.'''
+        response = mock.Mock()
+        response.read1.side_effect = exceptions.ReadTimeout('Kaboom')
+        with mock.patch.object(util.time, 'time', side_effect=[104, 110]):
+            with self.assertRaises(exceptions.DeadlineExceeded):
+                self.deadline.read(response, 10)
+
+    def test_read_timeout_within_deadline(self):
+        '''A read that times out with budget left is a ReadTimeout.'''
+        response = mock.Mock()
+        response.read1.side_effect = exceptions.ReadTimeout('Kaboom')
+        with self.at(104):
+            with self.assertRaises(exceptions.ReadTimeout):
+                self.deadline.read(response, 10)